@@ -1,105 +1,32 @@
 import streamlit as st
 import os
 import time
-import requests
 import json
-import firebase_admin
-from firebase_admin import credentials, initialize_app, firestore
-from firebase_admin import auth
-from google.cloud.firestore import Client
-from typing import Dict, Any, Union
+import functools
+import logging
+from typing import Dict, Any, Tuple, Union
 import re
 import base64
 from io import BytesIO
+import feedback_analytics
+import plan_admin
+import generation_history
+import session_memory
+import ui_assets
+import rerun_profiler
+import token_budget
+import token_auth
+import fallback_copy
+import model_json
+import shared_state
+import platform_fanout
+import warmup
+
+logger = logging.getLogger(__name__)
 
 # --- CONFIGURAÇÕES DO APLICATIVO E CSS CUSTOMIZADO ---
 st.set_page_config(page_title="✨ AnuncIA - Gerador de Estratégia de Marketing", layout="wide")
 
-# --- CSS PROFISSIONAL V5.0 ---
-st.markdown("""
-<style>
-/* 1. CONFIGURAÇÃO BASE GERAL */
-body {
-    font-family: 'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
-    color: #333;
-}
-.block-container {
-    padding-top: 2rem;
-    padding-left: 1.5rem;
-    padding-right: 1.5rem;
-    padding-bottom: 2rem;
-}
-
-/* 2. SIDEBAR */
-[data-testid="stSidebar"] {
-    background: linear-gradient(180deg, #ffffff, #e0f7fa);
-    border-right: 1px solid #ddd;
-    box-shadow: 2px 0 5px rgba(0, 0, 0, 0.05);
-}
-
-/* 3. TÍTULO PRINCIPAL (Branding) */
-h1 {
-    color: #007bbd;
-    text-shadow: 1px 1px 3px rgba(0, 0, 0, 0.05);
-    font-weight: 700;
-}
-h2, h3, h4 {
-    color: #333;
-    border-bottom: 1px solid #eee;
-    padding-bottom: 5px;
-}
-
-/* 4. ESTILO DE CARTÃO E BORDAS */
-[data-testid="stExpander"], [data-testid="stForm"], .stTextArea > div {
-    border-radius: 12px;
-    border: 1px solid #e0e0e0;
-    box-shadow: 0 4px 8px rgba(0, 0, 0, 0.04);
-    background-color: #ffffff;
-    padding: 15px;
-    transition: box-shadow 0.3s ease;
-}
-
-/* 5. WIDGETS E BOTÕES */
-div.stButton > button:first-child {
-    background-color: #00bcd4;
-    color: white;
-    border: none;
-    border-radius: 8px;
-    padding: 10px 20px;
-    font-weight: bold;
-    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.2);
-    transition: background-color 0.2s;
-}
-div.stButton > button:first-child:hover {
-    background-color: #0097a7;
-}
-
-/* 6. BOTÕES DE UPGRADE (PRO) */
-.pro-button a button {
-    background-color: #ff5722 !important;
-    color: white !important;
-    border: none !important;
-    padding: 10px 20px !important;
-    border-radius: 8px !important;
-    font-size: 16px !important;
-    cursor: pointer !important;
-    font-weight: bold;
-    box-shadow: 0 4px 8px rgba(255, 87, 34, 0.3);
-    transition: all 0.2s;
-}
-.pro-button a button:hover {
-    background-color: #e64a19 !important;
-    transform: translateY(-2px);
-}
-.plan-highlight {
-    border: 3px solid #ff5722;
-    background-color: #fff3e0;
-    box-shadow: 0 6px 12px rgba(255, 87, 34, 0.2);
-    transform: scale(1.02);
-}
-</style>
-""", unsafe_allow_html=True)
-
 
 # --- CONFIGURAÇÕES & CHAVES (Puxadas do secrets.toml) ---
 # Certifique-se de que sua chave GEMINI_API_KEY está configurada no arquivo .streamlit/secrets.toml
@@ -107,22 +34,29 @@ GEMINI_KEY = st.secrets.get("gemini", {}).get("GEMINI_API_KEY", "")
 FREE_LIMIT = int(st.secrets.get("app", {}).get("DEFAULT_FREE_LIMIT", 3))
 DEVELOPER_EMAIL = st.secrets.get("app", {}).get("DEVELOPER_EMAIL", "seu-email-de-login-admin@exemplo.com")
 DEVELOPER_EMAIL_CLEAN = re.sub(r'[^\w@\.\-]', '_', DEVELOPER_EMAIL.lower().strip().split('+')[0])
+# Login por ID token (verificado localmente) quando a Web API Key do Firebase estiver configurada
+FIREBASE_WEB_API_KEY = st.secrets.get("app", {}).get("FIREBASE_WEB_API_KEY", "")
+FIREBASE_PROJECT_ID = st.secrets.get("firebase", {}).get("project_id", "")
+TOKEN_AUTH_ENABLED = bool(FIREBASE_WEB_API_KEY and FIREBASE_PROJECT_ID)
+GEMINI_MODEL = "gemini-2.5-flash-preview-05-20"
+GEMINI_GENERATE_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+GEMINI_CACHE_URL = "https://generativelanguage.googleapis.com/v1beta/cachedContents"
+GEMINI_TIMEOUT_SECONDS = 90
+# Estado compartilhado entre réplicas (cotas simuladas, caches, rate limit e jobs). Ver shared_state.py
+SHARED_STATE_URL = st.secrets.get("app", {}).get("SHARED_STATE_URL", shared_state.DEFAULT_URL)
+GENERATION_RATE_LIMIT = 5           # Gerações por usuário...
+GENERATION_RATE_WINDOW_SECONDS = 60  # ...a cada janela de 60 segundos (todas as réplicas somadas)
+shared_state.configure(SHARED_STATE_URL)
 
 # ----------------------------------------------------
 #               FUNÇÕES DE UTILIADE MULTIMODAL
 # ----------------------------------------------------
 
-def file_to_base64(uploaded_file):
-    """Converte um objeto FileUploader do Streamlit para Base64."""
-    if uploaded_file is not None:
+def media_to_base64(media_bytes: bytes):
+    """Converte os bytes da mídia (já validados pelo pré-voo de tokens) para Base64."""
+    if media_bytes:
         # A API Gemini aceita base64 para mídias in-line
-        file_bytes = uploaded_file.getvalue()
-        # Adiciona um check de tamanho para evitar sobrecarga (Max 200MB)
-        if len(file_bytes) > 200 * 1024 * 1024:
-            st.warning("⚠️ O arquivo é muito grande (Máx. 200MB). Apenas a descrição textual será analisada.")
-            return None
-            
-        return base64.b64encode(file_bytes).decode("utf-8")
+        return base64.b64encode(media_bytes).decode("utf-8")
     return None
 
 def get_mime_type(uploaded_file):
@@ -146,6 +80,10 @@ if 'db' not in st.session_state:
 
 def initialize_firebase():
     """Tenta inicializar o Firebase Admin SDK ou obtém a instância existente."""
+    # Imports pesados adiados: só são carregados quando o backend é realmente necessário
+    import firebase_admin
+    from firebase_admin import credentials, initialize_app, firestore, auth
+
     APP_NAME = "anuncia_app_instance"
     
     try:
@@ -191,8 +129,10 @@ def initialize_firebase():
     db_client = firestore.client(app=app)
     return db_client, auth, app
 
-if st.session_state['db'] is None:
-    st.session_state['db'], st.session_state['auth'], st.session_state['firebase_app'] = initialize_firebase()
+def ensure_backend():
+    """Inicializa o Firebase na primeira vez que a sessão precisa dele (visitantes anônimos não pagam esse custo)."""
+    if st.session_state['db'] is None:
+        st.session_state['db'], st.session_state['auth'], st.session_state['firebase_app'] = initialize_firebase()
 
 
 # ----------------------------------------------------
@@ -210,8 +150,12 @@ def clean_email_to_doc_id(email: str) -> str:
     user_doc_id = re.sub(r'[^\w@\.\-]', '_', clean_email)
     return clean_email
 
-def get_user_data(user_id: str) -> Dict[str, Any]:
-    """Busca os dados do usuário no Firestore, verificando o acesso dev."""
+def get_user_data(user_id: str, fresh: bool = False) -> Dict[str, Any]:
+    """Busca os dados do usuário no Firestore, verificando o acesso dev.
+
+    Com `fresh`, ignora o perfil pré-carregado e lê o documento atual (ex.: conferência da cota).
+    """
+    ensure_backend()
     
     # 1. VERIFICAÇÃO DE DESENVOLVEDOR (Plano PREMIUM forçado)
     if st.session_state.get('logged_in_user_email'):
@@ -221,18 +165,20 @@ def get_user_data(user_id: str) -> Dict[str, Any]:
             # Se o e-mail for o Admin, força o plano PREMIUM (ilimitado/vitalício)
             return {"ads_generated": 0, "plan_tier": "premium"}
     
-    # 2. MODO FIREBASE
+    # 2. MODO FIREBASE (usa o perfil pré-carregado pelo aquecimento, se houver um recente)
     if st.session_state.get("db") and st.session_state["db"] != "SIMULATED":
-        user_ref = st.session_state["db"].collection("users").document(user_id)
-        doc = user_ref.get()
-        if doc.exists:
-            data = doc.to_dict()
+        prefetched = None if fresh else warmup.get_profile(user_id)
+        if prefetched is not None:
+            exists, data = prefetched
+        else:
+            doc = st.session_state["db"].collection("users").document(user_id).get()
+            exists, data = doc.exists, doc.to_dict() if doc.exists else None
+        if exists:
             data['plan_tier'] = data.get('plan_tier', 'free')
             return data
     
-    # 3. MODO SIMULADO (Fallback)
-    data = st.session_state.get(f"user_{user_id}", {"ads_generated": 0, "plan_tier": "free"})
-    return data
+    # 3. MODO SIMULADO (Fallback): contador no estado compartilhado, visto por todas as réplicas
+    return {"ads_generated": shared_state.get_state().get(f"quota:{user_id}", 0), "plan_tier": "free"}
 
 def increment_ads_count(user_id: str, current_plan_tier: str) -> int:
     """Incrementa a contagem de anúncios SOMENTE se o plano for 'free' e o limite não foi atingido."""
@@ -240,31 +186,40 @@ def increment_ads_count(user_id: str, current_plan_tier: str) -> int:
     if current_plan_tier != "free":
         return 0
         
-    user_data = get_user_data(user_id)
-    current_count = user_data.get("ads_generated", 0)
-    
-    if current_count >= FREE_LIMIT:
-        return current_count
-        
-    new_count = current_count + 1
-    
-    if st.session_state.get("db") and st.session_state["db"] != "SIMULATED":
-        user_ref = st.session_state["db"].collection("users").document(user_id)
-        user_ref.set({
-            "ads_generated": new_count,
+    if not (st.session_state.get("db") and st.session_state["db"] != "SIMULATED"):
+        # Incremento atômico limitado: réplicas concorrentes nunca passam do limite
+        return shared_state.get_state().incr_if_below(f"quota:{user_id}", FREE_LIMIT)[1]
+
+    from firebase_admin import firestore
+
+    # Leitura e escrita na mesma transação: a contagem vem do Firestore (não do perfil pré-carregado,
+    # que é local ao processo e pode estar defasado) e gerações concorrentes não passam do limite
+    @firestore.transactional
+    def increment_in_transaction(transaction, user_ref):
+        snapshot = user_ref.get(transaction=transaction)
+        user_data = (snapshot.to_dict() if snapshot.exists else None) or {}
+        current_count = user_data.get("ads_generated", 0)
+        if current_count >= FREE_LIMIT:
+            return current_count
+        transaction.set(user_ref, {
+            "ads_generated": current_count + 1,
             "last_used": firestore.SERVER_TIMESTAMP,
             "plan_tier": user_data.get("plan_tier", "free")
         }, merge=True)
-    else:
-        user_data["ads_generated"] = new_count
-        st.session_state[f"user_{user_id}"] = user_data
-        
+        return current_count + 1
+
+    db = st.session_state["db"]
+    new_count = increment_in_transaction(db.transaction(), db.collection("users").document(user_id))
+    warmup.invalidate_profile(user_id)  # O perfil pré-carregado serve só para exibição
     return new_count
 
-def save_user_feedback(user_id: str, rating: str, input_prompt: str, ai_response: str):
-    """Salva o feedback do usuário no Firestore para melhoria da IA."""
+def save_user_feedback(user_id: str, rating: str, input_prompt: str, ai_response: str, tone: str = None, plan_tier: str = None):
+    """Salva o feedback do usuário no Firestore para melhoria da IA (com tom e plano para o analytics)."""
+    ensure_backend()
     
     if st.session_state.get("db") and st.session_state["db"] != "SIMULATED":
+        from firebase_admin import firestore
+
         feedback_ref = st.session_state["db"].collection("feedback").document()
         
         rating_map = {'Ruim 😭': 1, 'Mais ou Menos 🤔': 2, 'Bom 👍': 3, 'Ótimo! 🚀': 4}
@@ -277,6 +232,8 @@ def save_user_feedback(user_id: str, rating: str, input_prompt: str, ai_response
                 "rating_score": rating_score,
                 "input_prompt": input_prompt,
                 "ai_response_json": ai_response, 
+                "tone": tone,
+                "plan_tier": plan_tier,
                 "timestamp": firestore.SERVER_TIMESTAMP,
             })
             return True
@@ -290,11 +247,15 @@ def save_user_feedback(user_id: str, rating: str, input_prompt: str, ai_response
 def update_user_plan(target_email: str, new_plan: str) -> bool:
     """Função administrativa/Webhook Simulada para alterar o plano de um usuário."""
     clean_email = clean_email_to_doc_id(target_email)
+    ensure_backend()
 
     if st.session_state.get("db") and st.session_state["db"] != "SIMULATED":
+        from firebase_admin import auth, firestore
+
         try:
             user_record = st.session_state['auth'].get_user_by_email(target_email, app=st.session_state['firebase_app'])
             user_id = user_record.uid
+            warmup.invalidate_profile(user_id)
             
             user_ref = st.session_state["db"].collection("users").document(user_id)
             new_ads_count = 0 
@@ -306,7 +267,7 @@ def update_user_plan(target_email: str, new_plan: str) -> bool:
             }, merge=True)
             return True
             
-        except firebase_admin._auth_utils.UserNotFoundError:
+        except auth.UserNotFoundError:
             st.error(f"❌ Erro: Usuário com e-mail '{target_email}' não encontrado no Firebase Auth.")
             return False
         except Exception as e:
@@ -317,8 +278,83 @@ def update_user_plan(target_email: str, new_plan: str) -> bool:
         st.info("Função de upgrade não executada. Firebase em modo SIMULADO.")
         return False
 
-# --- FUNÇÕES DE AUTENTICAÇÃO (MANTIDAS) ---
+# --- FUNÇÕES DE AUTENTICAÇÃO (ID TOKEN VERIFICADO LOCALMENTE) ---
+def start_token_session(tokens: Dict[str, Any], identity: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Grava na sessão a identidade do ID token, verificando-o localmente se ela não vier já verificada."""
+    if identity is None:
+        identity = token_auth.get_verifier(FIREBASE_PROJECT_ID).verify(tokens["idToken"])
+    st.session_state['id_token'] = tokens["idToken"]
+    st.session_state['refresh_token'] = tokens["refreshToken"]
+    st.session_state['logged_in_user_email'] = identity["email"]
+    st.session_state['logged_in_user_id'] = identity["uid"]
+    return identity
+
+def restore_token_session():
+    """Revalida o ID token a cada rerun (cache local, sem rede) e o renova quando expira."""
+    if not st.session_state.get('id_token'):
+        return
+
+    try:
+        identity = token_auth.get_verifier(FIREBASE_PROJECT_ID).verify(st.session_state['id_token'])
+        st.session_state['logged_in_user_email'] = identity["email"]
+        st.session_state['logged_in_user_id'] = identity["uid"]
+    except token_auth.TokenVerificationError:
+        try:
+            start_token_session(token_auth.refresh_id_token(FIREBASE_WEB_API_KEY, st.session_state['refresh_token']))
+        except Exception:
+            for key in ('id_token', 'refresh_token', 'logged_in_user_email', 'logged_in_user_id'):
+                st.session_state[key] = None
+            st.warning("Sua sessão expirou. Faça login novamente.")
+
+def start_warmup(user_id: str):
+    """Dispara o aquecimento em segundo plano (conexão, perfil, módulos, prompts) enquanto o usuário preenche o formulário."""
+    previous = st.session_state.get('warmup_task')
+    if previous is not None:
+        previous.cancel()
+
+    ensure_backend()  # Seria feito no próximo rerun de qualquer forma; aqui libera o perfil para o segundo plano
+    db = st.session_state.get("db")
+
+    def warm_prompts():
+        for premium in (False, True):
+            copy_output_schema(premium)
+            strategy_output_schema(premium)
+            for media_type in (None, "imagem", "vídeo"):
+                copy_instruction_template(premium, media_type)
+        token_budget.calibration_factor()
+
+    # Perfil primeiro: o rerun logo após o login espera essa leitura em vez de repeti-la
+    steps = []
+    if db and db != "SIMULATED":
+        steps.append(("perfil e plano", functools.partial(warmup.prefetch_profile, db, user_id)))
+    steps += [
+        ("conexão Gemini (TLS)", warmup.warm_connection),
+        ("módulos pesados", warmup.preload_modules),
+        ("prompts, schemas e calibração", warm_prompts),
+    ]
+    st.session_state['warmup_task'] = warmup.start(steps)
+
 def handle_login(email: str, password: str):
+    if TOKEN_AUTH_ENABLED:
+        try:
+            identity = start_token_session(token_auth.sign_in_with_password(FIREBASE_WEB_API_KEY, email, password))
+        except token_auth.AuthError as e:
+            if e.code in ("EMAIL_NOT_FOUND", "INVALID_PASSWORD", "INVALID_LOGIN_CREDENTIALS"):
+                st.error("Erro: E-mail ou senha inválidos.")
+            else:
+                st.error(f"Erro no login: {e.code}")
+            return
+        except Exception as e:
+            st.error(f"Erro no login: {e}")
+            return
+        start_warmup(identity["uid"])
+        st.success(f"Bem-vindo(a), {email}!")
+        st.rerun()
+
+    # Fluxo legado (sem Web API Key): consulta pelo Admin SDK, sem validar a senha
+    ensure_backend()
+    from firebase_admin import auth
+
     try:
         if st.session_state['auth'] == "SIMULATED":
             # O problema está na inicialização do Firebase, não nesta função.
@@ -333,15 +369,53 @@ def handle_login(email: str, password: str):
         
         st.session_state['logged_in_user_email'] = email
         st.session_state['logged_in_user_id'] = user.uid
+        start_warmup(user.uid)
         st.success(f"Bem-vindo(a), {email}!")
         st.rerun()
         
-    except firebase_admin._auth_utils.UserNotFoundError:
+    except auth.UserNotFoundError:
         st.error("Erro: Usuário não encontrado. Verifique seu e-mail e senha.")
     except Exception as e:
         st.error(f"Erro no login: {e}")
 
 def handle_register(email: str, password: str, username: str, phone: str):
+    ensure_backend()
+    from firebase_admin import auth, firestore
+
+    if TOKEN_AUTH_ENABLED:
+        try:
+            tokens = token_auth.sign_up(FIREBASE_WEB_API_KEY, email, password, username)
+            identity = token_auth.get_verifier(FIREBASE_PROJECT_ID).verify(tokens["idToken"])
+            # Perfil antes da sessão: se a escrita falhar, a conta é desfeita e o usuário não fica logado sem users/{uid}
+            if st.session_state["db"] != "SIMULATED":
+                try:
+                    st.session_state["db"].collection("users").document(identity["uid"]).set({
+                        "email": email,
+                        "username": username,
+                        "phone": phone if phone else None,
+                        "created_at": firestore.SERVER_TIMESTAMP,
+                        "plan_tier": "free",
+                        "ads_generated": 0
+                    })
+                except Exception:
+                    try:
+                        st.session_state['auth'].delete_user(identity["uid"], app=st.session_state['firebase_app'])
+                    except Exception:
+                        pass
+                    raise
+            start_token_session(tokens, identity)
+        except token_auth.AuthError as e:
+            if e.code == "EMAIL_EXISTS":
+                st.error("Erro: Este e-mail já está em uso. Tente fazer o login.")
+            else:
+                st.error(f"Erro no registro: {e.code}")
+            return
+        except Exception as e:
+            st.error(f"Erro no registro: {e}")
+            return
+        st.success(f"Conta criada com sucesso! Bem-vindo(a), {username}.")
+        st.rerun()
+
     try:
         if st.session_state['auth'] == "SIMULATED":
             st.error("Serviço de autenticação desativado. Verifique os logs de inicialização do Firebase para o erro crítico.")
@@ -371,7 +445,7 @@ def handle_register(email: str, password: str, username: str, phone: str):
         st.success(f"Conta criada com sucesso! Bem-vindo(a), {username}.")
         st.rerun()
 
-    except firebase_admin._auth_utils.EmailAlreadyExistsError:
+    except auth.EmailAlreadyExistsError:
         st.error("Erro: Este e-mail já está em uso. Tente fazer o login.")
     except Exception as e:
         st.error(f"Erro no registro: {e}")
@@ -380,6 +454,13 @@ def handle_logout():
     """Desloga o usuário."""
     st.session_state['logged_in_user_email'] = None
     st.session_state['logged_in_user_id'] = None
+    st.session_state['id_token'] = None
+    st.session_state['refresh_token'] = None
+    st.session_state['pending_generation'] = None
+    release_retained_media()
+    if st.session_state.get('warmup_task') is not None:
+        st.session_state['warmup_task'].cancel()
+        st.session_state['warmup_task'] = None
     st.rerun()
 
 
@@ -387,25 +468,9 @@ def handle_logout():
 #            FUNÇÕES DE CHAMADA DA API (MANTIDAS)
 # ----------------------------------------------------
 
-def call_gemini_api(user_description: str, product_type: str, tone: str, user_plan_tier: str, needs_video: bool, media_b64: str, mime_type: str) -> Union[Dict, str]:
-    """Chama a API do Gemini para gerar copy multimodal (Imagem/Vídeo) em formato JSON."""
-    
-    api_key = GEMINI_KEY
-    if not api_key:
-        return {"error": "Chave de API (GEMINI_API_KEY) não configurada no secrets.toml."}
-
-    is_premium_feature = (user_plan_tier == "premium" and needs_video)
-    
-    system_instruction = f"""
-    Você é um Copywriter de elite, especializado em Marketing Digital e Vendas Diretas.
-    Sua missão é gerar um anúncio altamente persuasivo, focado em conversão e otimizado para o esboço de texto/título fornecido pelo usuário.
-    
-    Instruções de Tom: O tom de voz deve ser {tone}.
-    Instruções de Estrutura: Use o Framework AIDA (Atenção, Interesse, Desejo, Ação).
-    A copy deve ser concisa, focar no benefício do cliente e incluir gatilhos de escassez/urgência/prova social.
-    O produto é um {product_type}.
-    """
-    
+@functools.lru_cache(maxsize=None)
+def copy_output_schema(is_premium_feature: bool) -> Dict:
+    """Schema de saída da copy por variante de plano (compartilhado: não modificar o dict retornado)."""
     output_schema = {
         "type": "OBJECT",
         "properties": {
@@ -418,64 +483,154 @@ def call_gemini_api(user_description: str, product_type: str, tone: str, user_pl
     }
 
     if is_premium_feature:
-        system_instruction += "\n\n⚠️ INSTRUÇÃO PREMIUM: Gere um roteiro de vídeo de 30 segundos e um gancho inicial (hook) de 3 segundos para Reels/TikTok, com foco em parar o feed. Gere também uma sugestão de 3 títulos de campanhas para teste A/B no Meta Ads."
         output_schema['properties']['gancho_video'] = {"type": "STRING", "description": "Um HOOK (gancho) de 3 segundos que interrompe a rolagem do feed."}
         output_schema['properties']['roteiro_basico'] = {"type": "STRING", "description": "Um roteiro conciso de 30 segundos em 3 etapas (Problema, Solução/Benefício, CTA)."}
         output_schema['properties']['sugestao_campanhas'] = {"type": "STRING", "description": "3 títulos de campanhas agressivas para teste A/B."}
         output_schema['propertyOrdering'].extend(['gancho_video', 'roteiro_basico', 'sugestao_campanhas'])
+    return output_schema
 
-    # CONSTRUÇÃO DO PAYLOAD (Multimodal com suporte a Vídeo/Imagem)
-    contents = []
+
+@functools.lru_cache(maxsize=None)
+def strategy_output_schema(is_premium: bool) -> Dict:
+    """Schema de saída da estratégia por variante de plano (compartilhado: não modificar o dict retornado)."""
+    output_schema = {
+        "type": "OBJECT",
+        "properties": {
+            "plataforma_principal": {"type": "STRING", "description": "A plataforma principal mais indicada (Ex: TikTok, Instagram, Google Search) para o objetivo e porquê."},
+            "publico_alvo_detalhado": {"type": "STRING", "description": "Uma descrição detalhada do público-alvo, incluindo interesses, dor principal e faixa etária."},
+            "estrategia_de_horarios": {"type": "STRING", "description": "Sugestão dos 3 melhores horários de postagem ou veiculação de anúncios na plataforma principal, com breve justificativa."},
+            "sugestoes_de_hashtags": {"type": "STRING", "description": "5-7 hashtags estratégicas e segmentadas para a divulgação."},
+            "ideia_de_criativo": {"type": "STRING", "description": "Sugestão de uma ideia de imagem ou um esboço de texto complementar que maximize a conversão na plataforma principal."},
+        },
+        "propertyOrdering": ["plataforma_principal", "publico_alvo_detalhado", "estrategia_de_horarios", "sugestoes_de_hashtags", "ideia_de_criativo"]
+    }
+
+    if is_premium:
+        output_schema['properties']['roteiro_video_estrategico'] = {"type": "STRING", "description": "Um esboço de roteiro de vídeo estratégico (30 segundos) para a plataforma principal com foco em viralização/conversão."}
+        output_schema['propertyOrdering'].append('roteiro_video_estrategico')
+    return output_schema
+
+
+@functools.lru_cache(maxsize=None)
+def copy_instruction_template(is_premium_feature: bool, media_type: str = None) -> str:
+    """Instrução de sistema da copy por variante de plano e de mídia, com `{tone}` e `{product_type}` a preencher."""
+    system_instruction = """
+    Você é um Copywriter de elite, especializado em Marketing Digital e Vendas Diretas.
+    Sua missão é gerar um anúncio altamente persuasivo, focado em conversão e otimizado para o esboço de texto/título fornecido pelo usuário.
     
-    # Adiciona a mídia se for Imagem (image/*) ou Vídeo (video/*)
-    if media_b64 and (mime_type.startswith("image/") or mime_type.startswith("video/")):
-        contents.append({
-            "inlineData": {
-                "data": media_b64,
-                "mimeType": mime_type
-            }
-        })
-        # Adiciona instrução específica para o modelo analisar o conteúdo
-        media_type = "imagem" if mime_type.startswith("image/") else "vídeo"
+    Instruções de Tom: O tom de voz deve ser {tone}.
+    Instruções de Estrutura: Use o Framework AIDA (Atenção, Interesse, Desejo, Ação).
+    A copy deve ser concisa, focar no benefício do cliente e incluir gatilhos de escassez/urgência/prova social.
+    O produto é um {product_type}.
+    """
+
+    if is_premium_feature:
+        system_instruction += "\n\n⚠️ INSTRUÇÃO PREMIUM: Gere um roteiro de vídeo de 30 segundos e um gancho inicial (hook) de 3 segundos para Reels/TikTok, com foco em parar o feed. Gere também uma sugestão de 3 títulos de campanhas para teste A/B no Meta Ads."
+
+    # Adiciona instrução específica para o modelo analisar o conteúdo (Imagem ou Vídeo)
+    if media_type:
         system_instruction += f"\n\n🚨 ANALISE: A copy deve ser altamente relevante ao conteúdo do {media_type} fornecido, maximizando a conversão visual."
 
-    elif media_b64:
-        user_description += f"\n\nAVISO: O arquivo fornecido ({mime_type}) não é um formato de mídia suportado para análise direta. A análise será apenas textual."
+    return system_instruction
+
+
+def build_copy_prompt(product_type: str, tone: str, user_plan_tier: str, needs_video: bool, media_mime_type: str = None) -> Tuple[str, Dict]:
+    """Monta a instrução de sistema e o schema de saída da copy (usados também no pré-voo de tokens)."""
+    is_premium_feature = (user_plan_tier == "premium" and needs_video)
+
+    media_type = None
+    if media_mime_type and (media_mime_type.startswith("image/") or media_mime_type.startswith("video/")):
+        media_type = "imagem" if media_mime_type.startswith("image/") else "vídeo"
+
+    # Só o tom e o produto são preenchidos a cada geração; o restante da variante fica em cache
+    system_instruction = copy_instruction_template(is_premium_feature, media_type).format(tone=tone, product_type=product_type)
+    return system_instruction, copy_output_schema(is_premium_feature)
+
+
+def post_gemini(payload: Dict) -> Dict:
+    """POST no generateContent do Gemini (pool de conexões compartilhado); levanta exceção em erro HTTP."""
+    response = warmup.http_session().post(
+        f"{GEMINI_GENERATE_URL}?key={GEMINI_KEY}",
+        headers={'Content-Type': 'application/json'},
+        data=json.dumps(payload),
+        timeout=GEMINI_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    return response.json()
 
-    # Adiciona a descrição do usuário
-    contents.append({"text": user_description})
 
-    payload = {
-        "contents": contents,
-        "systemInstruction": {"parts": [{"text": system_instruction}]},
-        "config": {
-            "responseMimeType": "application/json",
-            "responseSchema": output_schema,
-            "temperature": 0.7
+def response_text(result: Dict) -> str:
+    return result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '{}')
+
+
+def generate_structured(parts: list, output_schema: Dict, temperature: float, system_instruction: str = None, usage_sink: Dict = None, cached_content: str = None) -> Dict:
+    """Gera um JSON no formato de `output_schema`, com parsing tolerante e validação.
+
+    Campos ausentes ou vazios são pedidos ao modelo em uma segunda chamada só
+    com eles (sem reenviar a mídia), em vez de regenerar o anúncio inteiro.
+    Com `cached_content`, a instrução de sistema e a mídia vêm do cache de contexto.
+    """
+    def build_payload(request_parts: list, schema: Dict) -> Dict:
+        payload = {
+            "contents": [{"role": "user", "parts": request_parts}],
+            "generationConfig": {
+                "responseMimeType": "application/json",
+                "responseSchema": schema,
+                "temperature": temperature
+            }
         }
-    }
+        if cached_content:
+            payload["cachedContent"] = cached_content
+        elif system_instruction:
+            payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+        return payload
+
+    result = post_gemini(build_payload(parts, output_schema))
+    if usage_sink is not None:
+        usage_sink.update(result.get('usageMetadata', {}))
+    data, missing = model_json.validate(model_json.parse_model_json(response_text(result)), output_schema)
+
+    if missing:
+        import requests
+
+        text_parts = [part for part in parts if "text" in part]
+        repair_parts = text_parts + [{"text": model_json.missing_fields_prompt(data, missing)}]
+        try:
+            repair = post_gemini(build_payload(repair_parts, model_json.missing_fields_schema(output_schema, missing)))
+            data, missing = model_json.merge(data, model_json.parse_model_json(response_text(repair)), output_schema)
+        except (requests.RequestException, model_json.ModelJSONError) as e:
+            # Mantém o resultado parcial: a UI exibe "N/A" nos campos que continuarem ausentes
+            logger.warning("Falha ao completar os campos ausentes %s: %s", missing, e)
+    return data
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={api_key}"
-    
-    try:
-        response = requests.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # Lógica robusta de parsing JSON
-        json_text_part = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '{}')
-        
-        # Tenta limpar o JSON se vier com Markdown (```json ... ```)
-        if json_text_part.strip().startswith('```json'):
-            json_text = json_text_part.strip().replace('```json', '').replace('```', '')
-        else:
-            json_text = json_text_part
 
-        return json.loads(json_text)
+def call_gemini_api(user_description: str, product_type: str, tone: str, user_plan_tier: str, needs_video: bool, media_b64: str, mime_type: str, usage_sink: Dict = None) -> Union[Dict, str]:
+    """Chama a API do Gemini para gerar copy multimodal (Imagem/Vídeo) em formato JSON.
+
+    Se `usage_sink` for informado, recebe o `usageMetadata` da resposta (calibração do estimador de tokens).
+    """
     
-    except json.JSONDecodeError as e:
-        return {"error": f"Erro de parsing JSON na API (Resposta inválida). Erro: {e}\nResposta Bruta: {json_text_part[:200]}..."}
+    api_key = GEMINI_KEY
+    if not api_key:
+        return {"error": "Chave de API (GEMINI_API_KEY) não configurada no secrets.toml."}
+
+    system_instruction, output_schema = build_copy_prompt(
+        product_type, tone, user_plan_tier, needs_video, mime_type if media_b64 else None
+    )
+
+    # CONSTRUÇÃO DO PAYLOAD (Multimodal com suporte a Vídeo/Imagem)
+    contents = media_parts(media_b64, mime_type)
+
+    if media_b64 and not contents:
+        user_description += f"\n\nAVISO: O arquivo fornecido ({mime_type}) não é um formato de mídia suportado para análise direta. A análise será apenas textual."
+
+    # Adiciona a descrição do usuário
+    contents.append({"text": user_description})
+
+    try:
+        return generate_structured(contents, output_schema, temperature=0.7, system_instruction=system_instruction, usage_sink=usage_sink)
+    except model_json.ModelJSONError as e:
+        return {"error": f"Erro de parsing JSON na API (Resposta inválida). Erro: {e}"}
     except Exception as e:
         return {"error": f"Erro na chamada da API de Copy: {e}"}
 
@@ -499,54 +654,138 @@ def call_gemini_strategy(ad_copy_json: Dict, user_objective: str, user_descripti
     Analise as principais plataformas (Meta Ads/Instagram, TikTok e Google Ads) e forneça a melhor estratégia.
     """
 
-    output_schema = {
-        "type": "OBJECT",
-        "properties": {
-            "plataforma_principal": {"type": "STRING", "description": "A plataforma principal mais indicada (Ex: TikTok, Instagram, Google Search) para o objetivo e porquê."},
-            "publico_alvo_detalhado": {"type": "STRING", "description": "Uma descrição detalhada do público-alvo, incluindo interesses, dor principal e faixa etária."},
-            "estrategia_de_horarios": {"type": "STRING", "description": "Sugestão dos 3 melhores horários de postagem ou veiculação de anúncios na plataforma principal, com breve justificativa."},
-            "sugestoes_de_hashtags": {"type": "STRING", "description": "5-7 hashtags estratégicas e segmentadas para a divulgação."},
-            "ideia_de_criativo": {"type": "STRING", "description": "Sugestão de uma ideia de imagem ou um esboço de texto complementar que maximize a conversão na plataforma principal."},
-        },
-        "propertyOrdering": ["plataforma_principal", "publico_alvo_detalhado", "estrategia_de_horarios", "sugestoes_de_hashtags", "ideia_de_criativo"]
-    }
-
-    if user_plan_tier == "premium":
-        output_schema['properties']['roteiro_video_estrategico'] = {"type": "STRING", "description": "Um esboço de roteiro de vídeo estratégico (30 segundos) para a plataforma principal com foco em viralização/conversão."}
-        output_schema['propertyOrdering'].append('roteiro_video_estrategico')
-        
-    payload = {
-        "contents": [{"parts": [{"text": system_instruction}]}],
-        "config": {
-            "responseMimeType": "application/json",
-            "responseSchema": output_schema,
-            "temperature": 0.5
-        }
-    }
+    output_schema = strategy_output_schema(user_plan_tier == "premium")
 
-    url = f"[https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key=](https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key=){api_key}"
-    
     try:
-        response = requests.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # Lógica robusta de parsing JSON
-        json_text_part = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '{}')
-        
-        if json_text_part.strip().startswith('```json'):
-            json_text = json_text_part.strip().replace('```json', '').replace('```', '')
-        else:
-            json_text = json_text_part
-            
-        return json.loads(json_text)
-    
-    except json.JSONDecodeError as e:
-        return {"error": f"Erro de parsing JSON na API (Resposta inválida). Erro: {e}\nResposta Bruta: {json_text_part[:200]}..."}
+        return generate_structured([{"text": system_instruction}], output_schema, temperature=0.5)
+    except model_json.ModelJSONError as e:
+        return {"error": f"Erro de parsing JSON na API (Resposta inválida). Erro: {e}"}
     except Exception as e:
         return {"error": f"Erro na chamada da API de Estratégia: {e}"}
 
+
+def media_parts(media_b64: str, mime_type: str) -> list:
+    """Parte inlineData da mídia, se for imagem ou vídeo."""
+    if media_b64 and (mime_type.startswith("image/") or mime_type.startswith("video/")):
+        return [{"inlineData": {"data": media_b64, "mimeType": mime_type}}]
+    return []
+
+
+def create_context_cache(parts: list, system_instruction: str) -> str:
+    """Cria um cachedContent com a mídia e a descrição; None se a API recusar (ex.: contexto pequeno demais)."""
+    try:
+        response = warmup.http_session().post(
+            f"{GEMINI_CACHE_URL}?key={GEMINI_KEY}",
+            json={
+                "model": f"models/{GEMINI_MODEL}",
+                "contents": [{"role": "user", "parts": parts}],
+                "systemInstruction": {"parts": [{"text": system_instruction}]},
+                "ttl": platform_fanout.CONTEXT_CACHE_TTL,
+            },
+            timeout=GEMINI_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        return response.json().get("name")
+    except Exception:
+        return None
+
+
+def delete_context_cache(name: str):
+    warmup.http_session().delete(f"https://generativelanguage.googleapis.com/v1beta/{name}", params={"key": GEMINI_KEY}, timeout=10)
+
+
+def call_gemini_fanout(user_description: str, product_type: str, tone: str, needs_video: bool, media_b64: str, mime_type: str, platforms: list, media_tokens: int = 0) -> Dict:
+    """Analisa mídia e descrição uma vez e gera copy, ganchos e hashtags de cada plataforma em paralelo."""
+    if not GEMINI_KEY:
+        return {"error": "Chave de API (GEMINI_API_KEY) não configurada no secrets.toml."}
+
+    system_instruction = platform_fanout.system_instruction(product_type, tone)
+    analysis_prompt = platform_fanout.analysis_prompt(user_description)
+    shared_parts = media_parts(media_b64, mime_type) + [{"text": analysis_prompt}]
+    # Estimativa do prompt compartilhado inteiro: decide o cache de contexto e calibra o estimador com a análise
+    shared_estimate = token_budget.estimate_prompt(analysis_prompt, system_instruction, platform_fanout.ANALYSIS_SCHEMA, media_tokens)
+
+    def analyze():
+        analysis_usage = {}
+        try:
+            context = generate_structured(
+                shared_parts, platform_fanout.ANALYSIS_SCHEMA, temperature=0.3,
+                system_instruction=system_instruction, usage_sink=analysis_usage
+            )
+        except Exception as e:
+            return {"error": f"Erro na análise compartilhada: {e}"}
+        token_budget.record_calibration(shared_estimate, analysis_usage)
+        return context
+
+    def prepare():
+        # A mídia só é reenviada às plataformas via cache; sem cache, elas recebem apenas a análise (texto)
+        if shared_estimate["total"] >= platform_fanout.CONTEXT_CACHE_MIN_TOKENS:
+            return create_context_cache(shared_parts, system_instruction)
+        return None
+
+    def generate(platform: str, context: Dict, cache_name: str) -> Dict:
+        try:
+            return generate_structured(
+                [{"text": platform_fanout.platform_prompt(platform, context, needs_video)}],
+                platform_fanout.PLATFORMS[platform]["schema"],
+                temperature=0.7,
+                system_instruction=system_instruction,
+                cached_content=cache_name
+            )
+        except Exception as e:
+            return {"error": f"Erro na geração para {platform}: {e}"}
+
+    return platform_fanout.fan_out(analyze, generate, platforms, prepare=prepare, cleanup=delete_context_cache)
+
+
+def run_fanout_generation(user_description: str, product_type: str, tone: str, user_plan_tier: str, needs_video: bool, media_b64: str, mime_type: str, platforms: list, media_tokens: int = 0) -> Tuple[Dict, Dict]:
+    """Geração multiplataforma no formato dos jobs (resultado, {}). Roda em segundo plano: não usa `st`.
+
+    Conta como falha (para o circuito) se a análise falhar ou nenhuma plataforma for gerada.
+    """
+    fanout = call_gemini_fanout(
+        user_description, product_type, tone, user_plan_tier == "premium" and needs_video,
+        media_b64, mime_type, platforms, media_tokens=media_tokens
+    )
+    if "error" not in fanout and all("error" in result for result in fanout["platforms"].values()):
+        fanout = {"error": next(iter(fanout["platforms"].values()))["error"]}
+    return fanout, {}
+
+
+def run_real_generation(user_description: str, product_type: str, tone: str, user_plan_tier: str, needs_video: bool, media_b64: str, mime_type: str, token_estimate: Dict = None) -> Tuple[Dict, Dict]:
+    """Executa as duas chamadas reais (copy e estratégia). Roda em segundo plano: não usa `st`."""
+    copy_usage = {}
+    ad_copy_json = call_gemini_api(
+        user_description=user_description, 
+        product_type=product_type, 
+        tone=tone, 
+        user_plan_tier=user_plan_tier, 
+        needs_video=needs_video,
+        media_b64=media_b64, 
+        mime_type=mime_type,
+        usage_sink=copy_usage
+    )
+    if token_estimate:
+        token_budget.record_calibration(token_estimate, copy_usage)
+
+    if isinstance(ad_copy_json, dict) and 'error' in ad_copy_json:
+        return ad_copy_json, {}
+
+    ad_strategy_json = call_gemini_strategy(
+        ad_copy_json=ad_copy_json, 
+        user_objective="Vender o curso e gerar leads qualificados.", 
+        user_description=product_type, 
+        user_plan_tier=user_plan_tier
+    )
+    return ad_copy_json, ad_strategy_json
+
+def generation_error_message(generation: Tuple[Dict, Dict]) -> str:
+    """Mensagem de erro da geração real (copy ou estratégia), ou string vazia se deu certo."""
+    for part in generation:
+        if isinstance(part, dict) and 'error' in part:
+            return part['error']
+    return ""
+
 # ----------------------------------------------------
 #            FUNÇÕES DE EXIBIÇÃO DA UI (MANTIDAS)
 # ----------------------------------------------------
@@ -560,86 +799,11 @@ def display_upgrade_page(user_id: str):
     st.markdown("Invista em copy de alta conversão para dominar o mercado.")
     
     col1, col2, col3 = st.columns(3)
-    
-    # Plano 1: Gratuito (Referência)
-    with col1:
-        st.markdown(
-            f"""
-            <div class="plan-card" style="background-color: #f7f7f7; border: 1px solid #ddd;">
-                <h4 style="color: #666; text-align: center;">Plano Grátis</h4>
-                <div style="text-align: center;">
-                    <p class="price-tag" style="color: #666;">R$ 0,00</p>
-                    <p>por mês</p>
-                </div>
-                <ul style="list-style-type: '❌ '; padding-left: 20px; font-size: 0.95em;">
-                    <li>Apenas {FREE_LIMIT} Anúncios/Sessão</li>
-                    <li>Uso Básico (AIDA)</li>
-                    <li><span style="color: #999;">Roteiros de Vídeo (Reels/TikTok)</span></li>
-                    <li><span style="color: #999;">Sugestões de Campanhas A/B</span></li>
-                </ul>
-                <div style="text-align: center; margin-top: 15px;">
-                    <button style="background-color: #ccc; color: white; border: none; padding: 10px 20px; border-radius: 8px; font-weight: bold;" disabled>
-                        SELECIONADO
-                    </button>
-                </div>
-            </div>
-            """, unsafe_allow_html=True
-        )
-    
-    # Plano 2: Essencial (Anúncios Ilimitados + AIDA/Segmentação)
-    with col2:
-        st.markdown(
-            f"""
-            <div class="plan-card" style="background-color: #e0f2ff; border: 2px solid #00bcd4;">
-                <h4 style="color: #00bcd4; text-align: center;">Plano Essencial</h4>
-                    <div style="text-align: center;">
-                    <p class="price-tag" style="color: #00bcd4;">R$ 19,90</p>
-                    <p>por mês</p>
-                </div>
-                <ul style="list-style-type: '✅ '; padding-left: 20px; font-size: 0.95em;">
-                    <li>**Anúncios Ilimitados** (Sem Restrições)</li>
-                    <li>Uso Completo (AIDA e Segmentação)</li>
-                    <li><span style="color: #999;">❌ Roteiros de Vídeo (Exclusivo Premium)</span></li>
-                    <li><span style="color: #999;">❌ Sugestões de Campanhas A/B (Exclusivo Premium)</span></li>
-                </ul>
-                <div style="text-align: center; margin-top: 15px;" class="pro-button">
-                    <a href="LINK_PARA_PAGAMENTO_ESSENCIAL" target="_blank" style="text-decoration: none;">
-                        <button style="background-color: #00bcd4 !important; box-shadow: 0 4px 8px rgba(0, 188, 212, 0.3);">
-                            ASSINAR AGORA →
-                        </button>
-                    </a>
-                </div>
-            </div>
-            """, unsafe_allow_html=True
-        )
+    plan_cards = ui_assets.plan_cards_html(FREE_LIMIT)
 
-    # Plano 3: Premium (Tudo Ilimitado + Vídeo/A/B)
-    with col3:
-        st.markdown(
-            f"""
-            <div class="plan-card plan-highlight">
-                <h4 style="color: #ff5722; text-align: center;">🏆 Plano Premium</h4>
-                    <div style="text-align: center;">
-                    <p class="strike-through">De R$ 49,90</p>
-                    <p class="price-tag" style="color: #ff5722;">R$ 34,90</p>
-                    <p>por mês **(Mais Vantajoso)**</p>
-                </div>
-                <ul style="list-style-type: '✅ '; padding-left: 20px; font-size: 0.95em;">
-                    <li>**Anúncios Ilimitados** (Sem Restrições)</li>
-                    <li>Uso Completo (AIDA e Segmentação)</li>
-                    <li>Geração de **Roteiros de Vídeo**</li>
-                    <li>Sugestões de **Campanhas A/B** (Exclusivo!)</li>
-                </ul>
-                <div style="text-align: center; margin-top: 15px;" class="pro-button">
-                    <a href="LINK_PARA_PAGAMENTO_PREMIUM" target="_blank" style="text-decoration: none;">
-                        <button>
-                            EU QUERO O PREMIUM!
-                        </button>
-                    </a>
-                </div>
-            </div>
-            """, unsafe_allow_html=True
-        )
+    for column, card_html in zip((col1, col2, col3), plan_cards):
+        with column:
+            st.markdown(card_html, unsafe_allow_html=True)
     
     st.markdown(f"---")
     st.info(f"Seu ID de acesso (UID) é: **{user_id}**")
@@ -656,307 +820,668 @@ def display_result_box(icon: str, title: str, content: str, key: str):
             label_visibility="collapsed"
         )
 
+def release_retained_media():
+    """Descarta a mídia mantida na sessão após uma geração (memória e arquivo em disco)."""
+    session_memory.release(st.session_state, 'retained_media')
+    st.session_state['retained_media_name'] = None
+
+
+def record_first_generation_latency(started: float):
+    """Registra a latência da primeira geração da sessão, separando sessões aquecidas das demais."""
+    if st.session_state.get('first_generation_recorded'):
+        return
+    st.session_state['first_generation_recorded'] = True
+    task = st.session_state.get('warmup_task')
+    warmup.record_first_generation((time.perf_counter() - started) * 1000, warmed=bool(task and task.warmed))
+
+def display_platform_assets(fanout: Dict[str, Any]):
+    """Exibe uma aba por plataforma, o contexto compartilhado e o ganho de tempo do paralelismo."""
+    st.markdown("## 🌐 Anúncios por Plataforma")
+    timings = fanout["timings"]
+    st.caption(
+        f"⏱️ {timings['total_ms'] / 1000:.1f}s no total (análise {timings['analysis_ms'] / 1000:.1f}s + plataformas em paralelo); "
+        f"em sequência seriam {timings['sequential_ms'] / 1000:.1f}s."
+    )
+
+    platforms = list(fanout["platforms"])
+    tabs = st.tabs([f"{platform_fanout.PLATFORMS[name]['icon']} {name}" for name in platforms])
+    for tab, name in zip(tabs, platforms):
+        with tab:
+            result = fanout["platforms"][name]
+            if "error" in result:
+                st.error(f"❌ {result['error']}")
+                continue
+            for field in platform_fanout.PLATFORMS[name]["schema"]["propertyOrdering"]:
+                title = field.replace("_", " ").capitalize()
+                display_result_box("▫️", title, result.get(field, "N/A"), f"platform_{name}_{field}")
+
+    with st.expander("🧠 Contexto compartilhado (análise única usada por todas as plataformas)"):
+        for field, value in fanout["context"].items():
+            st.markdown(f"**{field.replace('_', ' ').capitalize()}:** {value}")
+    st.markdown("---")
+
+def store_generation_results(user_id: str, product_type: str, tone: str, user_plan_tier: str, user_description: str, ad_copy_json: Dict, ad_strategy_json: Dict):
+    """Grava o resultado na sessão e, se for da IA (não da versão rápida), no histórico do usuário.
+
+    No modo multiplataforma, `ad_copy_json` é o resultado do fan-out (`platforms`, `context`, `timings`).
+    """
+    platform_assets = ad_copy_json if "platforms" in ad_copy_json else None
+    st.session_state['last_ad_copy'] = None if platform_assets else ad_copy_json
+    st.session_state['last_ad_strategy'] = None if platform_assets else ad_strategy_json
+    st.session_state['last_input_prompt'] = user_description
+    st.session_state['last_tone'] = tone
+    st.session_state['last_plan_tier'] = user_plan_tier
+    st.session_state['last_platform_assets'] = platform_assets
+
+    # Histórico do usuário (registro compacto + textos por hash)
+    if ad_copy_json.get(fallback_copy.FALLBACK_FLAG):
+        return
+    if st.session_state.get("db") and st.session_state["db"] != "SIMULATED":
+        try:
+            generation_history.save_generation(
+                st.session_state["db"], user_id, product_type, tone, user_plan_tier,
+                user_description, ad_copy_json, ad_strategy_json,
+                title=f"🌐 {', '.join(platform_assets['platforms'])}" if platform_assets else None
+            )
+            st.session_state['history_cursors'] = [None]
+        except Exception as e:
+            st.warning(f"⚠️ Não foi possível salvar no histórico: {e}")
+
+def display_history(user_id: str):
+    """Exibe o histórico de gerações do usuário, carregado sob demanda e paginado por cursor."""
+    st.markdown("---")
+    st.markdown("## 🗂️ Histórico de Gerações")
+
+    if not st.toggle("Mostrar meu histórico", key="history_open"):
+        return
+
+    db = st.session_state["db"]
+    cursors = st.session_state.setdefault('history_cursors', [None])
+    items_shown = 0
+    next_cursor = None
+
+    for page_cursor in cursors:
+        page = generation_history.fetch_page(db, user_id, cursor=page_cursor)
+        for item in page["items"]:
+            created_at = item.get("created_at")
+            date_label = created_at.strftime("%d/%m/%Y %H:%M") if hasattr(created_at, "strftime") else "—"
+            col_info, col_open = st.columns([4, 1])
+            with col_info:
+                st.markdown(f"**{item.get('title') or item.get('product_type') or 'Sem título'}**  \n{date_label} · {item.get('product_type', '')} · {item.get('tone', '')}")
+            with col_open:
+                if st.button("Abrir", key=f"history_open_{item['id']}", use_container_width=True):
+                    record = generation_history.load_generation(db, item)
+                    platform_assets = record["ad_copy"] if "platforms" in record["ad_copy"] else None
+                    st.session_state['last_ad_copy'] = None if platform_assets else record["ad_copy"]
+                    st.session_state['last_ad_strategy'] = None if platform_assets else record["ad_strategy"]
+                    st.session_state['last_platform_assets'] = platform_assets
+                    st.session_state['last_input_prompt'] = record["input_prompt"]
+                    st.session_state['last_tone'] = item.get("tone")
+                    st.session_state['last_plan_tier'] = item.get("plan_tier")
+                    st.rerun()
+            items_shown += 1
+        next_cursor = page["next_cursor"]
+
+    if not items_shown:
+        st.caption("Nenhuma geração salva ainda.")
+    elif next_cursor and st.button("Carregar mais", key="history_more"):
+        cursors.append(next_cursor)
+        st.rerun()
+
 
 # ----------------------------------------------------
 #                INTERFACE PRINCIPAL
 # ----------------------------------------------------
 
-st.title("🤖 AnuncIA — Gerador de Copy de Alta Conversão & Estratégia")
+def main():
+    """Executa uma rodada (rerun) completa da interface."""
+    # --- CSS PROFISSIONAL V5.0 (pré-montado uma vez por processo em ui_assets) ---
+    st.markdown(ui_assets.APP_CSS, unsafe_allow_html=True)
 
-# --- PAINEL DE LOGIN/REGISTRO NA SIDEBAR ---
-with st.sidebar:
-    st.markdown("---")
-    if st.session_state['logged_in_user_id']:
-        st.success(f"Logado como: {st.session_state['logged_in_user_email']}")
-        st.button("Sair (Logout)", on_click=handle_logout, use_container_width=True)
-    else:
-        st.markdown("## 🔑 Acesso ao Sistema")
-        login_mode = st.radio("Escolha a Ação:", ["Entrar", "Criar Conta"])
-
-        if login_mode == "Entrar":
-            with st.form("login_form"):
-                st.subheader("Login")
-                login_email = st.text_input("E-mail", key="l_email", placeholder="seu@email.com")
-                login_password = st.text_input("Senha", type="password", key="l_password")
-                
-                if st.form_submit_button("Entrar no AnuncIA", use_container_width=True):
-                    if login_email and login_password:
-                        handle_login(login_email, login_password)
-                    else:
-                        st.error("Preencha e-mail e senha.")
-
-        else: # Criar Conta
-            with st.form("register_form"):
-                st.subheader("Registro")
-                reg_email = st.text_input("E-mail", key="r_email", placeholder="seu@email.com")
-                reg_password = st.text_input("Senha", type="password", key="r_password", help="Mínimo 6 caracteres.")
-                reg_username = st.text_input("Nome de Usuário", key="r_username", placeholder="Seu nome/nick")
-                reg_phone = st.text_input("Telefone (Opcional)", key="r_phone", placeholder="(99) 99999-9999")
-                
-                if st.form_submit_button("Criar Minha Conta Grátis", use_container_width=True):
-                    if reg_email and reg_password and reg_username:
-                        if len(reg_password) >= 6:
-                            handle_register(reg_email, reg_password, reg_username, reg_phone)
-                        else:
-                            st.error("A senha deve ter no mínimo 6 caracteres.")
-                    else:
-                        st.error("Preencha E-mail, Senha e Nome de Usuário.")
-
-    # --- Variáveis de estado para checagem de plano ---
-    user_id = st.session_state.get('logged_in_user_id')
-    user_data = get_user_data(user_id) if user_id else {}
-    user_plan_tier = user_data.get("plan_tier", "free")
-    is_premium = (user_plan_tier == "premium")
-    is_dev = st.session_state.get('logged_in_user_email') and clean_email_to_doc_id(st.session_state['logged_in_user_email']) == clean_email_to_doc_id(DEVELOPER_EMAIL)
-    
-    # Bloco de Upgrade para o Premium (aparece para Free e Essencial logado)
-    if user_id and not is_premium and not is_dev:
-        st.markdown("---")
-        st.markdown("#### 🚀 Quer o Plano Premium?")
-        st.markdown("""
-        <div style="text-align: center;" class="pro-button">
-            <a href="LINK_PARA_PAGAMENTO_PREMIUM" target="_blank">
-                <button>
-                    UPGRADE (Acesso Total)
-                </button>
-            </a>
-        </div>
-        """, unsafe_allow_html=True)
-        st.markdown("---")
+    # Orçamento de memória da sessão (descarga para disco) e limpeza de sessões ociosas
+    session_memory.track_session(st.session_state)
+
+    # Identidade da sessão a partir do ID token (verificação local em cache)
+    restore_token_session()
+
+    st.title("🤖 AnuncIA — Gerador de Copy de Alta Conversão & Estratégia")
 
-    # NOVO: PAINEL DE CONTROLE DE PLANOS (Apenas para Desenvolvedor)
-    if is_dev:
+    # --- PAINEL DE LOGIN/REGISTRO NA SIDEBAR ---
+    with st.sidebar:
         st.markdown("---")
-        with st.expander("🛠️ ADMIN: Controle de Planos (Webhook Simulado)"):
-            st.info("Painel DEV: Simule a compra de um plano para o usuário logado.")
-            
-            target_email_admin = st.text_input("E-mail para Upgrade (Logado):", value=st.session_state['logged_in_user_email'])
-            
-            new_plan_admin = st.selectbox(
-                "Novo Plano:",
-                options=['free', 'essential', 'premium'],
-                index=2 # Padrão para premium
-            )
-            
-            if st.button(f"Aplicar Plano '{new_plan_admin.upper()}'", use_container_width=True):
-                if target_email_admin:
-                    success = update_user_plan(target_email_admin, new_plan_admin)
-                    if success:
-                        st.success(f"✅ Sucesso! Plano de {target_email_admin} alterado para {new_plan_admin.upper()}.")
-                        if clean_email_to_doc_id(target_email_admin) == clean_email_to_doc_id(st.session_state['logged_in_user_email']):
-                            st.rerun()
+        if st.session_state['logged_in_user_id']:
+            st.success(f"Logado como: {st.session_state['logged_in_user_email']}")
+            st.button("Sair (Logout)", on_click=handle_logout, use_container_width=True)
+        else:
+            st.markdown("## 🔑 Acesso ao Sistema")
+            login_mode = st.radio("Escolha a Ação:", ["Entrar", "Criar Conta"])
+
+            if login_mode == "Entrar":
+                with st.form("login_form"):
+                    st.subheader("Login")
+                    login_email = st.text_input("E-mail", key="l_email", placeholder="seu@email.com")
+                    login_password = st.text_input("Senha", type="password", key="l_password")
+
+                    if st.form_submit_button("Entrar no AnuncIA", use_container_width=True):
+                        if login_email and login_password:
+                            handle_login(login_email, login_password)
+                        else:
+                            st.error("Preencha e-mail e senha.")
+
+            else: # Criar Conta
+                with st.form("register_form"):
+                    st.subheader("Registro")
+                    reg_email = st.text_input("E-mail", key="r_email", placeholder="seu@email.com")
+                    reg_password = st.text_input("Senha", type="password", key="r_password", help="Mínimo 6 caracteres.")
+                    reg_username = st.text_input("Nome de Usuário", key="r_username", placeholder="Seu nome/nick")
+                    reg_phone = st.text_input("Telefone (Opcional)", key="r_phone", placeholder="(99) 99999-9999")
+
+                    if st.form_submit_button("Criar Minha Conta Grátis", use_container_width=True):
+                        if reg_email and reg_password and reg_username:
+                            if len(reg_password) >= 6:
+                                handle_register(reg_email, reg_password, reg_username, reg_phone)
+                            else:
+                                st.error("A senha deve ter no mínimo 6 caracteres.")
+                        else:
+                            st.error("Preencha E-mail, Senha e Nome de Usuário.")
+
+        # --- Variáveis de estado para checagem de plano ---
+        user_id = st.session_state.get('logged_in_user_id')
+        user_data = get_user_data(user_id) if user_id else {}
+        user_plan_tier = user_data.get("plan_tier", "free")
+        is_premium = (user_plan_tier == "premium")
+        is_dev = st.session_state.get('logged_in_user_email') and clean_email_to_doc_id(st.session_state['logged_in_user_email']) == clean_email_to_doc_id(DEVELOPER_EMAIL)
+
+        # Bloco de Upgrade para o Premium (aparece para Free e Essencial logado)
+        if user_id and not is_premium and not is_dev:
+            st.markdown("---")
+            st.markdown("#### 🚀 Quer o Plano Premium?")
+            st.markdown("""
+            <div style="text-align: center;" class="pro-button">
+                <a href="LINK_PARA_PAGAMENTO_PREMIUM" target="_blank">
+                    <button>
+                        UPGRADE (Acesso Total)
+                    </button>
+                </a>
+            </div>
+            """, unsafe_allow_html=True)
+            st.markdown("---")
+
+        # NOVO: PAINEL DE CONTROLE DE PLANOS (Apenas para Desenvolvedor)
+        if is_dev:
+            st.markdown("---")
+            with st.expander("🛠️ ADMIN: Controle de Planos (Webhook Simulado)"):
+                st.info("Painel DEV: Simule a compra de um plano para o usuário logado.")
+
+                target_email_admin = st.text_input("E-mail para Upgrade (Logado):", value=st.session_state['logged_in_user_email'])
+
+                new_plan_admin = st.selectbox(
+                    "Novo Plano:",
+                    options=['free', 'essential', 'premium'],
+                    index=2 # Padrão para premium
+                )
+
+                if st.button(f"Aplicar Plano '{new_plan_admin.upper()}'", use_container_width=True):
+                    if target_email_admin:
+                        success = update_user_plan(target_email_admin, new_plan_admin)
+                        if success:
+                            st.success(f"✅ Sucesso! Plano de {target_email_admin} alterado para {new_plan_admin.upper()}.")
+                            if clean_email_to_doc_id(target_email_admin) == clean_email_to_doc_id(st.session_state['logged_in_user_email']):
+                                st.rerun()
+                        else:
+                            st.error("Falha ao aplicar o plano. Verifique o console.")
+                    else:
+                        st.error("E-mail do usuário não pode ser vazio.")
+
+            # MIGRAÇÃO DE PLANOS EM LOTE (CSV e-mail,plano)
+            with st.expander("📦 ADMIN: Planos em Lote (CSV)"):
+                st.info("Envie um CSV com as colunas `email,plano` (free, essential ou premium).")
+                plans_csv = st.file_uploader("CSV de Planos:", type=["csv"], key="bulk_plans_csv")
+                bulk_dry_run = st.checkbox("Dry-run (apenas validar, sem gravar)", value=True)
+
+                if st.button("Processar CSV", use_container_width=True, disabled=plans_csv is None):
+                    try:
+                        rows = plan_admin.parse_plan_csv(plans_csv.getvalue().decode("utf-8-sig"))
+                    except UnicodeDecodeError:
+                        rows = None
+                        st.error("O CSV precisa estar em UTF-8. Salve o arquivo como 'CSV UTF-8' e envie novamente.")
+                    if rows is None:
+                        pass
+                    elif not (st.session_state.get("db") and st.session_state["db"] != "SIMULATED"):
+                        st.info("Função de upgrade não executada. Firebase em modo SIMULADO.")
                     else:
-                        st.error("Falha ao aplicar o plano. Verifique o console.")
+                        with st.spinner(f"Processando {len(rows)} linhas..."):
+                            report = plan_admin.bulk_update_plans(
+                                st.session_state['auth'],
+                                st.session_state["db"],
+                                rows,
+                                app=st.session_state['firebase_app'],
+                                dry_run=bulk_dry_run
+                            )
+                        counts = ", ".join(f"{status}: {n}" for status, n in report["status_counts"].items())
+                        st.success(
+                            f"{'🧪 Dry-run' if report['dry_run'] else '✅ Concluído'} em {report['total_seconds']}s "
+                            f"({report['rows_per_second']} linhas/s) — {counts}"
+                        )
+                        st.caption(f"Consulta Auth: {report['lookup_seconds']}s | Escritas Firestore: {report['write_seconds']}s")
+                        st.dataframe(report["rows"], use_container_width=True)
+
+            # MEMÓRIA POR SESSÃO (orçamento, descarga em disco e sessões ociosas)
+            with st.expander("🧠 ADMIN: Memória por Sessão"):
+                st.caption(
+                    f"Orçamento por sessão: {session_memory.SESSION_MEMORY_BUDGET_BYTES // 1024} KB | "
+                    f"Sessões ociosas são limpas após {session_memory.IDLE_SESSION_TTL_SECONDS // 60} min."
+                )
+                if st.button("Limpar Sessões Ociosas Agora", use_container_width=True):
+                    st.success(f"✅ {session_memory.evict_idle()} sessões ociosas limpas.")
+                st.dataframe(session_memory.memory_report(), use_container_width=True)
+
+            # PROFILING SOB DEMANDA (cProfile + tracemalloc nas próximas N execuções desta sessão)
+            with st.expander("⏱️ ADMIN: Profiling de Execuções"):
+                profile_runs = st.number_input("Execuções a perfilar:", min_value=1, max_value=20, value=3)
+                if st.button("Perfilar Próximas Execuções", use_container_width=True):
+                    rerun_profiler.arm(st.session_state, profile_runs)
+                st.caption(f"Execuções pendentes: {st.session_state.get(rerun_profiler.RUNS_LEFT_KEY, 0)}")
+
+                for result in st.session_state.get(rerun_profiler.RESULTS_KEY, []):
+                    st.markdown(f"**{result['run_id']}** — {result['elapsed_ms']} ms | pico de memória {result['peak_kb']} KB")
+                    st.dataframe(result["hotspots"], use_container_width=True)
+                    st.dataframe(result["allocations"], use_container_width=True)
+
+                    col_prof, col_alloc = st.columns(2)
+                    with col_prof:
+                        if result["prof_path"] and os.path.exists(result["prof_path"]):
+                            with open(result["prof_path"], "rb") as f:
+                                st.download_button(".prof", f.read(), file_name=os.path.basename(result["prof_path"]), key=f"dl_prof_{result['run_id']}", use_container_width=True)
+                    with col_alloc:
+                        if os.path.exists(result["alloc_path"]):
+                            with open(result["alloc_path"], "rb") as f:
+                                st.download_button("Alocações", f.read(), file_name=os.path.basename(result["alloc_path"]), key=f"dl_alloc_{result['run_id']}", use_container_width=True)
+
+            # AQUECIMENTO PÓS-LOGIN (passos desta sessão e latência da primeira geração)
+            with st.expander("🔥 ADMIN: Aquecimento Pós-Login"):
+                task = st.session_state.get('warmup_task')
+                if task is None:
+                    st.caption("Nenhum aquecimento nesta sessão (login anterior a este processo ou sessão restaurada).")
                 else:
-                    st.error("E-mail do usuário não pode ser vazio.")
+                    status = "concluído" if task.done else ("cancelado" if task.cancelled.is_set() else "em andamento")
+                    st.caption(f"Status: {status} | orçamento: {warmup.WARMUP_BUDGET_SECONDS}s")
+                    st.dataframe([{"passo": name, "tempo (ms)": ms, "erro": task.errors.get(name, "")} for name, ms in task.timings.items()], use_container_width=True)
+                    if task.skipped:
+                        st.caption(f"Passos pulados: {', '.join(task.skipped)}")
+                st.dataframe(warmup.first_generation_report(), use_container_width=True)
+
+            # PAINEL DE ANALYTICS DO FEEDBACK (streaming incremental a partir do último cursor)
+            with st.expander("📊 ADMIN: Analytics de Feedback"):
+                summary = feedback_analytics.load_summary()
+                full_rescan = st.checkbox("Reprocessar coleção inteira (ignora o cursor salvo)", value=False)
+
+                if st.button("Atualizar Analytics", use_container_width=True):
+                    if st.session_state.get("db") and st.session_state["db"] != "SIMULATED":
+                        with st.spinner("Lendo novos feedbacks..."):
+                            summary = feedback_analytics.refresh_summary(st.session_state["db"], full=full_rescan)
+                        refresh = summary["last_refresh"]
+                        st.success(f"✅ {refresh['new_docs']} novos feedbacks em {refresh['seconds']}s.")
+                    else:
+                        st.info("Analytics indisponível. Firebase em modo SIMULADO.")
 
+                window_label = st.selectbox("Janela de Tempo:", options=["Tudo", "Últimos 7 dias", "Últimos 30 dias"])
+                window_days = {"Tudo": None, "Últimos 7 dias": 7, "Últimos 30 dias": 30}[window_label]
+                view = feedback_analytics.window_view(summary, days=window_days)
 
-# --- CONTEÚDO PRINCIPAL ---
+                st.caption(f"Feedbacks processados: {summary['docs_processed']}")
+                st.markdown("**Por Tom de Voz**")
+                st.dataframe(feedback_analytics.bucket_rows(view["tone"], "tom"), use_container_width=True)
+                st.markdown("**Por Plano**")
+                st.dataframe(feedback_analytics.bucket_rows(view["tier"], "plano"), use_container_width=True)
 
-if not st.session_state['logged_in_user_id']:
-    st.info("Por favor, faça **Login** ou **Crie sua Conta** na barra lateral para começar seu teste grátis.")
-elif st.session_state.get('show_upgrade', False):
-    display_upgrade_page(st.session_state['logged_in_user_id'])
-else:
-    user_id = st.session_state['logged_in_user_id']
-    user_data = get_user_data(user_id)
-    ads_used = user_data.get("ads_generated", 0)
-    user_plan_tier = user_data.get("plan_tier", "free")
-    
-    is_essential_or_premium = (user_plan_tier in ["essential", "premium"])
-    is_premium = (user_plan_tier == "premium")
-    is_dev = st.session_state.get('logged_in_user_email') and clean_email_to_doc_id(st.session_state['logged_in_user_email']) == clean_email_to_doc_id(DEVELOPER_EMAIL)
-    
-    st.markdown("---")
-    
-    tier_info_map = {
-        "free": {"icon": "🆓", "color": "blue", "text": "Plano Grátis"},
-        "essential": {"icon": "⚡", "color": "orange", "text": "Plano Essencial"},
-        "premium": {"icon": "👑", "color": "green", "text": "Plano Premium"}
-    }
-    current_tier_info = tier_info_map.get(user_plan_tier, tier_info_map["free"])
-        
-    col_status, col_upgrade_link = st.columns([2, 1])
 
-    with col_status:
-        if is_dev:
-            st.markdown(f"**Status:** ⭐ **Acesso de Desenvolvedor (PREMIUM Ilimitado)**")
-        else:
-            st.markdown(f"**Status:** {current_tier_info['icon']} **{current_tier_info['text']}**")
-            
-            if user_plan_tier == "free":
-                st.info(f"Usos disponíveis no Grátis: **{FREE_LIMIT - ads_used}** de **{FREE_LIMIT}**")
-
-    with col_upgrade_link:
-        if user_plan_tier == "free" or user_plan_tier == "essential":
-            st.markdown(
-                """
-                <div style="text-align: right; margin-top: 10px;" class="pro-button">
-                    <a href="LINK_PARA_PAGAMENTO_PREMIUM" target="_blank">
-                        <button style="padding: 5px 10px; font-size: 14px;">
-                            UPGRADE PREMIUM 🏆
-                        </button>
-                    </a>
-                </div>
-                """, unsafe_allow_html=True
+    # --- CONTEÚDO PRINCIPAL ---
+
+    if not st.session_state['logged_in_user_id']:
+        st.info("Por favor, faça **Login** ou **Crie sua Conta** na barra lateral para começar seu teste grátis.")
+    elif st.session_state.get('show_upgrade', False):
+        display_upgrade_page(st.session_state['logged_in_user_id'])
+    else:
+        user_id = st.session_state['logged_in_user_id']
+        user_data = get_user_data(user_id)
+        ads_used = user_data.get("ads_generated", 0)
+        user_plan_tier = user_data.get("plan_tier", "free")
+
+        is_essential_or_premium = (user_plan_tier in ["essential", "premium"])
+        is_premium = (user_plan_tier == "premium")
+        is_dev = st.session_state.get('logged_in_user_email') and clean_email_to_doc_id(st.session_state['logged_in_user_email']) == clean_email_to_doc_id(DEVELOPER_EMAIL)
+
+        st.markdown("---")
+
+        tier_info_map = {
+            "free": {"icon": "🆓", "color": "blue", "text": "Plano Grátis"},
+            "essential": {"icon": "⚡", "color": "orange", "text": "Plano Essencial"},
+            "premium": {"icon": "👑", "color": "green", "text": "Plano Premium"}
+        }
+        current_tier_info = tier_info_map.get(user_plan_tier, tier_info_map["free"])
+
+        col_status, col_upgrade_link = st.columns([2, 1])
+
+        with col_status:
+            if is_dev:
+                st.markdown(f"**Status:** ⭐ **Acesso de Desenvolvedor (PREMIUM Ilimitado)**")
+            else:
+                st.markdown(f"**Status:** {current_tier_info['icon']} **{current_tier_info['text']}**")
+
+                if user_plan_tier == "free":
+                    st.info(f"Usos disponíveis no Grátis: **{FREE_LIMIT - ads_used}** de **{FREE_LIMIT}**")
+
+        with col_upgrade_link:
+            if user_plan_tier == "free" or user_plan_tier == "essential":
+                st.markdown(
+                    """
+                    <div style="text-align: right; margin-top: 10px;" class="pro-button">
+                        <a href="LINK_PARA_PAGAMENTO_PREMIUM" target="_blank">
+                            <button style="padding: 5px 10px; font-size: 14px;">
+                                UPGRADE PREMIUM 🏆
+                            </button>
+                        </a>
+                    </div>
+                    """, unsafe_allow_html=True
+                )
+
+        # --- FORMULÁRIO DE GERAÇÃO DE COPY ---
+        with st.form("copy_form", clear_on_submit=False):
+            st.subheader("📝 Detalhes do Anúncio")
+
+            col_prod, col_tone = st.columns(2)
+            with col_prod:
+                # ALTERAÇÃO: Removido o 'value' e adicionado 'placeholder'
+                product_type = st.text_input(
+                    "Qual é o seu produto?", 
+                    value="",
+                    placeholder="Ex: Curso Online de Crescimento em Redes Sociais"
+                )
+            with col_tone:
+                tone = st.selectbox("Tom de Voz:", options=["Agressivo e Urgente", "Profissional e Informativo", "Empático e Solução de Problemas"])
+
+            # NOVO: Uploader Multimodal
+            uploaded_media = st.file_uploader(
+                "Carregue Imagem ou Vídeo (Opcional - Máx. 20MB p/ análise)", 
+                type=["png", "jpg", "jpeg", "mp4", "mov", "webm"], # Adicionando tipos de vídeo
+                key=f"uploaded_media_{st.session_state.get('upload_generation', 0)}" # Nova chave = upload liberado após o uso
             )
-            
-    # --- FORMULÁRIO DE GERAÇÃO DE COPY ---
-    with st.form("copy_form", clear_on_submit=False):
-        st.subheader("📝 Detalhes do Anúncio")
-        
-        col_prod, col_tone = st.columns(2)
-        with col_prod:
+            if st.session_state.get('retained_media_name'):
+                st.caption(f"📎 Mídia mantida da tentativa anterior: **{st.session_state['retained_media_name']}** (envie outra para substituí-la).")
+
             # ALTERAÇÃO: Removido o 'value' e adicionado 'placeholder'
-            product_type = st.text_input(
-                "Qual é o seu produto?", 
+            user_description = st.text_area(
+                "Rascunho do Conteúdo/Esboço do Anúncio (Obrigatório):", 
                 value="",
-                placeholder="Ex: Curso Online de Crescimento em Redes Sociais"
+                placeholder="Ex: Quero um anúncio que destaque meu curso que ensina a ter 10k seguidores em 30 dias e a fazer a primeira venda em 7 dias, com depoimentos de alunos que fizeram +R$5.000.",
+                height=150
             )
-        with col_tone:
-            tone = st.selectbox("Tom de Voz:", options=["Agressivo e Urgente", "Profissional e Informativo", "Empático e Solução de Problemas"])
 
-        # NOVO: Uploader Multimodal
-        uploaded_media = st.file_uploader(
-            "Carregue Imagem ou Vídeo (Opcional - Máx. 200MB p/ análise)", 
-            type=["png", "jpg", "jpeg", "mp4", "mov", "webm"] # Adicionando tipos de vídeo
-        )
-        
-        # ALTERAÇÃO: Removido o 'value' e adicionado 'placeholder'
-        user_description = st.text_area(
-            "Rascunho do Conteúdo/Esboço do Anúncio (Obrigatório):", 
-            value="",
-            placeholder="Ex: Quero um anúncio que destaque meu curso que ensina a ter 10k seguidores em 30 dias e a fazer a primeira venda em 7 dias, com depoimentos de alunos que fizeram +R$5.000.",
-            height=150
-        )
+            needs_video = False
+            if is_premium or is_dev:
+                needs_video = st.checkbox("Gerar Roteiro de Vídeo, Campanhas A/B e Gancho (Recursos Premium)", value=True)
+            else:
+                st.caption("Recursos Premium (Roteiro de Vídeo e Campanhas A/B) indisponíveis no seu plano atual.")
+
+            platforms = []
+            if is_essential_or_premium or is_dev:
+                platforms = st.multiselect(
+                    "🌐 Modo Multiplataforma (opcional): versões específicas, geradas em paralelo, para",
+                    options=list(platform_fanout.PLATFORMS),
+                    default=[],
+                    help="A mídia e o rascunho são analisados uma única vez; cada plataforma recebe copy, ganchos e hashtags próprios."
+                )
+            else:
+                st.caption("Modo Multiplataforma (Instagram, TikTok e Google Ads de uma vez) disponível nos planos Essencial e Premium.")
 
-        needs_video = False
-        if is_premium or is_dev:
-            needs_video = st.checkbox("Gerar Roteiro de Vídeo, Campanhas A/B e Gancho (Recursos Premium)", value=True)
-        else:
-            st.caption("Recursos Premium (Roteiro de Vídeo e Campanhas A/B) indisponíveis no seu plano atual.")
 
-        
-        generate_button = st.form_submit_button("🔥 GERAR ESTRATÉGIA COMPLETA", use_container_width=True)
+            generate_button = st.form_submit_button("🔥 GERAR ESTRATÉGIA COMPLETA", use_container_width=True)
 
 
-    # --- LÓGICA DE GERAÇÃO ---
-    if generate_button:
-        if not user_description or not product_type:
-            st.error("Por favor, preencha a descrição e o tipo de produto.")
-            st.stop()
+        # --- LÓGICA DE GERAÇÃO ---
+        if generate_button:
+            generation_started = time.perf_counter()
+            if uploaded_media is not None:
+                # Os bytes saem do widget (troca da chave do uploader) para a sessão, onde sobrevivem a uma
+                # tentativa recusada e podem ser descarregados em disco pelo orçamento de memória
+                session_memory.release(st.session_state, 'retained_media')
+                st.session_state['retained_media'] = {"bytes": uploaded_media.getvalue(), "mime_type": get_mime_type(uploaded_media)}
+                st.session_state['retained_media_name'] = uploaded_media.name
+                st.session_state['upload_generation'] = st.session_state.get('upload_generation', 0) + 1
 
-        if ads_used >= FREE_LIMIT and not is_essential_or_premium and not is_dev:
-            st.session_state['show_upgrade'] = True
-            st.rerun()
-            
-        else:
-            # 1. Preparação da Mídia
-            media_b64 = file_to_base64(uploaded_media)
-            mime_type = get_mime_type(uploaded_media)
-            
-            # 2. GERAÇÃO DE COPY E ROTEIRO (CHAMADA 1)
-            with st.spinner("🧠 A AnuncIA está analisando sua mídia e gerando a copy..."):
-                ad_copy_json = call_gemini_api(
-                    user_description=user_description, 
-                    product_type=product_type, 
-                    tone=tone, 
-                    user_plan_tier=user_plan_tier, 
-                    needs_video=needs_video,
-                    media_b64=media_b64, 
-                    mime_type=mime_type
-                )
-                
-            # Tratar erro da API
-            if isinstance(ad_copy_json, dict) and 'error' in ad_copy_json:
-                st.error(f"❌ Erro na Geração de Copy: {ad_copy_json['error']}")
+            if not user_description or not product_type:
+                st.error("Por favor, preencha a descrição e o tipo de produto.")
                 st.stop()
-            
-            # 3. GERAÇÃO DA ESTRATÉGIA (CHAMADA 2)
-            with st.spinner("📈 Gerando a Estratégia de Segmentação e Canais..."):
-                ad_strategy_json = call_gemini_strategy(
-                    ad_copy_json=ad_copy_json, 
-                    user_objective="Vender o curso e gerar leads qualificados.", 
-                    user_description=product_type, 
-                    user_plan_tier=user_plan_tier
-                )
 
-            if isinstance(ad_strategy_json, dict) and 'error' in ad_strategy_json:
-                st.error(f"❌ Erro na Geração de Estratégia: {ad_strategy_json['error']}")
+            if not is_essential_or_premium and not is_dev:
+                # A cota é conferida no documento atual: o perfil exibido pode vir do pré-carregamento (defasado)
+                ads_used = get_user_data(user_id, fresh=True).get("ads_generated", 0)
+            if ads_used >= FREE_LIMIT and not is_essential_or_premium and not is_dev:
+                st.session_state['show_upgrade'] = True
+                st.rerun()
+
+            # No modo simulado a cota fica no estado compartilhado: fora do ar, cada réplica teria um contador zerado
+            quota_in_shared_state = not (st.session_state.get("db") and st.session_state["db"] != "SIMULATED")
+            if quota_in_shared_state and shared_state.get_state().degraded and not is_essential_or_premium and not is_dev:
+                st.warning("⚠️ A contagem de uso do plano gratuito está temporariamente indisponível. Tente novamente em instantes.")
                 st.stop()
-            
-            # 4. INCREMENTAR CONTADOR (se for plano 'free' e não for dev)
-            if not is_dev:
-                increment_ads_count(user_id, user_plan_tier)
-            
-            # 5. SALVAR RESULTADOS NA SESSÃO
-            st.session_state['last_ad_copy'] = ad_copy_json
-            st.session_state['last_ad_strategy'] = ad_strategy_json
-            st.session_state['last_input_prompt'] = user_description
-            st.success("✅ Estratégia e Copy geradas com sucesso!")
-            st.rerun() # Para garantir que o contador na sidebar seja atualizado
-
-# --- EXIBIÇÃO DE RESULTADOS ---
-if st.session_state.get('last_ad_copy') and st.session_state.get('last_ad_strategy'):
-    ad_copy = st.session_state['last_ad_copy']
-    ad_strategy = st.session_state['last_ad_strategy']
-
-    st.markdown("## ✨ Seu Plano de Marketing Otimizado")
-    st.markdown("---")
 
-    # Coluna 1: Copy
-    col_copy, col_video = st.columns(2)
-    
-    with col_copy:
-        st.markdown("### ✍️ Copy para Anúncio (AIDA)")
-        
-        display_result_box("🎯", "Título - Gancho (Curto)", ad_copy.get("titulo_gancho", "N/A"), "copy_titulo")
-        display_result_box("📰", "Texto Principal (Copy AIDA)", ad_copy.get("copy_aida", "N/A"), "copy_body")
-        display_result_box("➡️", "Chamada para Ação (CTA)", ad_copy.get("chamada_para_acao", "N/A"), "copy_cta")
-    
-    with col_video:
-        if is_premium or is_dev:
-            st.markdown("### 🎬 Estratégia Premium (Vídeo & Meta Ads)")
-            display_result_box("⚡", "Gancho de Vídeo (3 Segundos)", ad_copy.get("gancho_video", "N/A"), "video_hook")
-            display_result_box("🎥", "Roteiro Básico (30s)", ad_copy.get("roteiro_basico", "N/A"), "video_roteiro")
-            display_result_box("💡", "Campanhas A/B (Títulos)", ad_copy.get("sugestao_campanhas", "N/A"), "campanhas_ab")
+            if not is_dev and not shared_state.allow_rate(
+                shared_state.get_state(), f"generation:{user_id}", GENERATION_RATE_LIMIT, GENERATION_RATE_WINDOW_SECONDS
+            ):
+                st.warning(f"⏱️ Muitas gerações seguidas. Aguarde um minuto (limite de {GENERATION_RATE_LIMIT} por minuto).")
+                st.stop()
+
+            else:
+                # Uma nova geração substitui a versão completa ainda pendente da anterior
+                previous = st.session_state.get('pending_generation')
+                if previous:
+                    fallback_copy.pop_job(previous["job_id"])
+                    st.session_state['pending_generation'] = None
+
+                # 1. Preparação da Mídia e pré-voo de tokens (local, antes de qualquer I/O de rede)
+                retained_media = session_memory.load(st.session_state, 'retained_media') or {}
+                media_bytes = retained_media.get("bytes")
+                mime_type = retained_media.get("mime_type") or get_mime_type(None)
+                del retained_media
+                system_instruction, output_schema = build_copy_prompt(
+                    product_type, tone, user_plan_tier, needs_video, mime_type if media_bytes else None
+                )
+                preflight = token_budget.preflight(
+                    user_description, system_instruction, output_schema, media_bytes, mime_type, user_plan_tier
+                )
+                for note in preflight["notes"]:
+                    st.warning(note)
+                user_description = preflight["description"]
+                media_b64 = media_to_base64(preflight["media_bytes"])
+                del media_bytes
+
+                # 2. GERAÇÃO REAL COM ORÇAMENTO DE LATÊNCIA: copy + estratégia, ou (modo multiplataforma) uma
+                # análise compartilhada e as plataformas em paralelo. Roda em segundo plano; se estourar o orçamento,
+                # falhar ou o circuito estiver aberto, exibe a versão rápida local e a versão completa a substitui quando terminar.
+                if platforms:
+                    real_generation = functools.partial(
+                        run_fanout_generation,
+                        user_description=user_description,
+                        product_type=product_type,
+                        tone=tone,
+                        user_plan_tier=user_plan_tier,
+                        needs_video=needs_video,
+                        media_b64=media_b64,
+                        mime_type=mime_type,
+                        platforms=platforms,
+                        media_tokens=preflight["estimate"]["media"]
+                    )
+                    spinner_text = f"🌐 Analisando sua mídia uma vez e gerando para {', '.join(platforms)} em paralelo..."
+                else:
+                    real_generation = functools.partial(
+                        run_real_generation,
+                        user_description=user_description,
+                        product_type=product_type,
+                        tone=tone,
+                        user_plan_tier=user_plan_tier,
+                        needs_video=needs_video,
+                        media_b64=media_b64,
+                        mime_type=mime_type,
+                        token_estimate=preflight["estimate"]
+                    )
+                    spinner_text = "🧠 A AnuncIA está analisando sua mídia e gerando a copy e a estratégia..."
+
+                generation = None
+                if fallback_copy.breaker.allow_request():
+                    job_id = fallback_copy.submit_job(real_generation)
+                    with st.spinner(spinner_text):
+                        job_status, generation = fallback_copy.wait_job(job_id, fallback_copy.LATENCY_BUDGET_SECONDS)
+                    if job_status == fallback_copy.JOB_RUNNING:
+                        st.session_state['pending_generation'] = {
+                            "job_id": job_id,
+                            "product_type": product_type,
+                            "tone": tone,
+                            "user_plan_tier": user_plan_tier,
+                            "user_description": user_description,
+                            "charge": not is_dev,  # A cota só é cobrada quando a versão completa chegar
+                        }
+                    else:
+                        fallback_copy.pop_job(job_id)
+
+                # Libera a mídia: o Base64 local (também preso à chamada parcial) e os bytes mantidos na sessão (memória ou disco)
+                del media_b64, real_generation
+                release_retained_media()
+
+                generation_error = generation_error_message(generation) if generation is not None else None
+                if generation is not None and not generation_error:
+                    ad_copy_json, ad_strategy_json = generation
+                else:
+                    # 3. MODO DEGRADADO: versão local por templates (instantânea e marcada como tal)
+                    if generation_error:
+                        st.warning(f"⚠️ A IA não respondeu corretamente ({generation_error}). Exibindo a versão rápida local.")
+                    ad_copy_json, ad_strategy_json = fallback_copy.generate_fallback(
+                        product_type, tone, user_description, user_plan_tier, needs_video
+                    )
+
+                # 4. INCREMENTAR CONTADOR (se for plano 'free' e não for dev; a versão rápida local não consome cota)
+                if not is_dev and not ad_copy_json.get(fallback_copy.FALLBACK_FLAG):
+                    increment_ads_count(user_id, user_plan_tier)
+
+                # 5/6. SALVAR RESULTADOS NA SESSÃO E NO HISTÓRICO
+                store_generation_results(
+                    user_id, product_type, tone, user_plan_tier, user_description, ad_copy_json, ad_strategy_json
+                )
+                st.success("✅ Estratégia e Copy geradas com sucesso!")
+                record_first_generation_latency(generation_started)
+                st.rerun() # Para garantir que o contador na sidebar seja atualizado
+
+    # --- VERSÃO COMPLETA EM SEGUNDO PLANO (substitui a versão rápida ao terminar) ---
+    pending = st.session_state.get('pending_generation')
+    poll_pending = False
+    if pending and st.session_state['logged_in_user_id']:
+        job_status, finished = fallback_copy.wait_job(pending["job_id"], timeout=0)
+        if job_status == fallback_copy.JOB_MISSING:
+            st.session_state['pending_generation'] = None
+            st.warning("⚠️ A versão completa da IA não está mais disponível (expirou ou foi perdida). A versão rápida foi mantida.")
+        elif job_status == fallback_copy.JOB_DONE:
+            fallback_copy.pop_job(pending["job_id"])
+            st.session_state['pending_generation'] = None
+            if not generation_error_message(finished):
+                if pending.get("charge"):
+                    increment_ads_count(st.session_state['logged_in_user_id'], pending["user_plan_tier"])
+                store_generation_results(
+                    st.session_state['logged_in_user_id'], pending["product_type"], pending["tone"],
+                    pending["user_plan_tier"], pending["user_description"], *finished
+                )
+                st.toast("✅ A versão completa da IA substituiu a versão rápida.")
         else:
-            st.markdown("### 🎬 Estratégia Premium (Upgrade)")
-            st.info("Faça **Upgrade para o Plano Premium** para gerar Roteiros de Vídeo (Reels/TikTok) e Sugestões de Campanhas A/B!")
-            display_upgrade_page(user_id)
+            st.info("⏳ A IA ainda está gerando a versão completa. Ela substituirá a versão rápida assim que ficar pronta.")
+            poll_pending = True  # Nova verificação automática depois que a página inteira (com a versão rápida) for exibida
 
+    # --- RESULTADOS DO MODO MULTIPLATAFORMA ---
+    if st.session_state.get('last_platform_assets') and st.session_state['logged_in_user_id']:
+        display_platform_assets(session_memory.load(st.session_state, 'last_platform_assets'))
 
-    # --- SEÇÃO DE ESTRATÉGIA ---
-    st.markdown("---")
-    st.markdown("## 📊 Estratégia de Canais e Segmentação")
+    # --- EXIBIÇÃO DE RESULTADOS ---
+    if st.session_state.get('last_ad_copy') and st.session_state.get('last_ad_strategy'):
+        ad_copy = session_memory.load(st.session_state, 'last_ad_copy')
+        ad_strategy = session_memory.load(st.session_state, 'last_ad_strategy')
 
-    col_plat, col_pub = st.columns(2)
+        st.markdown("## ✨ Seu Plano de Marketing Otimizado")
+        if ad_copy.get(fallback_copy.FALLBACK_FLAG):
+            st.warning("⚡ **Versão rápida (modo degradado):** gerada localmente por templates porque a IA está lenta ou indisponível.")
+        st.markdown("---")
 
-    with col_plat:
-        display_result_box("🚀", "Plataforma Principal Sugerida", ad_strategy.get("plataforma_principal", "N/A"), "strat_plat")
-        display_result_box("⏰", "Estratégia de Horários", ad_strategy.get("estrategia_de_horarios", "N/A"), "strat_horarios")
+        # Coluna 1: Copy
+        col_copy, col_video = st.columns(2)
 
-    with col_pub:
-        display_result_box("👤", "Público-Alvo Detalhado", ad_strategy.get("publico_alvo_detalhado", "N/A"), "strat_publico")
-        display_result_box("#️⃣", "Sugestões de Hashtags", ad_strategy.get("sugestoes_de_hashtags", "N/A"), "strat_hashtags")
+        with col_copy:
+            st.markdown("### ✍️ Copy para Anúncio (AIDA)")
 
-    display_result_box("🖼️", "Ideia de Criativo/Mídia", ad_strategy.get("ideia_de_criativo", "N/A"), "strat_criativo")
+            display_result_box("🎯", "Título - Gancho (Curto)", ad_copy.get("titulo_gancho", "N/A"), "copy_titulo")
+            display_result_box("📰", "Texto Principal (Copy AIDA)", ad_copy.get("copy_aida", "N/A"), "copy_body")
+            display_result_box("➡️", "Chamada para Ação (CTA)", ad_copy.get("chamada_para_acao", "N/A"), "copy_cta")
 
-    if is_premium or is_dev:
-        st.markdown("#### 🎥 Roteiro Estratégico Detalhado (Exclusivo Premium)")
-        display_result_box("📝", "Roteiro para Conversão/Viralização", ad_strategy.get("roteiro_video_estrategico", "N/A"), "strat_roteiro_premium")
+        with col_video:
+            if is_premium or is_dev:
+                st.markdown("### 🎬 Estratégia Premium (Vídeo & Meta Ads)")
+                display_result_box("⚡", "Gancho de Vídeo (3 Segundos)", ad_copy.get("gancho_video", "N/A"), "video_hook")
+                display_result_box("🎥", "Roteiro Básico (30s)", ad_copy.get("roteiro_basico", "N/A"), "video_roteiro")
+                display_result_box("💡", "Campanhas A/B (Títulos)", ad_copy.get("sugestao_campanhas", "N/A"), "campanhas_ab")
+            else:
+                st.markdown("### 🎬 Estratégia Premium (Upgrade)")
+                st.info("Faça **Upgrade para o Plano Premium** para gerar Roteiros de Vídeo (Reels/TikTok) e Sugestões de Campanhas A/B!")
+                display_upgrade_page(user_id)
 
-    # --- FEEDBACK ---
-    st.markdown("---")
-    st.markdown("#### Avalie a Qualidade da Geração")
-    with st.form("feedback_form"):
-        feedback_rating = st.radio(
-            "O anúncio gerado atendeu suas expectativas?",
-            options=['Ótimo! 🚀', 'Bom 👍', 'Mais ou Menos 🤔', 'Ruim 😭']
-        )
-        if st.form_submit_button("Enviar Feedback"):
-            input_prompt = st.session_state.get('last_input_prompt', 'N/A')
-            ai_response = json.dumps({**ad_copy, **ad_strategy})
-            
-            if save_user_feedback(user_id, feedback_rating, input_prompt, ai_response):
-                st.success("Obrigado! Seu feedback é crucial para melhorarmos a AnuncIA. 😊")
+
+        # --- SEÇÃO DE ESTRATÉGIA ---
+        st.markdown("---")
+        st.markdown("## 📊 Estratégia de Canais e Segmentação")
+
+        col_plat, col_pub = st.columns(2)
+
+        with col_plat:
+            display_result_box("🚀", "Plataforma Principal Sugerida", ad_strategy.get("plataforma_principal", "N/A"), "strat_plat")
+            display_result_box("⏰", "Estratégia de Horários", ad_strategy.get("estrategia_de_horarios", "N/A"), "strat_horarios")
+
+        with col_pub:
+            display_result_box("👤", "Público-Alvo Detalhado", ad_strategy.get("publico_alvo_detalhado", "N/A"), "strat_publico")
+            display_result_box("#️⃣", "Sugestões de Hashtags", ad_strategy.get("sugestoes_de_hashtags", "N/A"), "strat_hashtags")
+
+        display_result_box("🖼️", "Ideia de Criativo/Mídia", ad_strategy.get("ideia_de_criativo", "N/A"), "strat_criativo")
+
+        if is_premium or is_dev:
+            st.markdown("#### 🎥 Roteiro Estratégico Detalhado (Exclusivo Premium)")
+            display_result_box("📝", "Roteiro para Conversão/Viralização", ad_strategy.get("roteiro_video_estrategico", "N/A"), "strat_roteiro_premium")
+
+        # --- FEEDBACK ---
+        st.markdown("---")
+        st.markdown("#### Avalie a Qualidade da Geração")
+        with st.form("feedback_form"):
+            feedback_rating = st.radio(
+                "O anúncio gerado atendeu suas expectativas?",
+                options=['Ótimo! 🚀', 'Bom 👍', 'Mais ou Menos 🤔', 'Ruim 😭']
+            )
+            if st.form_submit_button("Enviar Feedback"):
+                input_prompt = session_memory.load(st.session_state, 'last_input_prompt', 'N/A')
+                ai_response = json.dumps({**fallback_copy.strip_flag(ad_copy), **fallback_copy.strip_flag(ad_strategy)})
+
+                if save_user_feedback(
+                    user_id, feedback_rating, input_prompt, ai_response,
+                    tone=st.session_state.get('last_tone'),
+                    plan_tier=st.session_state.get('last_plan_tier')
+                ):
+                    st.success("Obrigado! Seu feedback é crucial para melhorarmos a AnuncIA. 😊")
+
+    # --- HISTÓRICO ---
+    if st.session_state['logged_in_user_id'] and st.session_state.get("db") and st.session_state["db"] != "SIMULATED":
+        display_history(st.session_state['logged_in_user_id'])
+
+    # --- VERIFICAÇÃO AUTOMÁTICA DA VERSÃO COMPLETA ---
+    if poll_pending:
+        time.sleep(fallback_copy.PENDING_REFRESH_SECONDS)
+        st.rerun()
+
+
+# O Streamlit executa o script como __main__; um `import app` (ex.: bench_startup) só carrega os módulos
+if __name__ == "__main__":
+    # Profiling sob demanda (painel admin); sem custo quando desarmado
+    with rerun_profiler.profile_rerun(st.session_state):
+        main()
@@ -0,0 +1,126 @@
+"""Benchmark de inicialização a frio do app (tempo de import e time-to-first-paint).
+
+Cada rodada usa processos Python novos (cold start), medindo:
+
+    import_s         tempo do `import app` em um processo limpo (`python -X importtime`),
+                     incluindo os módulos que o app importa no topo
+    slowest_imports  os módulos com maior tempo acumulado nesse import
+    first_paint_s    tempo da primeira execução completa do script como visitante
+                     anônimo via `streamlit.testing.v1.AppTest` (tela de login)
+    heavy_loaded     módulos pesados que foram importados nessa primeira execução
+
+Uso:
+    python bench_startup.py                 # 5 rodadas
+    python bench_startup.py --runs 10 --output bench_output.txt
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ["firebase_admin", "firebase_admin.auth", "google.cloud.firestore", "requests"]
+SLOWEST_IMPORTS = 5
+
+# Linha do -X importtime: "import time:   self [us] | cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+_CHILD_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=120)
+at.run()
+t1 = time.perf_counter()
+print(json.dumps({
+    "first_paint_s": t1 - t0,
+    "heavy_loaded": [m for m in %r if m in sys.modules],
+    "exceptions": [str(e.value) for e in at.exception],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Extrai da saída do `-X importtime` o tempo acumulado (µs) de cada módulo importado."""
+    cumulative_us = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative_us[match.group(3)] = int(match.group(2))
+    return cumulative_us
+
+
+def _stderr_tail(stderr: str, lines: int = 5) -> str:
+    return "\n".join([line for line in stderr.splitlines() if not line.startswith("import time:")][-lines:])
+
+
+def measure_app_import() -> Dict[str, Any]:
+    """Importa o app em um processo novo com `-X importtime` e devolve o tempo acumulado do `import app`.
+
+    O `main()` do app só roda como __main__, então o import mede apenas o carregamento dos módulos.
+    Um código de saída diferente de zero (ex.: aviso do Streamlit ao sair) não invalida a medição
+    enquanto a linha do módulo app estiver na saída.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=APP_DIR, capture_output=True, text=True,
+    )
+    cumulative_us = parse_importtime(completed.stderr)
+    if "app" not in cumulative_us:
+        raise RuntimeError(
+            f"Saída do -X importtime sem a linha do módulo app (código {completed.returncode}): "
+            f"{_stderr_tail(completed.stderr)}"
+        )
+
+    slowest = sorted((item for item in cumulative_us.items() if item[0] != "app"), key=lambda item: -item[1])
+    return {
+        "import_s": cumulative_us["app"] / 1e6,
+        "slowest_imports": [[name, round(us / 1e6, 4)] for name, us in slowest[:SLOWEST_IMPORTS]],
+    }
+
+
+def run_once() -> Dict[str, Any]:
+    """Executa uma rodada de cold start (import e primeira execução, cada um em um subprocesso) e devolve as medições."""
+    completed = subprocess.run(
+        [sys.executable, "-c", _CHILD_SCRIPT],
+        cwd=APP_DIR, capture_output=True, text=True,
+    )
+    lines = completed.stdout.strip().splitlines()
+    if not lines:
+        raise RuntimeError(
+            f"A primeira execução não produziu medição (código {completed.returncode}): {_stderr_tail(completed.stderr)}"
+        )
+    return {**measure_app_import(), **json.loads(lines[-1])}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de cold start do AnuncIA.")
+    parser.add_argument("--runs", type=int, default=5, help="Número de rodadas (cada uma em um processo novo).")
+    parser.add_argument("--output", default=None, help="Arquivo para anexar o resultado em JSON (uma linha por execução).")
+    args = parser.parse_args(argv)
+
+    results = [run_once() for _ in range(args.runs)]
+    summary = {
+        "runs": args.runs,
+        "import_s_median": round(statistics.median(r["import_s"] for r in results), 4),
+        "first_paint_s_median": round(statistics.median(r["first_paint_s"] for r in results), 4),
+        "first_paint_s_min": round(min(r["first_paint_s"] for r in results), 4),
+        "slowest_imports": results[-1]["slowest_imports"],
+        "heavy_loaded": sorted({m for r in results for m in r["heavy_loaded"]}),
+        "exceptions": sorted({e for r in results for e in r["exceptions"]}),
+    }
+
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
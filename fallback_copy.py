@@ -0,0 +1,298 @@
+"""Gerador local de copy em modo degradado (API do Gemini lenta ou indisponível).
+
+Quando a geração real estoura o orçamento de latência, falha, ou o circuito
+está aberto, o app exibe imediatamente uma versão montada por templates
+(determinística e em poucos milissegundos). Hashtags, plataforma e horários
+vêm do conhecimento acumulado das estratégias reais anteriores. A geração real
+continua em segundo plano e substitui a versão rápida quando termina; o estado
+do job fica no estado compartilhado, então qualquer réplica consegue buscá-lo.
+"""
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import shared_state
+
+LATENCY_BUDGET_SECONDS = 4
+PENDING_REFRESH_SECONDS = 2
+FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_SECONDS = 60
+JOB_RETENTION_SECONDS = 15 * 60
+JOB_POLL_SECONDS = 0.25
+JOB_DONE, JOB_RUNNING, JOB_MISSING = "done", "running", "missing"
+FALLBACK_FLAG = "_fallback"
+
+TONE_TEMPLATES = {
+    "Agressivo e Urgente": {
+        "titulo": ["PARE TUDO: {produto} que vai mudar seu jogo", "Últimas vagas: {produto} com condição especial", "Você ainda não tem {produto}?"],
+        "abertura": "Chega de perder tempo e dinheiro.",
+        "cta": "Garanta o seu AGORA — a oferta acaba em breve!",
+    },
+    "Profissional e Informativo": {
+        "titulo": ["{produto}: resultados comprovados para você", "Conheça {produto} e veja a diferença", "{produto} — a solução completa"],
+        "abertura": "Informação clara para uma decisão segura.",
+        "cta": "Saiba mais e comece hoje mesmo.",
+    },
+    "Empático e Solução de Problemas": {
+        "titulo": ["Sabemos como é difícil. {produto} ajuda você", "Você não precisa passar por isso sozinho: {produto}", "{produto} foi feito pensando em você"],
+        "abertura": "Se você já se sentiu travado, saiba que não está sozinho.",
+        "cta": "Dê o primeiro passo hoje — estamos com você.",
+    },
+}
+
+DEFAULT_HORARIOS = "12h–13h (pausa do almoço), 18h–20h (pós-trabalho) e 21h–22h (maior engajamento noturno)."
+DEFAULT_PLATAFORMA = "Instagram (Meta Ads)"
+
+
+# ----------------------------------------------------
+#            CONHECIMENTO DAS ESTRATÉGIAS REAIS
+# ----------------------------------------------------
+
+class StrategyKnowledge:
+    """Acumula hashtags, plataformas e horários das estratégias reais já geradas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hashtags = Counter()
+        self.platforms = Counter()
+        self.horarios = Counter()
+
+    def learn(self, ad_strategy: Dict[str, Any]) -> None:
+        if not ad_strategy or ad_strategy.get(FALLBACK_FLAG):
+            return
+        with self._lock:
+            self.hashtags.update(tag.lower() for tag in re.findall(r"#\w+", ad_strategy.get("sugestoes_de_hashtags", "")))
+            platform = ad_strategy.get("plataforma_principal", "").split(".")[0].split(" - ")[0].strip()
+            if platform:
+                self.platforms[platform[:60]] += 1
+            if ad_strategy.get("estrategia_de_horarios"):
+                self.horarios[ad_strategy["estrategia_de_horarios"][:300]] += 1
+
+    def top_hashtags(self, n: int):
+        with self._lock:
+            return [tag for tag, _ in self.hashtags.most_common(n)]
+
+    def top_platform(self) -> str:
+        with self._lock:
+            return self.platforms.most_common(1)[0][0] if self.platforms else DEFAULT_PLATAFORMA
+
+    def top_horarios(self) -> str:
+        with self._lock:
+            return self.horarios.most_common(1)[0][0] if self.horarios else DEFAULT_HORARIOS
+
+
+knowledge = StrategyKnowledge()
+
+
+# ----------------------------------------------------
+#                   CIRCUIT BREAKER
+# ----------------------------------------------------
+
+class CircuitBreaker:
+    """Abre após `failure_threshold` falhas seguidas; após `reset_seconds` deixa passar uma única tentativa.
+
+    Se a tentativa não reportar resultado em `reset_seconds`, outra é liberada.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_started_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _trial_available(self, now: float) -> bool:
+        if now - self._opened_at < self.reset_seconds:
+            return False
+        return self._trial_started_at is None or now - self._trial_started_at >= self.reset_seconds
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if self._trial_available(now):
+                self._trial_started_at = now  # Meio-aberto: só esta tentativa passa até ela reportar o resultado
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_started_at = None
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        """Aberto e sem tentativa disponível (não consome a tentativa do meio-aberto)."""
+        with self._lock:
+            return self._opened_at is not None and not self._trial_available(time.monotonic())
+
+
+breaker = CircuitBreaker()
+
+
+# ----------------------------------------------------
+#            GERAÇÃO REAL EM SEGUNDO PLANO (JOBS)
+# ----------------------------------------------------
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="anuncia-generation")
+_jobs: Dict[str, Dict[str, Any]] = {}
+_jobs_lock = threading.Lock()
+
+
+def _job_key(job_id: str) -> str:
+    return f"generation_job:{job_id}"
+
+
+def submit_job(fn: Callable[[], Tuple[Dict, Dict]]) -> str:
+    """Executa a geração real em segundo plano; `fn` retorna (copy, estratégia) ou dicts com "error"."""
+
+    def _run():
+        try:
+            ad_copy, ad_strategy = fn()
+        except Exception as e:
+            ad_copy, ad_strategy = {"error": f"Falha inesperada na geração: {e}"}, {}
+        failed = any(isinstance(part, dict) and "error" in part for part in (ad_copy, ad_strategy))
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+            knowledge.learn(ad_strategy)
+        shared_state.get_state().set(_job_key(job_id), {
+            "status": "done", "ad_copy": ad_copy, "ad_strategy": ad_strategy,
+        }, ttl=JOB_RETENTION_SECONDS)
+        return ad_copy, ad_strategy
+
+    job_id = uuid.uuid4().hex
+    shared_state.get_state().set(_job_key(job_id), {"status": "running"}, ttl=JOB_RETENTION_SECONDS)
+    with _jobs_lock:
+        now = time.time()
+        for old_id in [jid for jid, job in _jobs.items() if now - job["created_at"] > JOB_RETENTION_SECONDS]:
+            del _jobs[old_id]
+        _jobs[job_id] = {"future": _executor.submit(_run), "created_at": now}
+    return job_id
+
+
+def wait_job(job_id: str, timeout: float) -> Tuple[str, Optional[Tuple[Dict, Dict]]]:
+    """Espera o job até `timeout` segundos e retorna (status, resultado).
+
+    O status é `JOB_DONE` (resultado = (copy, estratégia)), `JOB_RUNNING` ou
+    `JOB_MISSING` (job expirado, descartado ou perdido; não vai terminar).
+    Jobs desta réplica são esperados pelo future; jobs de outra réplica, pelo estado compartilhado.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        try:
+            return JOB_DONE, job["future"].result(timeout=timeout)
+        except FutureTimeoutError:
+            return JOB_RUNNING, None
+
+    deadline = time.monotonic() + timeout
+    while True:
+        record = shared_state.get_state().get(_job_key(job_id))
+        if record is None:
+            return JOB_MISSING, None
+        if record["status"] == "done":
+            return JOB_DONE, (record["ad_copy"], record["ad_strategy"])
+        if time.monotonic() >= deadline:
+            return JOB_RUNNING, None
+        time.sleep(min(JOB_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+
+
+def pop_job(job_id: str) -> None:
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
+    shared_state.get_state().delete(_job_key(job_id))
+
+
+# ----------------------------------------------------
+#                 GERADOR POR TEMPLATES
+# ----------------------------------------------------
+
+def _pick(options, seed: str):
+    return options[int(hashlib.md5(seed.encode("utf-8")).hexdigest(), 16) % len(options)]
+
+
+def _hashtag(word: str) -> str:
+    ascii_word = unicodedata.normalize("NFKD", word).encode("ascii", "ignore").decode("ascii")
+    return "#" + re.sub(r"\W", "", ascii_word).lower()
+
+
+def _first_sentence(text: str, limit: int = 220) -> str:
+    sentence = re.split(r"(?<=[.!?])\s+", text.strip())[0] if text.strip() else ""
+    return sentence[:limit]
+
+
+def strip_flag(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia do resultado sem a marcação interna da versão rápida (para gravar fora da sessão)."""
+    return {key: value for key, value in data.items() if key != FALLBACK_FLAG}
+
+
+def generate_fallback(product_type: str, tone: str, user_description: str, user_plan_tier: str, needs_video: bool) -> Tuple[Dict, Dict]:
+    """Monta copy e estratégia localmente, a partir de templates e do conhecimento acumulado."""
+    templates = TONE_TEMPLATES.get(tone, TONE_TEMPLATES["Profissional e Informativo"])
+    seed = f"{product_type}|{tone}|{user_description}"
+    produto = product_type.strip() or "seu produto"
+    destaque = _first_sentence(user_description) or f"{produto} entrega o resultado que você procura."
+
+    product_tags = [_hashtag(w) for w in re.findall(r"\w{4,}", produto)][:3]
+    learned_tags = [t for t in knowledge.top_hashtags(7) if t not in product_tags]
+    hashtags = (product_tags + learned_tags + ["#oferta", "#marketingdigital", "#resultados"])[:7]
+
+    ad_copy = {
+        "titulo_gancho": _pick(templates["titulo"], seed).format(produto=produto),
+        "copy_aida": (
+            f"🎯 Atenção: {templates['abertura']}\n"
+            f"💡 Interesse: {destaque}\n"
+            f"🔥 Desejo: Imagine ter {produto} trabalhando a seu favor — quem já começou não quer voltar atrás.\n"
+            f"👉 Ação: {templates['cta']}"
+        ),
+        "chamada_para_acao": templates["cta"],
+        "segmentacao_e_ideias": (
+            f"1) Pessoas buscando ativamente por {produto}; "
+            "2) Público semelhante (lookalike) de clientes atuais; "
+            "3) Engajados com conteúdos de concorrentes nos últimos 30 dias."
+        ),
+        FALLBACK_FLAG: True,
+    }
+
+    if user_plan_tier == "premium" and needs_video:
+        ad_copy["gancho_video"] = f"“Você ainda faz isso sem {produto}?”"
+        ad_copy["roteiro_basico"] = (
+            f"0–5s (Problema): mostre a dor que {produto} resolve. "
+            f"5–20s (Solução/Benefício): {destaque} "
+            f"20–30s (CTA): {templates['cta']}"
+        )
+        ad_copy["sugestao_campanhas"] = " | ".join(template.format(produto=produto) for template in templates["titulo"])
+
+    ad_strategy = {
+        "plataforma_principal": knowledge.top_platform(),
+        "publico_alvo_detalhado": f"Pessoas de 25 a 45 anos interessadas em {produto}, que já buscaram soluções parecidas e valorizam resultado rápido.",
+        "estrategia_de_horarios": knowledge.top_horarios(),
+        "sugestoes_de_hashtags": " ".join(hashtags),
+        "ideia_de_criativo": f"Antes/depois ou depoimento curto mostrando {produto} em uso, com o título em destaque nos 3 primeiros segundos.",
+        FALLBACK_FLAG: True,
+    }
+    if user_plan_tier == "premium":
+        ad_strategy["roteiro_video_estrategico"] = ad_copy.get("roteiro_basico") or (
+            f"Gancho com a dor principal, demonstração de {produto} e CTA: {templates['cta']}"
+        )
+
+    return ad_copy, ad_strategy
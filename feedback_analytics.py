@@ -0,0 +1,287 @@
+"""Analytics incremental da coleção `feedback` do Firestore.
+
+A coleção é lida em streaming, página por página (paginação por cursor), e as
+distribuições de nota são agregadas de forma incremental por tom de voz, plano
+e janela de tempo (dia). O resumo materializado fica salvo localmente junto com
+o cursor do último documento processado (valores de `timestamp` e ID, não o
+documento em si), então cada atualização só lê o que chegou depois dele, mesmo
+que esse documento tenha sido apagado.
+
+Uso via linha de comando:
+    python feedback_analytics.py                  # atualização incremental
+    python feedback_analytics.py --full           # reprocessa a coleção inteira
+    python feedback_analytics.py --days 7         # exibe só os últimos 7 dias
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+FEEDBACK_COLLECTION = "feedback"
+DEFAULT_PAGE_SIZE = 500
+SUMMARY_VERSION = 2  # v2: cursor por valores de campo ({"timestamp", "id"})
+SUMMARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "feedback_summary.json")
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+UNKNOWN_LABEL = "desconhecido"
+DAY_FORMAT = "%Y-%m-%d"
+
+
+# ----------------------------------------------------
+#              RESUMO MATERIALIZADO (LOCAL)
+# ----------------------------------------------------
+
+def empty_summary() -> Dict[str, Any]:
+    """Retorna um resumo vazio (sem cursor, sem documentos processados)."""
+    return {
+        "version": SUMMARY_VERSION,
+        "cursor": None,
+        "docs_processed": 0,
+        "updated_at": None,
+        "by_day": {},
+    }
+
+
+def load_summary(path: str = SUMMARY_PATH) -> Dict[str, Any]:
+    """Carrega o resumo salvo em disco; retorna um resumo vazio se não existir ou for de outra versão."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return empty_summary()
+
+    if summary.get("version") != SUMMARY_VERSION:
+        return empty_summary()
+    return summary
+
+
+def save_summary(summary: Dict[str, Any], path: str = SUMMARY_PATH) -> None:
+    """Grava o resumo de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# ----------------------------------------------------
+#                 AGREGAÇÃO INCREMENTAL
+# ----------------------------------------------------
+
+def _add_to_bucket(bucket: Dict[str, Any], score: int) -> None:
+    bucket["count"] = bucket.get("count", 0) + 1
+    bucket["sum"] = bucket.get("sum", 0) + score
+    scores = bucket.setdefault("scores", {})
+    scores[str(score)] = scores.get(str(score), 0) + 1
+
+
+def _merge_bucket(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    target["count"] = target.get("count", 0) + source.get("count", 0)
+    target["sum"] = target.get("sum", 0) + source.get("sum", 0)
+    scores = target.setdefault("scores", {})
+    for score, count in source.get("scores", {}).items():
+        scores[score] = scores.get(score, 0) + count
+
+
+def _day_of(timestamp: Any) -> str:
+    if isinstance(timestamp, datetime.datetime):
+        return timestamp.strftime(DAY_FORMAT)
+    return UNKNOWN_LABEL
+
+
+def add_feedback(summary: Dict[str, Any], data: Dict[str, Any]) -> None:
+    """Agrega um documento de feedback ao resumo (memória proporcional ao nº de dias/tons/planos, não de docs)."""
+    score = int(data.get("rating_score") or 0)
+    tone = data.get("tone") or UNKNOWN_LABEL
+    tier = data.get("plan_tier") or UNKNOWN_LABEL
+
+    day = summary["by_day"].setdefault(_day_of(data.get("timestamp")), {"overall": {}, "tone": {}, "tier": {}})
+    _add_to_bucket(day["overall"], score)
+    _add_to_bucket(day["tone"].setdefault(tone, {}), score)
+    _add_to_bucket(day["tier"].setdefault(tier, {}), score)
+    summary["docs_processed"] += 1
+
+
+def window_view(summary: Dict[str, Any], days: Optional[int] = None, today: Optional[datetime.date] = None) -> Dict[str, Any]:
+    """Combina os buckets diários em uma visão única (geral, por tom e por plano).
+
+    `days=None` considera todo o histórico; caso contrário, apenas os últimos `days` dias.
+    """
+    cutoff = None
+    if days is not None:
+        today = today or datetime.datetime.now(datetime.timezone.utc).date()
+        cutoff = (today - datetime.timedelta(days=days - 1)).strftime(DAY_FORMAT)
+
+    view = {"overall": {}, "tone": {}, "tier": {}}
+    for day, buckets in summary.get("by_day", {}).items():
+        if cutoff is not None and (day == UNKNOWN_LABEL or day < cutoff):
+            continue
+        _merge_bucket(view["overall"], buckets["overall"])
+        for dimension in ("tone", "tier"):
+            for label, bucket in buckets[dimension].items():
+                _merge_bucket(view[dimension].setdefault(label, {}), bucket)
+    return view
+
+
+def bucket_rows(buckets: Dict[str, Dict[str, Any]], label_name: str) -> List[Dict[str, Any]]:
+    """Converte buckets em linhas tabulares (para st.dataframe ou impressão no terminal)."""
+    rows = []
+    for label, bucket in sorted(buckets.items(), key=lambda item: -item[1].get("count", 0)):
+        count = bucket.get("count", 0)
+        scores = bucket.get("scores", {})
+        rows.append({
+            label_name: label,
+            "total": count,
+            "média": round(bucket.get("sum", 0) / count, 2) if count else 0.0,
+            **{f"nota_{s}": scores.get(str(s), 0) for s in (1, 2, 3, 4)},
+        })
+    return rows
+
+
+# ----------------------------------------------------
+#           STREAMING COM PAGINAÇÃO POR CURSOR
+# ----------------------------------------------------
+
+def cursor_of(doc_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Cursor serializável (JSON) a partir dos valores de ordenação do documento."""
+    timestamp = data.get("timestamp")
+    return {
+        "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime.datetime) else timestamp,
+        "id": doc_id,
+    }
+
+
+def stream_feedback(db, after: Optional[Dict[str, Any]] = None, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Any]:
+    """Percorre a coleção `feedback` em ordem de (`timestamp`, ID), uma página por vez.
+
+    Apenas uma página (`page_size` documentos) fica em memória. Se `after` (ver
+    `cursor_of`) for informado, a leitura recomeça logo após esses valores, sem
+    depender de o documento do cursor ainda existir.
+    """
+    collection = db.collection(FEEDBACK_COLLECTION)
+    base_query = collection.order_by("timestamp").order_by("__name__").limit(page_size)
+
+    query = base_query
+    if after:
+        timestamp = after["timestamp"]
+        if isinstance(timestamp, str):
+            timestamp = datetime.datetime.fromisoformat(timestamp)
+        query = base_query.start_after({"timestamp": timestamp, "__name__": after["id"]})
+
+    while True:
+        page = list(query.stream())
+        for doc in page:
+            yield doc
+        if len(page) < page_size:
+            return
+        query = base_query.start_after(page[-1])
+
+
+def refresh_summary(
+    db,
+    path: str = SUMMARY_PATH,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    full: bool = False,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Atualiza o resumo materializado a partir do último cursor salvo.
+
+    O resumo é gravado a cada página processada, então uma atualização
+    interrompida continua de onde parou na próxima execução.
+    """
+    summary = empty_summary() if full else load_summary(path)
+    started = time.perf_counter()
+    new_docs = 0
+
+    for doc in stream_feedback(db, after=summary["cursor"], page_size=page_size):
+        data = doc.to_dict() or {}
+        add_feedback(summary, data)
+        summary["cursor"] = cursor_of(doc.id, data)
+        new_docs += 1
+        if new_docs % page_size == 0:
+            summary["updated_at"] = time.time()
+            save_summary(summary, path)
+            if on_progress:
+                on_progress(summary)
+
+    summary["updated_at"] = time.time()
+    summary["last_refresh"] = {"new_docs": new_docs, "seconds": round(time.perf_counter() - started, 3)}
+    save_summary(summary, path)
+    return summary
+
+
+# ----------------------------------------------------
+#                 LINHA DE COMANDO (CLI)
+# ----------------------------------------------------
+
+def _firestore_from_secrets(secrets_path: str):
+    """Cria um cliente Firestore a partir da seção [firebase] do secrets.toml (mesma correção de chave do app)."""
+    import tomllib
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    with open(secrets_path, "rb") as f:
+        firebase_config = dict(tomllib.load(f).get("firebase", {}))
+
+    if not firebase_config.get("private_key"):
+        raise SystemExit(f"Credenciais Firebase não encontradas em {secrets_path}.")
+
+    private_key = firebase_config["private_key"].strip()
+    if "\\n" in private_key:
+        private_key = private_key.replace("\\n", "\n")
+    firebase_config["private_key"] = private_key
+    firebase_config["type"] = firebase_config.get("type", "service_account")
+
+    app = firebase_admin.initialize_app(credentials.Certificate(firebase_config), name="anuncia_analytics_cli")
+    return firestore.client(app=app)
+
+
+def _print_table(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        print("  (sem dados)")
+        return
+    headers = list(rows[0].keys())
+    widths = [max(len(str(h)), *(len(str(r[h])) for r in rows)) for h in headers]
+    print("  " + "  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  " + "  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analytics incremental da coleção de feedback da AnuncIA.")
+    parser.add_argument("--secrets", default=SECRETS_PATH, help="Caminho do secrets.toml com a seção [firebase].")
+    parser.add_argument("--summary", default=SUMMARY_PATH, help="Arquivo do resumo materializado local.")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Documentos por página.")
+    parser.add_argument("--full", action="store_true", help="Ignora o cursor salvo e reprocessa tudo.")
+    parser.add_argument("--days", type=int, default=None, help="Exibe apenas os últimos N dias.")
+    parser.add_argument("--offline", action="store_true", help="Apenas exibe o resumo salvo, sem ler o Firestore.")
+    args = parser.parse_args(argv)
+
+    if args.offline:
+        summary = load_summary(args.summary)
+    else:
+        db = _firestore_from_secrets(args.secrets)
+        summary = refresh_summary(
+            db, path=args.summary, page_size=args.page_size, full=args.full,
+            on_progress=lambda s: print(f"... {s['docs_processed']} documentos processados", file=sys.stderr),
+        )
+        refresh = summary["last_refresh"]
+        print(f"Novos documentos: {refresh['new_docs']} em {refresh['seconds']}s")
+
+    view = window_view(summary, days=args.days)
+    print(f"Total processado: {summary['docs_processed']} | Janela: {'tudo' if args.days is None else f'{args.days} dias'}")
+    print("\nGeral:")
+    _print_table(bucket_rows({"todos": view["overall"]} if view["overall"] else {}, "grupo"))
+    print("\nPor tom de voz:")
+    _print_table(bucket_rows(view["tone"], "tom"))
+    print("\nPor plano:")
+    _print_table(bucket_rows(view["tier"], "plano"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
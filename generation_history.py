@@ -0,0 +1,148 @@
+"""Histórico de gerações por usuário, com registros compactos e paginação por cursor.
+
+Estrutura no Firestore:
+    users/{uid}/generations/{id}   -> registro compacto (data, produto, tom, título e hashes)
+    generation_blobs/{sha256}      -> texto grande (copy, estratégia, prompt), gravado uma única vez
+
+Abrir o histórico custa uma consulta pequena na subcoleção do usuário
+(`order_by created_at desc + limit`), atendida pelo índice automático de campo
+único. A paginação usa como cursor os valores de campo do último registro
+(`created_at` e id), sem ler o documento de novo. As páginas já buscadas ficam
+em cache com TTL no estado compartilhado (vistas por todas as réplicas; uma
+nova geração invalida as páginas do usuário trocando a versão do histórico
+dele) e os blobs, imutáveis por serem endereçados por hash, ficam em um cache
+LRU local e no estado compartilhado.
+"""
+
+import hashlib
+import json
+import uuid
+from typing import Any, Dict, List, Optional
+
+import shared_state
+from ttl_cache import TTLCache
+
+GENERATIONS_SUBCOLLECTION = "generations"
+BLOBS_COLLECTION = "generation_blobs"
+DEFAULT_PAGE_SIZE = 10
+PAGE_CACHE_TTL_SECONDS = 120
+# A versão precisa sobreviver às páginas em cache que a usam; depois disso pode expirar
+HISTORY_VERSION_TTL_SECONDS = 2 * PAGE_CACHE_TTL_SECONDS
+BLOB_CACHE_TTL_SECONDS = 24 * 3600
+TITLE_PREVIEW_CHARS = 80
+
+_blob_cache = TTLCache(max_items=256, ttl_seconds=None)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _store_blob(db, text: str) -> str:
+    """Grava o texto em `generation_blobs/{sha256}` apenas se ainda não existir e devolve o hash."""
+    from google.api_core.exceptions import AlreadyExists
+
+    digest = content_hash(text)
+    if _blob_cache.get(digest) is not None:
+        return digest
+    try:
+        db.collection(BLOBS_COLLECTION).document(digest).create({"data": text, "size": len(text)})
+    except AlreadyExists:
+        pass
+    _blob_cache.set(digest, text)
+    shared_state.get_state().set(f"blob:{digest}", text, ttl=BLOB_CACHE_TTL_SECONDS)
+    return digest
+
+
+def _load_blob(db, digest: str) -> Optional[str]:
+    text = _blob_cache.get(digest)
+    if text is None:
+        state = shared_state.get_state()
+        text = state.get(f"blob:{digest}")
+        if text is None:
+            doc = db.collection(BLOBS_COLLECTION).document(digest).get()
+            if not doc.exists:
+                return None
+            text = doc.to_dict().get("data")
+            state.set(f"blob:{digest}", text, ttl=BLOB_CACHE_TTL_SECONDS)
+        _blob_cache.set(digest, text)
+    return text
+
+
+def _generations_ref(db, user_id: str):
+    return db.collection("users").document(user_id).collection(GENERATIONS_SUBCOLLECTION)
+
+
+def save_generation(db, user_id: str, product_type: str, tone: str, plan_tier: str, input_prompt: str, ad_copy: Dict, ad_strategy: Dict, title: Optional[str] = None) -> str:
+    """Salva uma geração no histórico do usuário e invalida as páginas em cache desse usuário.
+
+    `title` substitui o `titulo_gancho` da copy na listagem (ex.: gerações multiplataforma).
+    """
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    doc_ref = _generations_ref(db, user_id).document()
+    doc_ref.set({
+        "created_at": SERVER_TIMESTAMP,
+        "product_type": product_type,
+        "tone": tone,
+        "plan_tier": plan_tier,
+        "title": (title or ad_copy.get("titulo_gancho") or "")[:TITLE_PREVIEW_CHARS],
+        "copy_ref": _store_blob(db, json.dumps(ad_copy, ensure_ascii=False, sort_keys=True)),
+        "strategy_ref": _store_blob(db, json.dumps(ad_strategy, ensure_ascii=False, sort_keys=True)),
+        "prompt_ref": _store_blob(db, input_prompt),
+    })
+    shared_state.get_state().set(f"history_version:{user_id}", uuid.uuid4().hex, ttl=HISTORY_VERSION_TTL_SECONDS)
+    return doc_ref.id
+
+
+def _cursor_key(cursor: Optional[Dict[str, Any]]) -> str:
+    if not cursor:
+        return ""
+    created_at = cursor["created_at"]
+    return f"{created_at.isoformat() if hasattr(created_at, 'isoformat') else created_at}|{cursor['id']}"
+
+
+def fetch_page(db, user_id: str, cursor: Optional[Dict[str, Any]] = None, page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    """Retorna uma página do histórico (mais recentes primeiro).
+
+    `cursor` é o `next_cursor` da página anterior (`{"created_at", "id"}` do
+    último registro); a resposta traz `next_cursor` (None quando não há mais páginas).
+    """
+    state = shared_state.get_state()
+    cache_key = f"history_page:{user_id}:{state.get(f'history_version:{user_id}', 0)}:{_cursor_key(cursor)}:{page_size}"
+    cached = state.get(cache_key)
+    if cached is not None:
+        return cached
+
+    from google.cloud.firestore import Query
+
+    query = (
+        _generations_ref(db, user_id)
+        .order_by("created_at", direction=Query.DESCENDING)
+        .order_by("__name__", direction=Query.DESCENDING)
+        .limit(page_size)
+    )
+    if cursor:
+        query = query.start_after({"created_at": cursor["created_at"], "__name__": cursor["id"]})
+
+    items: List[Dict[str, Any]] = []
+    for doc in query.stream():
+        items.append({"id": doc.id, **doc.to_dict()})
+
+    next_cursor = None
+    if len(items) == page_size:
+        next_cursor = {"created_at": items[-1].get("created_at"), "id": items[-1]["id"]}
+    page = {"items": items, "next_cursor": next_cursor}
+    state.set(cache_key, page, ttl=PAGE_CACHE_TTL_SECONDS)
+    return page
+
+
+def load_generation(db, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Carrega (sob demanda) os textos completos de um registro do histórico."""
+    copy_text = _load_blob(db, item["copy_ref"])
+    strategy_text = _load_blob(db, item["strategy_ref"])
+    return {
+        "ad_copy": json.loads(copy_text) if copy_text else {},
+        "ad_strategy": json.loads(strategy_text) if strategy_text else {},
+        "input_prompt": _load_blob(db, item["prompt_ref"]) or "",
+    }
@@ -0,0 +1,170 @@
+"""Leitura tolerante e validação do JSON devolvido pelo Gemini.
+
+`parse_model_json()` aceita cercas de Markdown, texto antes/depois do objeto e
+respostas truncadas (descarta a string cortada e a chave pendente e fecha
+chaves/colchetes; o campo cortado fica ausente e pode ser pedido de novo). `validate()` confere o resultado contra o mesmo
+`output_schema` enviado na requisição: descarta campos fora de
+`propertyOrdering`, normaliza tipos e lista os campos ausentes, que podem ser
+pedidos ao modelo isoladamente com `missing_fields_schema()` e
+`missing_fields_prompt()` em vez de regenerar o anúncio inteiro.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_CUT_ATTEMPTS = 5
+
+
+class ModelJSONError(ValueError):
+    """A resposta do modelo não contém um objeto JSON recuperável."""
+
+
+# ----------------------------------------------------
+#                  PARSER TOLERANTE
+# ----------------------------------------------------
+
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    fence = re.match(r"^```[a-zA-Z]*\s*", text)
+    if fence:
+        text = text[fence.end():]
+        text = re.sub(r"\s*```[\s\S]*$", "", text)
+    return text
+
+
+def _close_truncated(body: str, stack: List[str], string_start: Optional[int]) -> str:
+    """Fecha uma resposta cortada no meio: string aberta, chave sem valor e chaves/colchetes.
+
+    A string cortada é descartada (não fechada): um valor pela metade não pode
+    passar por completo na validação.
+    """
+    if string_start is not None:
+        body = body[:string_start]
+
+    body = body.rstrip()
+    if stack and stack[-1] == "}":
+        # Chave pendente sem valor: {"a": "x", "b"  ou  {"a": "x", "b":
+        body = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', r"\1", body)
+    body = re.sub(r"[,:]\s*$", "", body.rstrip())
+    return body + "".join(reversed(stack))
+
+
+def extract_json_object(text: str) -> str:
+    """Recorta o primeiro objeto JSON do texto, completando-o se estiver truncado."""
+    text = _strip_fences(text or "")
+    start = text.find("{")
+    if start < 0:
+        raise ModelJSONError("Nenhum objeto JSON encontrado na resposta.")
+
+    stack: List[str] = []
+    string_start: Optional[int] = None
+    escape = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if string_start is not None:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                string_start = None
+            continue
+        if char == '"':
+            string_start = index
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return text[start:index + 1]  # Ignora o texto depois do objeto
+
+    return _close_truncated(text[start:], stack, string_start - start if string_start is not None else None)
+
+
+def parse_model_json(text: str) -> Dict[str, Any]:
+    """Converte a resposta do modelo em dict, reparando os defeitos mais comuns."""
+    candidate = extract_json_object(text)
+    for _ in range(MAX_CUT_ATTEMPTS):
+        try:
+            data = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(data, dict):
+                return data
+            raise ModelJSONError("A resposta não é um objeto JSON.")
+
+        # Vírgulas sobrando antes de fechar ({"a": "x",}) e, por fim, corte no último campo completo
+        repaired = re.sub(r",\s*([}\]])", r"\1", candidate)
+        if repaired != candidate:
+            candidate = repaired
+            continue
+        cut = candidate.rfind(",")
+        if cut <= 0:
+            break
+        candidate = extract_json_object(candidate[:cut])
+
+    raise ModelJSONError(f"JSON irrecuperável: {text[:200]}...")
+
+
+# ----------------------------------------------------
+#              VALIDAÇÃO CONTRA O OUTPUT_SCHEMA
+# ----------------------------------------------------
+
+def _coerce(value: Any, schema_type: str) -> Any:
+    """Normaliza o valor para o tipo do schema; None se vazio ou incompatível."""
+    if value is None:
+        return None
+    if schema_type == "STRING":
+        if isinstance(value, list):
+            value = "\n".join(str(item) for item in value if item not in (None, ""))
+        elif isinstance(value, dict):
+            value = "\n".join(f"{key}: {item}" for key, item in value.items())
+        value = str(value).strip()
+        return value or None
+    if schema_type in ("NUMBER", "INTEGER"):
+        try:
+            return int(value) if schema_type == "INTEGER" else float(value)
+        except (TypeError, ValueError):
+            return None
+    if schema_type == "BOOLEAN":
+        return value if isinstance(value, bool) else None
+    return value
+
+
+def validate(data: Dict[str, Any], output_schema: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Retorna (campos válidos na ordem do schema, campos ausentes ou vazios)."""
+    properties = output_schema.get("properties", {})
+    ordering = output_schema.get("propertyOrdering") or list(properties)
+
+    clean: Dict[str, Any] = {}
+    for field in ordering:
+        value = _coerce(data.get(field), properties.get(field, {}).get("type", "STRING"))
+        if value is not None:
+            clean[field] = value
+    missing = [field for field in ordering if field not in clean]
+    return clean, missing
+
+
+def missing_fields_schema(output_schema: Dict[str, Any], missing: List[str]) -> Dict[str, Any]:
+    """Schema reduzido apenas com os campos que faltaram."""
+    return {
+        "type": "OBJECT",
+        "properties": {field: output_schema["properties"][field] for field in missing},
+        "propertyOrdering": list(missing),
+    }
+
+
+def missing_fields_prompt(partial: Dict[str, Any], missing: List[str]) -> str:
+    """Pedido de complemento: envia o que já foi gerado como contexto e pede só os campos ausentes."""
+    return (
+        "O anúncio abaixo foi gerado parcialmente. Mantenha o mesmo tom e a mesma oferta e gere "
+        f"APENAS os campos ausentes: {', '.join(missing)}.\n\n"
+        f"Campos já gerados:\n{json.dumps(partial, ensure_ascii=False, indent=2)}"
+    )
+
+
+def merge(partial: Dict[str, Any], patch: Dict[str, Any], output_schema: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Junta o complemento ao resultado parcial e revalida (mantendo a ordem do schema)."""
+    return validate({**patch, **partial}, output_schema)
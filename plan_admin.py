@@ -0,0 +1,160 @@
+"""Administração de planos em lote (CSV e-mail → plano).
+
+Os usuários são resolvidos em lotes pela API de consulta em lote do Firebase
+Auth (`auth.get_users`, até 100 identificadores por chamada) e as alterações
+são aplicadas com escritas em lote do Firestore (`db.batch()`, até 500
+operações por commit), em vez de uma consulta e uma escrita por e-mail.
+"""
+
+import csv
+import io
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+VALID_PLANS = ("free", "essential", "premium")
+AUTH_LOOKUP_BATCH_SIZE = 100   # Limite do Firebase Auth para get_users
+FIRESTORE_WRITE_BATCH_SIZE = 500  # Limite de operações por WriteBatch
+
+
+def parse_plan_csv(csv_text: str) -> List[Dict[str, Any]]:
+    """Converte o CSV (e-mail,plano) em linhas com status inicial.
+
+    O cabeçalho é opcional. Linhas inválidas já saem com status "erro" e não
+    são enviadas ao Auth/Firestore. Se o mesmo e-mail aparecer mais de uma vez,
+    vale a última linha e as anteriores ficam como "duplicado".
+    """
+    rows = []
+    last_row_by_email = {}
+
+    for line_number, record in enumerate(csv.reader(io.StringIO(csv_text)), start=1):
+        if not record or not any(cell.strip() for cell in record):
+            continue
+        email = record[0].strip()
+        plan = record[1].strip().lower() if len(record) > 1 else ""
+
+        if line_number == 1 and "@" not in email:
+            continue  # Cabeçalho
+
+        row = {"line": line_number, "email": email, "plan": plan, "status": "pendente", "uid": None, "detail": ""}
+        if "@" not in email:
+            row.update(status="erro", detail="E-mail inválido.")
+        elif plan not in VALID_PLANS:
+            row.update(status="erro", detail=f"Plano inválido (use {', '.join(VALID_PLANS)}).")
+        else:
+            key = email.lower()
+            if key in last_row_by_email:
+                last_row_by_email[key].update(status="duplicado", detail=f"Substituído pela linha {line_number}.")
+            last_row_by_email[key] = row
+        rows.append(row)
+
+    return rows
+
+
+def _chunks(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def resolve_uids(
+    auth_module, emails: List[str], app=None, batch_size: int = AUTH_LOOKUP_BATCH_SIZE,
+) -> Tuple[Dict[str, Optional[str]], Dict[str, str]]:
+    """Resolve e-mails em UIDs com uma chamada `get_users` por lote.
+
+    Retorna (uid por e-mail, erro por e-mail rejeitado pelo Auth). E-mails
+    ausentes ficam como None; um e-mail malformado é reportado sozinho e não
+    interrompe os demais.
+    """
+    uid_by_email: Dict[str, Optional[str]] = {}
+    invalid: Dict[str, str] = {}
+    identifiers = []
+    for email in emails:
+        try:
+            identifiers.append(auth_module.EmailIdentifier(email))
+        except ValueError as e:
+            invalid[email.lower()] = str(e)
+        else:
+            uid_by_email[email.lower()] = None
+
+    for batch in _chunks(identifiers, batch_size):
+        result = auth_module.get_users(batch, app=app)
+        for user in result.users:
+            if user.email:
+                uid_by_email[user.email.lower()] = user.uid
+
+    return uid_by_email, invalid
+
+
+def bulk_update_plans(
+    auth_module,
+    db,
+    rows: List[Dict[str, Any]],
+    app=None,
+    dry_run: bool = False,
+    lookup_batch_size: int = AUTH_LOOKUP_BATCH_SIZE,
+    write_batch_size: int = FIRESTORE_WRITE_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """Aplica os planos das linhas pendentes e devolve o relatório por linha e de vazão.
+
+    Com `dry_run=True` os usuários são resolvidos no Auth, mas nada é gravado.
+    Assim como `update_user_plan`, a contagem `ads_generated` é zerada.
+    """
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    started = time.perf_counter()
+    pending = [row for row in rows if row["status"] == "pendente"]
+    processed = len(pending)
+
+    lookup_started = time.perf_counter()
+    try:
+        uid_by_email, invalid = resolve_uids(auth_module, [row["email"] for row in pending], app=app, batch_size=lookup_batch_size)
+    except Exception as e:
+        for row in pending:
+            row.update(status="erro", detail=f"Falha na consulta ao Auth: {e}")
+        uid_by_email, invalid, pending = {}, {}, []
+    lookup_seconds = time.perf_counter() - lookup_started
+
+    to_write = []
+    for row in pending:
+        if row["email"].lower() in invalid:
+            row.update(status="erro", detail=f"E-mail inválido: {invalid[row['email'].lower()]}")
+            continue
+        row["uid"] = uid_by_email.get(row["email"].lower())
+        if row["uid"] is None:
+            row.update(status="não encontrado", detail="Usuário não existe no Firebase Auth.")
+        elif dry_run:
+            row.update(status="simulado", detail="Dry-run: nenhuma alteração gravada.")
+        else:
+            to_write.append(row)
+
+    write_started = time.perf_counter()
+    for batch_rows in _chunks(to_write, write_batch_size):
+        batch = db.batch()
+        for row in batch_rows:
+            batch.set(db.collection("users").document(row["uid"]), {
+                "plan_tier": row["plan"],
+                "ads_generated": 0,
+                "updated_at": SERVER_TIMESTAMP,
+            }, merge=True)
+        try:
+            batch.commit()
+            for row in batch_rows:
+                row.update(status="atualizado", detail="")
+        except Exception as e:
+            for row in batch_rows:
+                row.update(status="erro", detail=f"Falha na escrita em lote: {e}")
+    write_seconds = time.perf_counter() - write_started
+
+    total_seconds = time.perf_counter() - started
+    status_counts = {}
+    for row in rows:
+        status_counts[row["status"]] = status_counts.get(row["status"], 0) + 1
+
+    return {
+        "rows": rows,
+        "dry_run": dry_run,
+        "status_counts": status_counts,
+        "lookup_seconds": round(lookup_seconds, 3),
+        "write_seconds": round(write_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "rows_per_second": round(processed / total_seconds, 1) if total_seconds > 0 else 0.0,
+    }
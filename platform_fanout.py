@@ -0,0 +1,213 @@
+"""Geração multiplataforma: uma análise compartilhada, N plataformas em paralelo.
+
+A mídia e a descrição são analisadas uma única vez (`ANALYSIS_SCHEMA`). Em
+seguida, cada plataforma recebe essa análise como contexto e gera, em
+paralelo, a própria copy, ganchos e hashtags/palavras-chave, seguindo o
+formato e os limites da plataforma. Assim a latência total fica próxima de
+análise + a plataforma mais lenta, e não N vezes o fluxo completo.
+
+O transporte (chamadas ao Gemini e cache de contexto) fica no app; este
+módulo define schemas, prompts, limites e a orquestração.
+"""
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Comparado com o prompt compartilhado inteiro (instrução, mídia e pedido de análise): é ele que vai para o cache.
+# Abaixo disso a API não aceita cache explícito (e não compensa)
+CONTEXT_CACHE_MIN_TOKENS = 1024
+CONTEXT_CACHE_TTL = "300s"
+
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "resumo_do_produto": {"type": "STRING", "description": "O que é o produto e qual a promessa central, em 2-3 frases."},
+        "publico_principal": {"type": "STRING", "description": "Quem compra: faixa etária, momento de vida e nível de consciência do problema."},
+        "dores_e_desejos": {"type": "STRING", "description": "As 3 dores e os 3 desejos mais fortes do público em relação ao produto."},
+        "beneficios_chave": {"type": "STRING", "description": "Os benefícios mais persuasivos, em ordem de impacto."},
+        "elementos_visuais": {"type": "STRING", "description": "O que a mídia mostra e o que pode ser aproveitado nos criativos (ou 'sem mídia')."},
+        "oferta_e_provas": {"type": "STRING", "description": "Oferta, gatilhos de escassez/urgência e provas sociais disponíveis no rascunho."},
+    },
+    "propertyOrdering": ["resumo_do_produto", "publico_principal", "dores_e_desejos", "beneficios_chave", "elementos_visuais", "oferta_e_provas"],
+}
+
+PLATFORMS = {
+    "Instagram": {
+        "icon": "📸",
+        "instruction": (
+            "Feed e Reels do Instagram (Meta Ads). O gancho precisa funcionar na primeira linha, antes do 'mais'. "
+            "Legenda escaneável, com quebras de linha e emojis com moderação. CTA para o botão do anúncio ou link da bio."
+        ),
+        "schema": {
+            "type": "OBJECT",
+            "properties": {
+                "gancho": {"type": "STRING", "description": "Primeira linha da legenda, que para a rolagem (máx. 125 caracteres)."},
+                "legenda": {"type": "STRING", "description": "Legenda completa no framework AIDA, formatada para o Instagram."},
+                "chamada_para_acao": {"type": "STRING", "description": "CTA curta e direta."},
+                "hashtags": {"type": "STRING", "description": "8-12 hashtags misturando nicho, médio alcance e marca."},
+                "ideia_de_criativo": {"type": "STRING", "description": "Criativo recomendado (carrossel, Reels ou imagem única) e o que mostrar."},
+            },
+            "propertyOrdering": ["gancho", "legenda", "chamada_para_acao", "hashtags", "ideia_de_criativo"],
+        },
+    },
+    "TikTok": {
+        "icon": "🎵",
+        "instruction": (
+            "TikTok (orgânico e Spark Ads). Linguagem nativa, falada e direta; nada de cara de anúncio. "
+            "O gancho precisa segurar os 3 primeiros segundos e o vídeo deve ter 15-30 segundos."
+        ),
+        "schema": {
+            "type": "OBJECT",
+            "properties": {
+                "gancho_3s": {"type": "STRING", "description": "Frase falada/texto na tela dos 3 primeiros segundos."},
+                "roteiro": {"type": "STRING", "description": "Roteiro de 15-30 segundos com marcações de tempo (gancho, desenvolvimento, CTA)."},
+                "texto_na_tela": {"type": "STRING", "description": "Sobreposições de texto curtas, uma por cena."},
+                "legenda": {"type": "STRING", "description": "Legenda curta (máx. 150 caracteres) com CTA."},
+                "hashtags": {"type": "STRING", "description": "4-6 hashtags, incluindo tendências do nicho."},
+            },
+            "propertyOrdering": ["gancho_3s", "roteiro", "texto_na_tela", "legenda", "hashtags"],
+        },
+    },
+    "Google Ads": {
+        "icon": "🔎",
+        "instruction": (
+            "Anúncio responsivo de pesquisa do Google Ads. Foco em intenção de busca e palavras-chave. "
+            "Títulos com no máximo 30 caracteres e descrições com no máximo 90 caracteres, um por linha."
+        ),
+        "schema": {
+            "type": "OBJECT",
+            "properties": {
+                "titulos": {"type": "STRING", "description": "10 títulos de no máximo 30 caracteres, um por linha."},
+                "descricoes": {"type": "STRING", "description": "4 descrições de no máximo 90 caracteres, uma por linha."},
+                "palavras_chave": {"type": "STRING", "description": "10-15 palavras-chave com tipo de correspondência ([exata], \"frase\" ou ampla), uma por linha."},
+                "palavras_chave_negativas": {"type": "STRING", "description": "5 palavras-chave negativas, uma por linha."},
+                "sitelinks": {"type": "STRING", "description": "4 sitelinks (texto de até 25 caracteres), um por linha."},
+            },
+            "propertyOrdering": ["titulos", "descricoes", "palavras_chave", "palavras_chave_negativas", "sitelinks"],
+        },
+    },
+}
+
+# Limites de caracteres por linha aplicados localmente (o modelo nem sempre respeita)
+LINE_LIMITS = {
+    ("Google Ads", "titulos"): 30,
+    ("Google Ads", "descricoes"): 90,
+    ("Google Ads", "sitelinks"): 25,
+}
+
+
+# ----------------------------------------------------
+#                       PROMPTS
+# ----------------------------------------------------
+
+def system_instruction(product_type: str, tone: str) -> str:
+    """Instrução comum à análise e às plataformas (é ela que vai para o cache de contexto)."""
+    return (
+        "Você é um Copywriter de elite e Estrategista de Mídia Digital, especializado em adaptar a mesma oferta "
+        f"para cada plataforma. O produto é um {product_type}. O tom de voz deve ser {tone}. "
+        "Foque no benefício do cliente e use gatilhos de escassez/urgência/prova social quando fizer sentido."
+    )
+
+
+def analysis_prompt(user_description: str) -> str:
+    return (
+        "Analise a mídia (se houver) e o rascunho abaixo e extraia o contexto de marketing que servirá de base "
+        f"para anúncios em várias plataformas.\n\nRascunho do usuário:\n{user_description}"
+    )
+
+
+VIDEO_INSTRUCTION = (
+    "O anunciante vai produzir vídeo: priorize formatos em vídeo e descreva cenas, falas e texto na tela "
+    "do gancho ao CTA."
+)
+
+
+def platform_prompt(platform: str, context: Dict[str, Any], needs_video: bool = False) -> str:
+    lines = "\n".join(f"- {field}: {value}" for field, value in context.items())
+    video = f" {VIDEO_INSTRUCTION}" if needs_video else ""
+    return (
+        f"Plataforma: {platform}. {PLATFORMS[platform]['instruction']}{video}\n\n"
+        f"Contexto já analisado (use-o como fonte única de verdade sobre o produto e o público):\n{lines}"
+    )
+
+
+# ----------------------------------------------------
+#                  PÓS-PROCESSAMENTO
+# ----------------------------------------------------
+
+def _shorten(line: str, limit: int) -> str:
+    if len(line) <= limit:
+        return line
+    cut = line[:limit + 1].rsplit(" ", 1)[0]
+    return cut if 0 < len(cut) <= limit else line[:limit]
+
+
+def enforce_limits(platform: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Encurta (na fronteira de palavra) as linhas que passam do limite da plataforma."""
+    for (limit_platform, field), limit in LINE_LIMITS.items():
+        if limit_platform == platform and isinstance(data.get(field), str):
+            lines = [re.sub(r"^\s*(?:\d+[.)]|[-•*])\s*", "", line).strip() for line in data[field].splitlines()]
+            data[field] = "\n".join(_shorten(line, limit) for line in lines if line)
+    return data
+
+
+# ----------------------------------------------------
+#                    ORQUESTRAÇÃO
+# ----------------------------------------------------
+
+def _timed(fn: Callable, *args):
+    started = time.perf_counter()
+    try:
+        result = fn(*args)
+    except Exception as e:
+        result = {"error": f"Falha inesperada: {e}"}
+    return result, (time.perf_counter() - started) * 1000
+
+
+def fan_out(
+    analyze: Callable[[], Dict[str, Any]],
+    generate: Callable[[str, Dict[str, Any], Any], Dict[str, Any]],
+    platforms: List[str],
+    prepare: Optional[Callable[[], Any]] = None,
+    cleanup: Optional[Callable[[Any], None]] = None,
+) -> Dict[str, Any]:
+    """Analisa uma vez e gera cada plataforma em paralelo.
+
+    `prepare` (ex.: criar o cache de contexto) roda em paralelo com a análise e
+    seu resultado é repassado a `generate(platform, context, prepared)`;
+    `cleanup(prepared)` roda ao final, mesmo em caso de erro.
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(2, len(platforms))) as pool:
+        prepared_future = pool.submit(_timed, prepare) if prepare else None
+        context, analysis_ms = _timed(analyze)
+        prepared = prepared_future.result()[0] if prepared_future else None
+        if isinstance(prepared, dict) and "error" in prepared:
+            prepared = None  # Sem cache: as plataformas recebem o contexto inline
+
+        try:
+            if "error" in context:
+                return {"error": context["error"]}
+
+            futures = {platform: pool.submit(_timed, generate, platform, context, prepared) for platform in platforms}
+            results, platform_ms = {}, {}
+            for platform, future in futures.items():
+                result, elapsed = future.result()
+                results[platform] = result if "error" in result else enforce_limits(platform, result)
+                platform_ms[platform] = round(elapsed, 1)
+        finally:
+            if cleanup and prepared is not None:
+                _timed(cleanup, prepared)
+
+    return {
+        "context": context,
+        "platforms": results,
+        "timings": {
+            "analysis_ms": round(analysis_ms, 1),
+            "platforms_ms": platform_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "sequential_ms": round(analysis_ms + sum(platform_ms.values()), 1),
+        },
+    }
@@ -0,0 +1,178 @@
+"""Profiling sob demanda das próximas N execuções (reruns) de uma sessão.
+
+O painel admin "arma" o profiler com `arm()`. Enquanto houver execuções
+pendentes, `profile_rerun()` envolve o script com cProfile e snapshots do
+tracemalloc, salva um `.prof` (abrível com pstats/snakeviz) e um relatório de
+alocações em texto, e guarda os principais hotspots na sessão para exibição.
+Desarmado, `profile_rerun()` custa apenas uma consulta ao `session_state`.
+
+O tracemalloc é global ao processo: ele fica ligado enquanto houver alguma
+execução perfilada em andamento (contagem de referências) e o pico medido
+inclui as sessões perfiladas em paralelo. Só os arquivos das últimas
+`MAX_PROFILE_FILES_RUNS` execuções são mantidos em disco.
+"""
+
+import contextlib
+import cProfile
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Dict, List
+
+PROFILE_DIR = os.path.join(tempfile.gettempdir(), "anuncia_profiles")
+RUNS_LEFT_KEY = "profile_runs_left"
+RESULTS_KEY = "profile_results"
+MAX_STORED_RESULTS = 10
+MAX_PROFILE_FILES_RUNS = 50
+TOP_HOTSPOTS = 15
+TOP_ALLOCATIONS = 15
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+def arm(state, runs: int) -> None:
+    """Ativa o profiling das próximas `runs` execuções da sessão."""
+    state[RUNS_LEFT_KEY] = max(0, int(runs))
+
+
+def profile_rerun(state):
+    """Context manager que perfila a execução atual se o profiler estiver armado."""
+    if not state.get(RUNS_LEFT_KEY):
+        return contextlib.nullcontext()
+    return _profiled_run(state)
+
+
+def _hotspots(profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, function), (_, calls, total_time, cumulative_time, _) in stats.stats.items():
+        rows.append({
+            "função": f"{os.path.basename(filename)}:{line}({function})",
+            "chamadas": calls,
+            "tempo próprio (ms)": round(total_time * 1000, 2),
+            "tempo acumulado (ms)": round(cumulative_time * 1000, 2),
+        })
+    rows.sort(key=lambda row: -row["tempo acumulado (ms)"])
+    return rows[:TOP_HOTSPOTS]
+
+
+def _allocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    rows = []
+    for stat in after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        rows.append({
+            "linha": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+            "Δ tamanho (KB)": round(stat.size_diff / 1024, 1),
+            "Δ blocos": stat.count_diff,
+            "tamanho (KB)": round(stat.size / 1024, 1),
+        })
+    return rows
+
+
+def _acquire_tracing() -> None:
+    """Liga o tracemalloc para mais uma execução perfilada (só o primeiro usuário o inicia)."""
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _started_tracing = not tracemalloc.is_tracing()
+            if _started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+
+
+def _release_tracing() -> None:
+    """Desliga o tracemalloc quando a última execução perfilada termina (se foi este módulo que o ligou)."""
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+@contextlib.contextmanager
+def _profiled_run(state):
+    _acquire_tracing()
+    try:
+        before = tracemalloc.take_snapshot()
+    except BaseException:
+        _release_tracing()
+        raise
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Outro profiler já ativo no processo (ex.: outra sessão perfilando ao mesmo tempo)
+        profiler = None
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+        try:
+            after = tracemalloc.take_snapshot()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            _release_tracing()
+
+        state[RUNS_LEFT_KEY] = max(0, state.get(RUNS_LEFT_KEY, 0) - 1)
+        _store_result(state, profiler, before, after, elapsed, peak_bytes)
+
+
+def _store_result(state, profiler, before, after, elapsed: float, peak_bytes: int) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    prof_path = os.path.join(PROFILE_DIR, f"rerun_{run_id}.prof")
+    alloc_path = os.path.join(PROFILE_DIR, f"rerun_{run_id}.alloc.txt")
+
+    allocations = _allocations(before, after)
+    with open(alloc_path, "w", encoding="utf-8") as f:
+        f.write(f"Execução {run_id} | {elapsed * 1000:.1f} ms | pico {peak_bytes / 1024:.1f} KB\n\n")
+        for stat in after.compare_to(before, "lineno")[:100]:
+            f.write(f"{stat}\n")
+
+    hotspots = []
+    if profiler is not None:
+        profiler.dump_stats(prof_path)
+        hotspots = _hotspots(profiler)
+
+    results = state.get(RESULTS_KEY, [])
+    results.insert(0, {
+        "run_id": run_id,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "peak_kb": round(peak_bytes / 1024, 1),
+        "prof_path": prof_path if profiler is not None else None,
+        "alloc_path": alloc_path,
+        "hotspots": hotspots,
+        "allocations": allocations,
+    })
+    state[RESULTS_KEY] = results[:MAX_STORED_RESULTS]
+    _prune_profile_dir()
+
+
+def _prune_profile_dir(max_runs: int = MAX_PROFILE_FILES_RUNS) -> None:
+    """Apaga os arquivos das execuções mais antigas, mantendo as `max_runs` mais recentes (de todas as sessões)."""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except OSError:
+        return
+    # run_id começa com data/hora, então a ordem alfabética é a cronológica
+    run_ids = sorted({name.split(".", 1)[0] for name in names if name.startswith("rerun_")}, reverse=True)
+    stale = set(run_ids[max_runs:])
+    for name in names:
+        if name.split(".", 1)[0] in stale:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name))
+            except OSError:
+                pass
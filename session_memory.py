@@ -0,0 +1,268 @@
+"""Orçamento de memória por sessão do Streamlit e limpeza de sessões ociosas.
+
+Cada sessão tem um orçamento (`SESSION_MEMORY_BUDGET_BYTES`). Quando os valores
+guardados em `st.session_state` passam dele, os maiores são gravados em disco
+e substituídos por um `SpilledValue` (uma referência pequena). A leitura deve
+usar `load()`, que traz o valor de volta do disco quando necessário.
+
+Na prática o maior valor da sessão é a mídia enviada (`retained_media`, os
+bytes do upload mantidos entre tentativas); os resultados de texto só são
+descarregados quando, juntos, passam do orçamento.
+
+Sessões sem atividade há mais de `IDLE_SESSION_TTL_SECONDS` têm os dados
+pesados descartados (memória e disco); o login é mantido. O objeto da sessão
+em si não é liberado aqui: ele pertence ao runtime do Streamlit, que o
+descarta quando o navegador desconecta. O registro é feito pelo id da sessão
+e o estado é localizado no runtime no momento da limpeza (ver
+`_session_state_by_id`). Pastas de descarga deixadas por sessões que não
+estão mais no registro (ex.: processo reiniciado) são apagadas na mesma
+varredura, depois de `IDLE_SESSION_TTL_SECONDS` sem modificação.
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+SESSION_MEMORY_BUDGET_BYTES = 2 * 1024 * 1024
+SPILL_MIN_BYTES = 4 * 1024
+IDLE_SESSION_TTL_SECONDS = 30 * 60
+IDLE_SWEEP_INTERVAL_SECONDS = 60
+SPILL_ROOT = os.path.join(tempfile.gettempdir(), "anuncia_sessions")
+
+# Chaves que nunca são descarregadas nem descartadas (infraestrutura e identidade)
+PROTECTED_KEYS = {"db", "auth", "firebase_app", "logged_in_user_id", "logged_in_user_email", "id_token", "refresh_token"}
+# Chaves que podem ir para o disco (valores de widgets nunca são descarregados)
+SPILLABLE_KEYS = {"retained_media", "last_ad_copy", "last_ad_strategy", "last_input_prompt", "last_platform_assets"}
+
+_registry: Dict[str, Dict[str, Any]] = {}
+_registry_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+class SpilledValue:
+    """Referência para um valor de sessão gravado em disco."""
+
+    __slots__ = ("path", "size")
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+    def __repr__(self) -> str:
+        return f"SpilledValue({self.size} bytes)"
+
+
+# ----------------------------------------------------
+#                 MEDIÇÃO E DESCARGA
+# ----------------------------------------------------
+
+def approx_size(value: Any, _depth: int = 0) -> int:
+    """Tamanho aproximado em bytes de um valor (recursivo para dicts/listas, com limite de profundidade)."""
+    if isinstance(value, SpilledValue):
+        return 0
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if hasattr(value, "size") and hasattr(value, "getvalue"):  # UploadedFile / BytesIO
+        return int(value.size) if isinstance(value.size, int) else sys.getsizeof(value)
+    if _depth < 4 and isinstance(value, dict):
+        return sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1) for k, v in value.items())
+    if _depth < 4 and isinstance(value, (list, tuple, set)):
+        return sum(approx_size(v, _depth + 1) for v in value)
+    return sys.getsizeof(value)
+
+
+def _session_dir(session_id: str) -> str:
+    return os.path.join(SPILL_ROOT, session_id)
+
+
+def _spill(session_id: str, key: str, value: Any, size: int) -> SpilledValue:
+    path = os.path.join(_session_dir(session_id), hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pkl")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return SpilledValue(path, size)
+
+
+def _keys(state) -> List[str]:
+    if hasattr(state, "keys"):
+        return list(state.keys())
+    return list(state.filtered_state.keys())
+
+
+def load(state, key: str, default: Any = None) -> Any:
+    """Lê uma chave da sessão, trazendo o valor do disco se ele tiver sido descarregado."""
+    value = state.get(key, default) if hasattr(state, "get") else default
+    if isinstance(value, SpilledValue):
+        try:
+            with open(value.path, "rb") as f:
+                return pickle.load(f)
+        except OSError:
+            return default
+    return value
+
+
+def release(state, key: str) -> None:
+    """Remove uma chave da sessão e o arquivo correspondente em disco, se houver."""
+    value = state.get(key) if hasattr(state, "get") else None
+    if isinstance(value, SpilledValue):
+        try:
+            os.remove(value.path)
+        except OSError:
+            pass
+    if key in state:
+        del state[key]
+
+
+def _is_spillable(key: str) -> bool:
+    return key in SPILLABLE_KEYS
+
+
+def enforce_budget(session_id: str, state, budget_bytes: int = SESSION_MEMORY_BUDGET_BYTES) -> Dict[str, int]:
+    """Descarrega os maiores valores da sessão para o disco até caber no orçamento."""
+    sizes = {}
+    for key in _keys(state):
+        if key in PROTECTED_KEYS:
+            continue
+        sizes[key] = approx_size(state[key])
+
+    in_memory = sum(sizes.values())
+    spilled = 0
+    for key, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        if in_memory <= budget_bytes or size < SPILL_MIN_BYTES:
+            break
+        if not _is_spillable(key):
+            continue
+        try:
+            state[key] = _spill(session_id, key, state[key], size)
+        except Exception:
+            continue  # Valor não serializável: permanece em memória
+        in_memory -= size
+        spilled += size
+
+    disk_bytes = sum(v.size for k in _keys(state) for v in [state[k]] if isinstance(v, SpilledValue))
+    return {"memory_bytes": in_memory, "disk_bytes": disk_bytes, "spilled_now": spilled}
+
+
+# ----------------------------------------------------
+#          REGISTRO DE SESSÕES E LIMPEZA DE OCIOSAS
+# ----------------------------------------------------
+
+def _current_session_id() -> Optional[str]:
+    """Id da sessão da execução atual, ou None fora do Streamlit."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def _session_state_by_id(session_id: str):
+    """`SessionState` persistente da sessão (não o wrapper de cada rerun), ou None.
+
+    O Streamlit não expõe uma API pública para isso; usamos o gerenciador de
+    sessões interno do runtime (`Runtime.instance()._session_mgr.get_session_info`)
+    só depois de conferir que ele existe nesta versão. Se não existir (ou a
+    sessão já tiver saído do runtime), retorna None e a limpeza fica restrita
+    aos arquivos em disco; a memória é liberada quando o Streamlit encerrar a sessão.
+    """
+    try:
+        from streamlit.runtime import Runtime
+    except ImportError:
+        return None
+    if not getattr(Runtime, "exists", lambda: False)():
+        return None
+    session_mgr = getattr(Runtime.instance(), "_session_mgr", None)
+    get_session_info = getattr(session_mgr, "get_session_info", None)
+    if get_session_info is None:
+        return None
+    session_info = get_session_info(session_id)
+    session = getattr(session_info, "session", None)
+    return getattr(session, "session_state", None)
+
+
+def _remove_orphan_dirs(max_idle_seconds: float) -> int:
+    """Apaga pastas de descarga de sessões fora do registro sem modificação há mais de `max_idle_seconds`."""
+    try:
+        names = os.listdir(SPILL_ROOT)
+    except OSError:
+        return 0
+    with _registry_lock:
+        active = set(_registry)
+    removed = 0
+    now = time.time()
+    for name in names:
+        path = os.path.join(SPILL_ROOT, name)
+        try:
+            stale = name not in active and now - os.path.getmtime(path) > max_idle_seconds
+        except OSError:
+            continue
+        if stale:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def _clear_session(session_id: str, state) -> None:
+    if state is not None:
+        for key in _keys(state):
+            if key not in PROTECTED_KEYS:
+                try:
+                    del state[key]
+                except KeyError:
+                    pass
+    shutil.rmtree(_session_dir(session_id), ignore_errors=True)
+
+
+def evict_idle(max_idle_seconds: float = IDLE_SESSION_TTL_SECONDS) -> int:
+    """Descarta os dados pesados das sessões ociosas e as remove do registro. Retorna quantas foram despejadas."""
+    now = time.time()
+    with _registry_lock:
+        idle = [sid for sid, entry in _registry.items() if now - entry["last_seen"] > max_idle_seconds]
+        for sid in idle:
+            del _registry[sid]
+
+    for sid in idle:
+        _clear_session(sid, _session_state_by_id(sid))
+    _remove_orphan_dirs(max_idle_seconds)
+    return len(idle)
+
+
+def track_session(state, budget_bytes: int = SESSION_MEMORY_BUDGET_BYTES) -> Optional[Dict[str, int]]:
+    """Chamado no início de cada rerun: marca atividade, aplica o orçamento e, periodicamente, limpa sessões ociosas."""
+    global _last_sweep
+
+    session_id = _current_session_id()
+    if session_id is None:
+        return None
+
+    usage = enforce_budget(session_id, state, budget_bytes)
+    with _registry_lock:
+        _registry[session_id] = {"last_seen": time.time(), **usage}
+
+    if time.time() - _last_sweep > IDLE_SWEEP_INTERVAL_SECONDS:
+        _last_sweep = time.time()
+        evict_idle()
+    return usage
+
+
+def memory_report() -> List[Dict[str, Any]]:
+    """Linhas com uso de memória/disco e tempo ocioso de cada sessão registrada (para o painel admin)."""
+    now = time.time()
+    with _registry_lock:
+        entries = list(_registry.items())
+    return [
+        {
+            "sessão": sid[:8],
+            "memória (KB)": round(entry["memory_bytes"] / 1024, 1),
+            "disco (KB)": round(entry["disk_bytes"] / 1024, 1),
+            "ociosa há (s)": int(now - entry["last_seen"]),
+        }
+        for sid, entry in sorted(entries, key=lambda item: -item[1]["memory_bytes"])
+    ]
@@ -0,0 +1,560 @@
+"""Estado compartilhado entre réplicas do app (cotas, caches, rate limit e jobs).
+
+O `st.session_state` e os caches em memória existem só no processo que atende
+a sessão. Para rodar várias réplicas atrás de um balanceador, o estado que
+precisa ser visto por todas passa por esta interface, escolhida pela URL em
+`[app] SHARED_STATE_URL` do secrets.toml:
+
+    memory://                         -> dicionário do processo (padrão; uma réplica só)
+    sqlite:////caminho/estado.db      -> arquivo SQLite (réplicas na mesma máquina/volume)
+    redis://[:senha@]host:6379/0      -> servidor Redis (protocolo RESP via socket, sem dependências)
+
+Os valores são gravados como JSON (datas viram ISO e voltam como `datetime`).
+Contadores são atômicos em todas as implementações. Se o backend remoto cair,
+`configure()` o envolve em `LocalFallbackState`: as operações passam a usar um
+`MemoryState` do processo (rate limit por réplica; cotas em `quota:` são
+recusadas) e o remoto é tentado de novo após `FAILOVER_RETRY_SECONDS`. Verificação com vários processos:
+    python shared_state.py --check sqlite:///tmp/anuncia_state.db --processes 8
+"""
+
+import abc
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+DEFAULT_URL = "memory://"
+PURGE_EVERY_WRITES = 500
+REDIS_TIMEOUT_SECONDS = 5
+FAILOVER_RETRY_SECONDS = 30
+# Limites globais que não podem valer por réplica: durante a queda, `incr_if_below` os recusa
+FAIL_CLOSED_PREFIXES = ("quota:",)
+
+logger = logging.getLogger(__name__)
+
+
+class SharedStateError(Exception):
+    """Falha de configuração ou de comunicação com o backend de estado compartilhado."""
+
+
+def _encode(value: Any) -> str:
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {"__datetime__": obj.isoformat()}
+        raise TypeError(f"Valor não serializável no estado compartilhado: {type(obj).__name__}")
+    return json.dumps(value, ensure_ascii=False, default=default)
+
+
+def _decode(raw: Optional[str]) -> Any:
+    if raw is None:
+        return None
+
+    def object_hook(obj):
+        if set(obj) == {"__datetime__"}:
+            return datetime.fromisoformat(obj["__datetime__"])
+        return obj
+    return json.loads(raw, object_hook=object_hook)
+
+
+# ----------------------------------------------------
+#                      INTERFACE
+# ----------------------------------------------------
+
+class SharedState(abc.ABC):
+    """Chave/valor com TTL e contadores atômicos. `ttl` em segundos; None = sem expiração.
+
+    Falhas do backend são levantadas como `SharedStateError`.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Soma `amount` e retorna o novo valor; o TTL só é aplicado quando a chave é criada."""
+
+    @abc.abstractmethod
+    def incr_if_below(self, key: str, limit: int, ttl: Optional[float] = None) -> Tuple[bool, int]:
+        """Incrementa somente se o valor atual for menor que `limit`. Retorna (incrementou, valor)."""
+
+    @property
+    def degraded(self) -> bool:
+        """True enquanto as operações usam um estado local no lugar do compartilhado."""
+        return False
+
+
+class MemoryState(SharedState):
+    """Implementação em memória: compartilhada entre sessões, mas restrita ao processo."""
+
+    def __init__(self):
+        self._items: Dict[str, Tuple[Optional[float], str]] = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _get_raw(self, key: str) -> Optional[str]:
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._items[key]
+            return None
+        return raw
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            raw = self._get_raw(key)
+        return default if raw is None else _decode(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._writes += 1
+            if self._writes % PURGE_EVERY_WRITES == 0:
+                now = time.time()
+                for expired in [k for k, (expires_at, _) in self._items.items() if expires_at is not None and expires_at <= now]:
+                    del self._items[expired]
+            self._items[key] = (time.time() + ttl if ttl else None, _encode(value))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        with self._lock:
+            raw = self._get_raw(key)
+            if raw is None:
+                self._items[key] = (time.time() + ttl if ttl else None, str(amount))
+                return amount
+            value = int(raw) + amount
+            self._items[key] = (self._items[key][0], str(value))
+            return value
+
+    def incr_if_below(self, key: str, limit: int, ttl: Optional[float] = None) -> Tuple[bool, int]:
+        with self._lock:
+            raw = self._get_raw(key)
+            current = int(raw) if raw is not None else 0
+            if current >= limit:
+                return False, current
+            expires_at = self._items[key][0] if raw is not None else (time.time() + ttl if ttl else None)
+            self._items[key] = (expires_at, str(current + 1))
+            return True, current + 1
+
+
+class SQLiteState(SharedState):
+    """Arquivo SQLite em modo WAL; contadores em transações `BEGIN IMMEDIATE` (atômicas entre processos)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        with self._errors():
+            os.makedirs(directory, exist_ok=True)
+            conn = self._conn()
+            conn.execute("CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+
+    @contextlib.contextmanager
+    def _errors(self):
+        try:
+            yield
+        except (sqlite3.Error, OSError) as e:
+            raise SharedStateError(f"SQLite indisponível em {self.path}: {e}") from e
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _select(self, conn: sqlite3.Connection, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        row = conn.execute(
+            "SELECT value, expires_at FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._errors():
+            row = self._select(self._conn(), key)
+        return default if row is None else _decode(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raw = _encode(value)
+        with self._errors():
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, raw, time.time() + ttl if ttl else None),
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY_WRITES == 0:
+                conn.execute("DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        with self._errors():
+            self._conn().execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def _update_counter(self, key: str, amount: int, ttl: Optional[float], limit: Optional[int]) -> Tuple[bool, int]:
+        with self._errors():
+            return self._update_counter_locked(key, amount, ttl, limit)
+
+    def _update_counter_locked(self, key: str, amount: int, ttl: Optional[float], limit: Optional[int]) -> Tuple[bool, int]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._select(conn, key)
+            current = int(row[0]) if row is not None else 0
+            if limit is not None and current >= limit:
+                conn.execute("COMMIT")
+                return False, current
+            expires_at = row[1] if row is not None else (time.time() + ttl if ttl else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, str(current + amount), expires_at),
+            )
+            conn.execute("COMMIT")
+            return True, current + amount
+        except BaseException:
+            with contextlib.suppress(sqlite3.Error):
+                conn.execute("ROLLBACK")
+            raise
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return self._update_counter(key, amount, ttl, None)[1]
+
+    def incr_if_below(self, key: str, limit: int, ttl: Optional[float] = None) -> Tuple[bool, int]:
+        return self._update_counter(key, 1, ttl, limit)
+
+
+class RedisState(SharedState):
+    """Cliente Redis mínimo (RESP sobre socket), uma conexão por thread; contadores via scripts Lua."""
+
+    INCR_SCRIPT = (
+        "local v = redis.call('INCRBY', KEYS[1], ARGV[1]) "
+        "if v == tonumber(ARGV[1]) and tonumber(ARGV[2]) > 0 then redis.call('PEXPIRE', KEYS[1], ARGV[2]) end "
+        "return v"
+    )
+    INCR_IF_BELOW_SCRIPT = (
+        "local v = tonumber(redis.call('GET', KEYS[1]) or '0') "
+        "if v >= tonumber(ARGV[1]) then return {0, v} end "
+        "v = redis.call('INCR', KEYS[1]) "
+        "if v == 1 and tonumber(ARGV[2]) > 0 then redis.call('PEXPIRE', KEYS[1], ARGV[2]) end "
+        "return {1, v}"
+    )
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=REDIS_TIMEOUT_SECONDS)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        if self.password:
+            self._roundtrip("AUTH", self.password)
+        if self.db:
+            self._roundtrip("SELECT", self.db)
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Conexão com o Redis encerrada.")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            raise SharedStateError(f"Redis: {payload.decode('utf-8')}")
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return self._local.reader.read(length + 2)[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise SharedStateError(f"Resposta RESP inesperada: {line[:50]!r}")
+
+    def _send(self, *args) -> None:
+        parts = [f"*{len(args)}\r\n".encode("utf-8")]
+        for arg in args:
+            data = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._local.sock.sendall(b"".join(parts))
+
+    def _roundtrip(self, *args):
+        self._send(*args)
+        return self._read_reply()
+
+    def execute(self, *args, idempotent: bool = True):
+        """Envia um comando; reconecta uma vez se a conexão da thread tiver caído.
+
+        Comandos não idempotentes (scripts de contador) só são reenviados se a
+        falha ocorreu antes do envio: depois dele (ex.: timeout de leitura) o
+        servidor pode já ter aplicado o comando.
+        """
+        for attempt in (1, 2):
+            sent = False
+            try:
+                if getattr(self._local, "sock", None) is None:
+                    self._connect()
+                self._send(*args)
+                sent = True
+                return self._read_reply()
+            except (OSError, ConnectionError) as e:
+                self._close()
+                if attempt == 2 or (sent and not idempotent):
+                    raise SharedStateError(f"Redis indisponível em {self.host}:{self.port}: {e}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raw = self.execute("GET", key)
+        return default if raw is None else _decode(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if ttl:
+            self.execute("SET", key, _encode(value), "PX", int(ttl * 1000))
+        else:
+            self.execute("SET", key, _encode(value))
+
+    def delete(self, key: str) -> None:
+        self.execute("DEL", key)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return self.execute("EVAL", self.INCR_SCRIPT, 1, key, amount, int((ttl or 0) * 1000), idempotent=False)
+
+    def incr_if_below(self, key: str, limit: int, ttl: Optional[float] = None) -> Tuple[bool, int]:
+        accepted, value = self.execute("EVAL", self.INCR_IF_BELOW_SCRIPT, 1, key, limit, int((ttl or 0) * 1000), idempotent=False)
+        return bool(accepted), value
+
+
+class UnavailableState(SharedState):
+    """Backend que não pôde ser aberto na inicialização: toda operação levanta `SharedStateError`."""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def _fail(self, *args, **kwargs):
+        raise SharedStateError(self.reason)
+
+    get = set = delete = incr = incr_if_below = _fail
+
+
+class LocalFallbackState(SharedState):
+    """Backend remoto com degradação para o processo: em `SharedStateError` a operação vai para um `MemoryState` local.
+
+    Depois de uma falha o remoto fica de lado por `retry_seconds` (sem pagar o
+    timeout a cada chamada). Enquanto degradado, rate limit, caches e jobs
+    valem só para esta réplica; `incr_if_below` em chaves de `FAIL_CLOSED_PREFIXES`
+    é recusado, pois um contador local zerado liberaria a cota de novo em cada réplica.
+    """
+
+    def __init__(self, primary: SharedState, retry_seconds: float = FAILOVER_RETRY_SECONDS):
+        self.primary = primary
+        self.local = MemoryState()
+        self.retry_seconds = retry_seconds
+        self.last_error: Optional[str] = None
+        self._down_until = 0.0
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self._down_until
+
+    def mark_down(self, error: Exception) -> None:
+        """Deixa o remoto de lado por `retry_seconds` e registra o modo degradado."""
+        self.last_error = str(error)
+        self._down_until = time.monotonic() + self.retry_seconds
+        logger.warning("Estado compartilhado indisponível (%s); usando o estado local por %ss.", error, self.retry_seconds)
+
+    def _call(self, method: str, *args, **kwargs) -> Tuple[bool, Any]:
+        """Executa no remoto; retorna (True, resultado) ou (False, None) se ele estiver fora do ar."""
+        if not self.degraded:
+            try:
+                return True, getattr(self.primary, method)(*args, **kwargs)
+            except SharedStateError as e:
+                self.mark_down(e)
+        return False, None
+
+    def _call_or_local(self, method: str, *args, **kwargs):
+        ok, result = self._call(method, *args, **kwargs)
+        return result if ok else getattr(self.local, method)(*args, **kwargs)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._call_or_local("get", key, default)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._call_or_local("set", key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self._call_or_local("delete", key)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return self._call_or_local("incr", key, amount, ttl=ttl)
+
+    def incr_if_below(self, key: str, limit: int, ttl: Optional[float] = None) -> Tuple[bool, int]:
+        if key.startswith(FAIL_CLOSED_PREFIXES):
+            ok, result = self._call("incr_if_below", key, limit, ttl=ttl)
+            return result if ok else (False, limit)
+        return self._call_or_local("incr_if_below", key, limit, ttl=ttl)
+
+
+# ----------------------------------------------------
+#               CONFIGURAÇÃO E UTILITÁRIOS
+# ----------------------------------------------------
+
+def from_url(url: str) -> SharedState:
+    parsed = urlparse(url or DEFAULT_URL)
+    if parsed.scheme == "memory":
+        return MemoryState()
+    if parsed.scheme == "sqlite":
+        path = unquote(parsed.path)
+        if not path or path == "/":
+            raise SharedStateError("Informe o caminho do arquivo: sqlite:////caminho/estado.db")
+        return SQLiteState(path)
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisState(parsed.hostname or "localhost", parsed.port or 6379, db, unquote(parsed.password) if parsed.password else None)
+    raise SharedStateError(f"Backend de estado compartilhado desconhecido: {url}")
+
+
+_state: Optional[SharedState] = None
+_state_url: Optional[str] = None
+_open_retry_at = 0.0
+_state_lock = threading.Lock()
+
+
+def configure(url: str) -> SharedState:
+    """Define o backend do processo (chamado a cada rerun; só recria se a URL mudar).
+
+    Se o backend não abrir, o processo segue degradado (`LocalFallbackState`
+    sobre um `UnavailableState`) e a abertura é tentada de novo só depois de
+    `FAILOVER_RETRY_SECONDS`, não a cada rerun.
+    """
+    global _state, _state_url, _open_retry_at
+    with _state_lock:
+        retry_open = url == _state_url and _open_retry_at and time.monotonic() >= _open_retry_at
+        if _state is None or url != _state_url or retry_open:
+            try:
+                backend = from_url(url)
+            except SharedStateError as e:
+                if not isinstance(e.__cause__, (sqlite3.Error, OSError)):
+                    raise  # Erro de configuração (URL inválida), não de disponibilidade
+                _state_url = url  # Mesmo sem abrir: os próximos reruns não tentam de novo antes do prazo
+                _open_retry_at = time.monotonic() + FAILOVER_RETRY_SECONDS
+                if not (retry_open and isinstance(_state, LocalFallbackState)):
+                    _state = LocalFallbackState(UnavailableState(str(e)))  # Nova tentativa sem sucesso mantém o estado local
+                _state.mark_down(e)
+                return _state
+            _state_url = url
+            _open_retry_at = 0.0
+            _state = backend if isinstance(backend, MemoryState) else LocalFallbackState(backend)
+        return _state
+
+
+def get_state() -> SharedState:
+    return _state if _state is not None else configure(DEFAULT_URL)
+
+
+def allow_rate(state: SharedState, key: str, limit: int, window_seconds: int) -> bool:
+    """Rate limit por janela fixa: no máximo `limit` eventos por `window_seconds` para `key`."""
+    window = int(time.time() // window_seconds)
+    allowed, _ = state.incr_if_below(f"rate:{key}:{window}", limit, ttl=window_seconds * 2)
+    return allowed
+
+
+# ----------------------------------------------------
+#           VERIFICAÇÃO COM VÁRIOS PROCESSOS (CLI)
+# ----------------------------------------------------
+
+def _check_worker(args) -> Dict[str, int]:
+    url, prefix, iterations, quota_limit, rate_limit = args
+    state = from_url(url)
+    accepted_quota = accepted_rate = 0
+    for i in range(iterations):
+        state.incr(f"{prefix}:counter")
+        accepted_quota += state.incr_if_below(f"{prefix}:quota", quota_limit)[0]
+        accepted_rate += allow_rate(state, f"{prefix}:user", rate_limit, window_seconds=3600)
+        state.set(f"{prefix}:job:{os.getpid()}:{i}", {"status": "done", "at": datetime.now()}, ttl=600)
+    return {"quota": accepted_quota, "rate": accepted_rate}
+
+
+def consistency_check(url: str, processes: int = 8, iterations: int = 200) -> Dict[str, Any]:
+    """Vários processos disputam os mesmos contadores; confere se nenhum incremento se perdeu ou passou do limite."""
+    if urlparse(url).scheme == "memory":
+        raise SharedStateError("memory:// não é compartilhado entre processos; use sqlite:// ou redis://.")
+
+    prefix = f"check:{os.getpid()}:{int(time.time())}"
+    quota_limit = processes * iterations // 3
+    rate_limit = processes * iterations // 4
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        results = pool.map(_check_worker, [(url, prefix, iterations, quota_limit, rate_limit)] * processes)
+    elapsed = time.perf_counter() - started
+
+    state = from_url(url)
+    expected_total = processes * iterations
+    report = {
+        "counter": (state.get(f"{prefix}:counter"), expected_total),
+        "quota_accepted": (sum(r["quota"] for r in results), quota_limit),
+        "quota_value": (state.get(f"{prefix}:quota"), quota_limit),
+        "rate_accepted": (sum(r["rate"] for r in results), rate_limit),
+        "ops_per_second": round(expected_total * 4 / elapsed, 1),
+    }
+    report["ok"] = all(actual == expected for actual, expected in
+                       (report["counter"], report["quota_accepted"], report["quota_value"], report["rate_accepted"]))
+    for key in (f"{prefix}:counter", f"{prefix}:quota"):
+        state.delete(key)
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Verifica a consistência do estado compartilhado entre processos.")
+    parser.add_argument("--check", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'anuncia_state_check.db')}",
+                        help="URL do backend (sqlite:///... ou redis://...).")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    report = consistency_check(args.check, args.processes, args.iterations)
+    for name, value in report.items():
+        print(f"{name}: {value}")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
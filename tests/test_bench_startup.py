@@ -0,0 +1,45 @@
+import pytest
+
+import bench_startup
+
+CANNED_STDERR = """\
+import time: self [us] | cumulative | imported package
+import time:       310 |        310 |   _io
+import time:      1200 |       4100 |     streamlit.runtime
+import time:       950 |      88000 |   streamlit
+import time:        40 |         40 |       requests.compat
+import time:       700 |      12500 |   requests
+import time:       500 |     101000 | app
+  Warning: to view this Streamlit app on a browser, run it with the following command:
+"""
+
+
+def test_parse_importtime_reads_cumulative_column():
+    parsed = bench_startup.parse_importtime(CANNED_STDERR)
+    assert parsed["app"] == 101000
+    assert parsed["streamlit"] == 88000
+    assert parsed["streamlit.runtime"] == 4100
+    assert parsed["requests.compat"] == 40
+    assert "package" not in parsed  # Cabeçalho não é um módulo
+
+
+def test_measure_app_import_tolerates_nonzero_exit(monkeypatch):
+    class Completed:
+        returncode = 1
+        stderr = CANNED_STDERR
+
+    monkeypatch.setattr(bench_startup.subprocess, "run", lambda *a, **k: Completed())
+    result = bench_startup.measure_app_import()
+    assert result["import_s"] == 0.101
+    assert result["slowest_imports"][0] == ["streamlit", 0.088]
+    assert ["app", 0.101] not in result["slowest_imports"]
+
+
+def test_measure_app_import_without_app_line_reports_stderr(monkeypatch):
+    class Completed:
+        returncode = 1
+        stderr = "import time:       310 |        310 |   _io\nModuleNotFoundError: No module named 'streamlit'\n"
+
+    monkeypatch.setattr(bench_startup.subprocess, "run", lambda *a, **k: Completed())
+    with pytest.raises(RuntimeError, match="No module named 'streamlit'"):
+        bench_startup.measure_app_import()
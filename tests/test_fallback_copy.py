@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+import fallback_copy
+import shared_state
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch):
+    monkeypatch.setattr(shared_state, "_state", shared_state.MemoryState())
+    monkeypatch.setattr(fallback_copy, "breaker", fallback_copy.CircuitBreaker())
+    monkeypatch.setattr(fallback_copy, "knowledge", fallback_copy.StrategyKnowledge())
+
+
+def open_breaker():
+    breaker = fallback_copy.CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold():
+    breaker = open_breaker()
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+def test_half_open_lets_a_single_trial_through():
+    breaker = open_breaker()
+    breaker._opened_at -= 61
+    assert not breaker.is_open  # Consultar o estado não consome a tentativa
+
+    allowed = []
+    threads = [threading.Thread(target=lambda: allowed.append(breaker.allow_request())) for _ in range(8)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert allowed.count(True) == 1
+
+    breaker.record_failure()  # A tentativa falhou: reabre por mais reset_seconds
+    assert not breaker.allow_request()
+
+    breaker._opened_at -= 61
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_stalled_trial_is_replaced_after_reset_window():
+    breaker = open_breaker()
+    breaker._opened_at -= 61
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker._trial_started_at -= 61  # A tentativa nunca reportou o resultado
+    assert breaker.allow_request()
+
+
+def test_job_done_running_and_missing():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return {"titulo_gancho": "ok"}, {"plataforma_principal": "Instagram"}
+
+    job_id = fallback_copy.submit_job(slow)
+    assert fallback_copy.wait_job(job_id, 0) == (fallback_copy.JOB_RUNNING, None)
+
+    release.set()
+    status, result = fallback_copy.wait_job(job_id, 5)
+    assert status == fallback_copy.JOB_DONE
+    assert result[0] == {"titulo_gancho": "ok"}
+
+    fallback_copy.pop_job(job_id)
+    assert fallback_copy.wait_job(job_id, 0) == (fallback_copy.JOB_MISSING, None)
+    assert fallback_copy.wait_job("nunca-existiu", 0) == (fallback_copy.JOB_MISSING, None)
+
+
+def test_job_from_another_replica_is_read_from_shared_state():
+    job_id = fallback_copy.submit_job(lambda: ({"a": 1}, {"b": 2}))
+    assert fallback_copy.wait_job(job_id, 5)[0] == fallback_copy.JOB_DONE
+    with fallback_copy._jobs_lock:
+        fallback_copy._jobs.pop(job_id)  # Simula a outra réplica: só o estado compartilhado é visível
+
+    assert fallback_copy.wait_job(job_id, 0) == (fallback_copy.JOB_DONE, ({"a": 1}, {"b": 2}))
+
+
+def test_failed_job_counts_against_breaker():
+    for _ in range(fallback_copy.FAILURE_THRESHOLD):
+        job_id = fallback_copy.submit_job(lambda: ({"error": "timeout"}, {}))
+        fallback_copy.wait_job(job_id, 5)
+    assert fallback_copy.breaker.is_open
+
+
+def test_fallback_is_flagged_and_uses_learned_knowledge():
+    fallback_copy.knowledge.learn({
+        "plataforma_principal": "TikTok",
+        "sugestoes_de_hashtags": "#fitness #treino",
+        "estrategia_de_horarios": "19h às 22h",
+    })
+    ad_copy, ad_strategy = fallback_copy.generate_fallback("Curso de Yoga", "Agressivo e Urgente", "Aulas ao vivo. Turmas pequenas.", "premium", True)
+
+    assert ad_copy[fallback_copy.FALLBACK_FLAG] and ad_strategy[fallback_copy.FALLBACK_FLAG]
+    assert "Aulas ao vivo." in ad_copy["copy_aida"]
+    assert "roteiro_basico" in ad_copy
+    assert ad_strategy["plataforma_principal"] == "TikTok"
+    assert ad_copy == fallback_copy.generate_fallback("Curso de Yoga", "Agressivo e Urgente", "Aulas ao vivo. Turmas pequenas.", "premium", True)[0]
+
+
+def test_strip_flag_removes_only_the_internal_marker():
+    ad_copy, _ = fallback_copy.generate_fallback("Curso de Yoga", "Agressivo e Urgente", "Aulas ao vivo.", "free", False)
+    exported = fallback_copy.strip_flag(ad_copy)
+    assert fallback_copy.FALLBACK_FLAG not in exported
+    assert fallback_copy.FALLBACK_FLAG in ad_copy  # A sessão continua marcada
+    assert exported == {k: v for k, v in ad_copy.items() if k != fallback_copy.FALLBACK_FLAG}
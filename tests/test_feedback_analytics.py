@@ -0,0 +1,103 @@
+import datetime
+
+import feedback_analytics
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    """Subconjunto da Query do Firestore: order_by (timestamp, __name__), limit, start_after e stream."""
+
+    def __init__(self, store, limit=None, after=None):
+        self.store = store
+        self._limit = limit
+        self._after = after
+
+    def order_by(self, field):
+        return self
+
+    def limit(self, n):
+        return FakeQuery(self.store, n, self._after)
+
+    def start_after(self, cursor):
+        if isinstance(cursor, dict):
+            key = (cursor["timestamp"], cursor["__name__"])
+        else:
+            key = (cursor.to_dict()["timestamp"], cursor.id)
+        return FakeQuery(self.store, self._limit, key)
+
+    def stream(self):
+        docs = sorted(self.store.values(), key=lambda d: (d.to_dict()["timestamp"], d.id))
+        if self._after is not None:
+            docs = [d for d in docs if (d.to_dict()["timestamp"], d.id) > self._after]
+        return iter(docs[:self._limit])
+
+
+class FakeDB:
+    def __init__(self):
+        self.store = {}
+
+    def collection(self, name):
+        assert name == feedback_analytics.FEEDBACK_COLLECTION
+        return FakeQuery(self.store)
+
+    def add(self, doc_id, day, score, tone="Agressivo e Urgente", tier="free"):
+        timestamp = datetime.datetime(2026, 10, day, 12, tzinfo=datetime.timezone.utc)
+        self.store[doc_id] = FakeDoc(doc_id, {"timestamp": timestamp, "rating_score": score, "tone": tone, "plan_tier": tier})
+
+
+def test_refresh_is_incremental(tmp_path):
+    db = FakeDB()
+    for i in range(7):
+        db.add(f"d{i}", day=1 + i % 3, score=1 + i % 4)
+    path = str(tmp_path / "summary.json")
+
+    summary = feedback_analytics.refresh_summary(db, path=path, page_size=3)
+    assert summary["docs_processed"] == 7
+    assert summary["cursor"]["id"] == "d5"  # Último em (timestamp, id)
+
+    db.add("d7", day=3, score=4)
+    summary = feedback_analytics.refresh_summary(db, path=path, page_size=3)
+    assert summary["last_refresh"]["new_docs"] == 1
+    assert summary["docs_processed"] == 8
+
+
+def test_deleted_cursor_document_does_not_recount(tmp_path):
+    db = FakeDB()
+    for i in range(4):
+        db.add(f"d{i}", day=1 + i, score=3)
+    path = str(tmp_path / "summary.json")
+    summary = feedback_analytics.refresh_summary(db, path=path, page_size=2)
+
+    del db.store[summary["cursor"]["id"]]
+    db.add("d9", day=9, score=4)
+    summary = feedback_analytics.refresh_summary(db, path=path, page_size=2)
+
+    assert summary["last_refresh"]["new_docs"] == 1
+    assert summary["docs_processed"] == 5
+
+
+def test_window_view_merges_days_and_dimensions():
+    summary = feedback_analytics.empty_summary()
+    for day, score, tone in ((1, 4, "A"), (1, 2, "B"), (5, 3, "A")):
+        feedback_analytics.add_feedback(summary, {
+            "timestamp": datetime.datetime(2026, 10, day), "rating_score": score, "tone": tone, "plan_tier": "free",
+        })
+
+    everything = feedback_analytics.window_view(summary)
+    assert everything["overall"]["count"] == 3
+    assert everything["tone"]["A"]["sum"] == 7
+    assert everything["tier"]["free"]["scores"] == {"4": 1, "2": 1, "3": 1}
+
+    last_days = feedback_analytics.window_view(summary, days=2, today=datetime.date(2026, 10, 5))
+    assert last_days["overall"]["count"] == 1
+
+    rows = feedback_analytics.bucket_rows(everything["tone"], "tom")
+    assert rows[0] == {"tom": "A", "total": 2, "média": 3.5, "nota_1": 0, "nota_2": 0, "nota_3": 1, "nota_4": 1}
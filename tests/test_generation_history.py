@@ -0,0 +1,160 @@
+import datetime
+import itertools
+import sys
+import types
+
+import pytest
+
+import generation_history
+import shared_state
+
+SERVER_TIMESTAMP = object()
+
+
+class AlreadyExists(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def fake_google(monkeypatch):
+    firestore = types.ModuleType("google.cloud.firestore")
+    firestore.SERVER_TIMESTAMP = SERVER_TIMESTAMP
+    firestore.Query = types.SimpleNamespace(DESCENDING="DESCENDING")
+    exceptions = types.ModuleType("google.api_core.exceptions")
+    exceptions.AlreadyExists = AlreadyExists
+    for name, module in {
+        "google.cloud": types.ModuleType("google.cloud"),
+        "google.cloud.firestore": firestore,
+        "google.api_core": types.ModuleType("google.api_core"),
+        "google.api_core.exceptions": exceptions,
+    }.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.setattr(shared_state, "_state", shared_state.MemoryState())
+    monkeypatch.setattr(generation_history, "_blob_cache", generation_history.TTLCache(max_items=256, ttl_seconds=None))
+
+
+class FakeDoc:
+    def __init__(self, store, path):
+        self.store, self.path = store, path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.store, self.path + (name,))
+
+    def set(self, data):
+        clock = self.store["_clock"]
+        self.store[self.path] = {k: (next(clock) if v is SERVER_TIMESTAMP else v) for k, v in data.items()}
+
+    def create(self, data):
+        if self.path in self.store:
+            raise AlreadyExists(self.id)
+        self.set(data)
+
+    def get(self):
+        self.store["_reads"] += 1
+        data = self.store.get(self.path)
+        return types.SimpleNamespace(exists=data is not None, to_dict=lambda: dict(data), id=self.id)
+
+
+class FakeCollection:
+    def __init__(self, store, path, after=None, limit=None):
+        self.store, self.path, self._after, self._limit = store, path, after, limit
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = f"g{len([p for p in self.store if isinstance(p, tuple) and p[:-1] == self.path]):03d}"
+        return FakeDoc(self.store, self.path + (doc_id,))
+
+    def order_by(self, field, direction=None):
+        assert field in ("created_at", "__name__") and direction == "DESCENDING"
+        return self
+
+    def limit(self, n):
+        return FakeCollection(self.store, self.path, self._after, n)
+
+    def start_after(self, values):
+        assert set(values) == {"created_at", "__name__"}
+        return FakeCollection(self.store, self.path, (values["created_at"], values["__name__"]), self._limit)
+
+    def stream(self):
+        self.store["_queries"] += 1
+        docs = [(data["created_at"], path[-1], data) for path, data in self.store.items()
+                if isinstance(path, tuple) and path[:-1] == self.path]
+        docs.sort(key=lambda d: (d[0], d[1]), reverse=True)
+        if self._after is not None:
+            docs = [d for d in docs if (d[0], d[1]) < self._after]
+        for created_at, doc_id, data in docs[:self._limit]:
+            yield types.SimpleNamespace(id=doc_id, to_dict=lambda data=data: dict(data))
+
+
+class FakeDB:
+    def __init__(self):
+        start = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+        self.store = {"_reads": 0, "_queries": 0, "_clock": (start + datetime.timedelta(minutes=i) for i in itertools.count())}
+
+    def collection(self, name):
+        return FakeCollection(self.store, (name,))
+
+
+def save(db, n):
+    for i in range(n):
+        generation_history.save_generation(db, "u1", f"Produto {i}", "Tom", "free", f"prompt {i}", {"titulo_gancho": f"T{i}"}, {"p": i})
+
+
+def test_pages_follow_field_value_cursor_without_extra_reads():
+    db = FakeDB()
+    save(db, 5)
+
+    first = generation_history.fetch_page(db, "u1", page_size=2)
+    second = generation_history.fetch_page(db, "u1", cursor=first["next_cursor"], page_size=2)
+    third = generation_history.fetch_page(db, "u1", cursor=second["next_cursor"], page_size=2)
+
+    titles = [item["title"] for page in (first, second, third) for item in page["items"]]
+    assert titles == ["T4", "T3", "T2", "T1", "T0"]
+    assert third["next_cursor"] is None
+    assert db.store["_reads"] == 0  # Nenhuma leitura de documento para reconstruir o cursor
+
+
+def test_pages_are_cached_until_a_new_generation():
+    db = FakeDB()
+    save(db, 3)
+    generation_history.fetch_page(db, "u1", page_size=2)
+    generation_history.fetch_page(db, "u1", page_size=2)
+    assert db.store["_queries"] == 1
+
+    save(db, 1)
+    page = generation_history.fetch_page(db, "u1", page_size=2)
+    assert db.store["_queries"] == 2
+    assert page["items"][0]["title"] == "T0"  # A geração nova (mais recente) aparece na primeira página
+
+
+def test_history_version_expires():
+    db = FakeDB()
+    save(db, 1)
+    state = shared_state.get_state()
+    expires_at, _ = state._items["history_version:u1"]
+    assert expires_at is not None
+    assert generation_history.HISTORY_VERSION_TTL_SECONDS > generation_history.PAGE_CACHE_TTL_SECONDS
+
+
+def test_blobs_are_deduplicated_and_loaded_back():
+    db = FakeDB()
+    save(db, 1)
+    save(db, 1)  # Mesmo conteúdo: os blobs já existem
+    blobs = [path for path in db.store if isinstance(path, tuple) and path[0] == generation_history.BLOBS_COLLECTION]
+    assert len(blobs) == 3
+
+    item = generation_history.fetch_page(db, "u1", page_size=1)["items"][0]
+    generation_history._blob_cache.clear()
+    shared_state.get_state()._items.clear()
+    record = generation_history.load_generation(db, item)
+    assert record == {"ad_copy": {"titulo_gancho": "T0"}, "ad_strategy": {"p": 0}, "input_prompt": "prompt 0"}
+
+
+def test_explicit_title_replaces_copy_hook():
+    db = FakeDB()
+    fanout = {"platforms": {"Instagram": {"gancho": "Pare de rolar"}}, "context": {}, "timings": {}}
+    generation_history.save_generation(db, "u1", "Curso", "Tom", "premium", "prompt", fanout, {}, title="🌐 Instagram")
+    item = generation_history.fetch_page(db, "u1", page_size=1)["items"][0]
+    assert item["title"] == "🌐 Instagram"
+    assert generation_history.load_generation(db, item)["ad_copy"] == fanout
@@ -0,0 +1,69 @@
+import pytest
+
+import model_json
+
+SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "titulo": {"type": "STRING"},
+        "copy": {"type": "STRING"},
+        "cta": {"type": "STRING"},
+    },
+    "propertyOrdering": ["titulo", "copy", "cta"],
+}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"titulo": "A", "copy": "B"}', {"titulo": "A", "copy": "B"}),
+    ('```json\n{"titulo": "A"}\n```', {"titulo": "A"}),
+    ('Claro! Aqui está: {"titulo": "A {chave}"} Espero que ajude.', {"titulo": "A {chave}"}),
+    ('{"titulo": "A", "copy": "B",}', {"titulo": "A", "copy": "B"}),
+    ('{"titulo": "linha 1\nlinha 2"}', {"titulo": "linha 1\nlinha 2"}),
+    ('{"titulo": "aspas \\" dentro", "copy": "B"}', {"titulo": 'aspas " dentro', "copy": "B"}),
+])
+def test_parse_tolerates_common_defects(text, expected):
+    assert model_json.parse_model_json(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    '{"titulo": "A", "copy": "tru',
+    '{"titulo": "A", "copy": "texto com escape \\',
+    '{"titulo": "A", "copy"',
+    '{"titulo": "A", "copy":',
+    '{"titulo": "A", "co',
+])
+def test_truncated_field_is_dropped_not_accepted(text):
+    data = model_json.parse_model_json(text)
+    assert data == {"titulo": "A"}
+
+    clean, missing = model_json.validate(data, SCHEMA)
+    assert clean == {"titulo": "A"}
+    assert missing == ["copy", "cta"]
+
+
+def test_parse_rejects_text_without_object():
+    with pytest.raises(model_json.ModelJSONError):
+        model_json.parse_model_json("Desculpe, não consigo ajudar com isso.")
+    with pytest.raises(model_json.ModelJSONError):
+        model_json.parse_model_json("")
+
+
+def test_validate_coerces_and_orders_fields():
+    clean, missing = model_json.validate({"cta": ["Compre", "agora"], "extra": 1, "titulo": "  ", "copy": {"a": 1}}, SCHEMA)
+    assert list(clean) == ["copy", "cta"]
+    assert clean["cta"] == "Compre\nagora"
+    assert clean["copy"] == "a: 1"
+    assert missing == ["titulo"]
+
+
+def test_missing_fields_schema_prompt_and_merge():
+    partial = {"titulo": "A"}
+    missing = ["copy", "cta"]
+    schema = model_json.missing_fields_schema(SCHEMA, missing)
+    assert schema["propertyOrdering"] == missing
+    assert set(schema["properties"]) == set(missing)
+    assert "copy, cta" in model_json.missing_fields_prompt(partial, missing)
+
+    merged, still_missing = model_json.merge(partial, {"titulo": "outro", "copy": "B"}, SCHEMA)
+    assert merged == {"titulo": "A", "copy": "B"}  # O que já foi gerado prevalece
+    assert still_missing == ["cta"]
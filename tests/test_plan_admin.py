@@ -0,0 +1,90 @@
+import sys
+import types
+
+import pytest
+
+import plan_admin
+
+
+@pytest.fixture(autouse=True)
+def fake_firestore(monkeypatch):
+    """`bulk_update_plans` só precisa de SERVER_TIMESTAMP do google.cloud.firestore."""
+    firestore = types.ModuleType("google.cloud.firestore")
+    firestore.SERVER_TIMESTAMP = object()
+    cloud = types.ModuleType("google.cloud")
+    cloud.firestore = firestore
+    monkeypatch.setitem(sys.modules, "google.cloud", cloud)
+    monkeypatch.setitem(sys.modules, "google.cloud.firestore", firestore)
+
+
+class FakeAuth:
+    def __init__(self, existing):
+        self.existing = existing
+        self.lookups = []
+
+    class EmailIdentifier:
+        def __init__(self, email):
+            if email.count("@") != 1 or " " in email:
+                raise ValueError(f"Invalid email: {email}")
+            self.email = email
+
+    def get_users(self, identifiers, app=None):
+        self.lookups.append(len(identifiers))
+        users = [
+            types.SimpleNamespace(email=i.email, uid=self.existing[i.email.lower()])
+            for i in identifiers if i.email.lower() in self.existing
+        ]
+        return types.SimpleNamespace(users=users)
+
+
+class FakeDB:
+    def __init__(self):
+        self.commits = []
+
+    def collection(self, name):
+        return types.SimpleNamespace(document=lambda uid: uid)
+
+    def batch(self):
+        db = self
+
+        class Batch:
+            def __init__(self):
+                self.ops = []
+
+            def set(self, ref, data, merge=False):
+                self.ops.append((ref, data["plan_tier"]))
+
+            def commit(self):
+                db.commits.append(self.ops)
+
+        return Batch()
+
+
+def test_parse_plan_csv_marks_invalid_and_duplicates():
+    rows = plan_admin.parse_plan_csv("email,plano\na@x.com,premium\nsem-arroba,free\nb@x.com,gold\nA@x.com,free\n")
+    assert [row["status"] for row in rows] == ["duplicado", "erro", "erro", "pendente"]
+
+
+def test_bulk_update_batches_lookups_and_writes():
+    emails = [f"u{i}@x.com" for i in range(7)]
+    auth = FakeAuth({email: f"uid{i}" for i, email in enumerate(emails[:6])})
+    db = FakeDB()
+    rows = plan_admin.parse_plan_csv("".join(f"{email},essential\n" for email in emails))
+
+    report = plan_admin.bulk_update_plans(auth, db, rows, lookup_batch_size=3, write_batch_size=4)
+
+    assert auth.lookups == [3, 3, 1]
+    assert [len(ops) for ops in db.commits] == [4, 2]
+    assert report["status_counts"] == {"atualizado": 6, "não encontrado": 1}
+    assert report["rows_per_second"] > 0
+
+
+def test_malformed_email_only_fails_its_own_row():
+    auth = FakeAuth({"ok@x.com": "uid1"})
+    db = FakeDB()
+    rows = plan_admin.parse_plan_csv("ok@x.com,premium\nmal formado@x.com,free\n")
+
+    report = plan_admin.bulk_update_plans(auth, db, rows)
+
+    assert [row["status"] for row in report["rows"]] == ["atualizado", "erro"]
+    assert "E-mail inválido" in report["rows"][1]["detail"]
@@ -0,0 +1,71 @@
+import pytest
+
+import platform_fanout
+
+
+def test_shorten_cuts_on_word_boundary():
+    assert platform_fanout._shorten("Curso de Yoga", 30) == "Curso de Yoga"
+    assert platform_fanout._shorten("Curso de Yoga online ao vivo", 15) == "Curso de Yoga"
+    assert platform_fanout._shorten("Supercalifragilístico", 10) == "Supercalif"  # Sem espaço: corte seco
+
+
+def test_enforce_limits_strips_numbering_and_truncates_lines():
+    data = {
+        "titulos": "1. Curso de Yoga online com turmas pequenas\n\n- Aulas ao vivo\n2) Comece hoje",
+        "descricoes": 42,  # Não é texto: fica como veio
+        "palavras_chave": "yoga online com professor certificado e turmas pequenas",
+    }
+    limited = platform_fanout.enforce_limits("Google Ads", data)
+
+    lines = limited["titulos"].splitlines()
+    assert lines == ["Curso de Yoga online com", "Aulas ao vivo", "Comece hoje"]
+    assert all(len(line) <= 30 for line in lines)
+    assert limited["descricoes"] == 42
+    assert limited["palavras_chave"] == data["palavras_chave"]  # Campo sem limite
+
+    caption = {"titulos": "1. " + "x" * 50}
+    assert platform_fanout.enforce_limits("Instagram", dict(caption)) == caption  # Limites são por plataforma
+
+
+def test_fan_out_keeps_other_platforms_when_one_fails():
+    cleaned = []
+
+    def generate(platform, context, prepared):
+        assert context == {"resumo_do_produto": "Curso"} and prepared == "cache-1"
+        if platform == "TikTok":
+            raise RuntimeError("timeout")
+        if platform == "Google Ads":
+            return {"titulos": "Um título bem mais longo que trinta caracteres"}
+        return {"gancho": "Pare de rolar"}
+
+    result = platform_fanout.fan_out(
+        lambda: {"resumo_do_produto": "Curso"}, generate, ["Instagram", "TikTok", "Google Ads"],
+        prepare=lambda: "cache-1", cleanup=cleaned.append,
+    )
+
+    assert result["platforms"]["Instagram"] == {"gancho": "Pare de rolar"}
+    assert "timeout" in result["platforms"]["TikTok"]["error"]
+    assert result["platforms"]["Google Ads"]["titulos"] == "Um título bem mais longo que"
+    assert set(result["timings"]["platforms_ms"]) == {"Instagram", "TikTok", "Google Ads"}
+    assert cleaned == ["cache-1"]
+
+
+@pytest.mark.parametrize("prepare_result", [None, {"error": "cache recusado"}])
+def test_fan_out_stops_on_analysis_error_and_still_cleans_up(prepare_result):
+    cleaned, generated = [], []
+    result = platform_fanout.fan_out(
+        lambda: {"error": "Erro na análise compartilhada: 503"},
+        lambda platform, context, prepared: generated.append(platform) or {},
+        ["Instagram"],
+        prepare=lambda: prepare_result or "cache-1",
+        cleanup=cleaned.append,
+    )
+    assert result == {"error": "Erro na análise compartilhada: 503"}
+    assert generated == []
+    assert cleaned == ([] if prepare_result else ["cache-1"])  # Cache que falhou ao criar não é apagado
+
+
+def test_platform_prompt_asks_for_video_only_when_needed():
+    context = {"resumo_do_produto": "Curso"}
+    assert platform_fanout.VIDEO_INSTRUCTION in platform_fanout.platform_prompt("Instagram", context, needs_video=True)
+    assert platform_fanout.VIDEO_INSTRUCTION not in platform_fanout.platform_prompt("Instagram", context)
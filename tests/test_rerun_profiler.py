@@ -0,0 +1,58 @@
+import contextlib
+import os
+import tracemalloc
+
+import pytest
+
+import rerun_profiler
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(rerun_profiler, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def work():
+    return [str(i) * 10 for i in range(2000)]
+
+
+def test_disarmed_run_is_free_and_leaves_state_clean(profile_dir):
+    state = {"logged_in_user_id": "u1"}
+    ctx = rerun_profiler.profile_rerun(state)
+    assert isinstance(ctx, contextlib.nullcontext)
+    with ctx:
+        work()
+    assert state == {"logged_in_user_id": "u1"}
+    assert not tracemalloc.is_tracing()
+    assert os.listdir(profile_dir) == []
+
+
+def test_armed_runs_collect_stats_then_disarm(profile_dir):
+    state = {}
+    rerun_profiler.arm(state, 2)
+
+    for _ in range(3):
+        with rerun_profiler.profile_rerun(state):
+            work()
+
+    assert state[rerun_profiler.RUNS_LEFT_KEY] == 0
+    results = state[rerun_profiler.RESULTS_KEY]
+    assert len(results) == 2  # A terceira execução já rodou desarmada
+    latest = results[0]
+    assert latest["allocations"] and latest["peak_kb"] > 0
+    assert os.path.exists(latest["alloc_path"])
+    if latest["prof_path"] is not None:  # Outro profiler ativo (ex.: cobertura) impede o cProfile
+        assert latest["hotspots"] and os.path.exists(latest["prof_path"])
+    assert not tracemalloc.is_tracing()
+
+
+def test_exception_in_profiled_run_still_stops_tracing():
+    state = {}
+    rerun_profiler.arm(state, 1)
+    with pytest.raises(RuntimeError):
+        with rerun_profiler.profile_rerun(state):
+            raise RuntimeError("falha no script")
+    assert state[rerun_profiler.RUNS_LEFT_KEY] == 0
+    assert len(state[rerun_profiler.RESULTS_KEY]) == 1
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,82 @@
+import os
+import time
+
+import pytest
+
+import session_memory
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_memory, "SPILL_ROOT", str(tmp_path / "sessions"))
+    monkeypatch.setattr(session_memory, "_registry", {})
+    monkeypatch.setattr(session_memory, "_last_sweep", time.time())
+
+
+def big(n=64 * 1024):
+    return b"x" * n
+
+
+def test_spill_and_restore_round_trip():
+    state = {
+        "retained_media": {"bytes": big(3 * 1024 * 1024), "mime_type": "image/png"},
+        "last_ad_copy": {"titulo_gancho": "T"},
+        "uploaded_media_0": big(3 * 1024 * 1024),  # Valor de widget: nunca vai para o disco
+        "db": big(3 * 1024 * 1024),  # Protegida: nem entra na conta
+    }
+    usage = session_memory.enforce_budget("s1", state, budget_bytes=1024 * 1024)
+
+    spilled = state["retained_media"]
+    assert isinstance(spilled, session_memory.SpilledValue)
+    assert os.path.exists(spilled.path)
+    assert usage["disk_bytes"] == spilled.size and usage["spilled_now"] == spilled.size
+    assert isinstance(state["uploaded_media_0"], bytes) and isinstance(state["db"], bytes)
+    assert state["last_ad_copy"] == {"titulo_gancho": "T"}
+
+    restored = session_memory.load(state, "retained_media")
+    assert restored["mime_type"] == "image/png" and len(restored["bytes"]) == 3 * 1024 * 1024
+
+    session_memory.release(state, "retained_media")
+    assert "retained_media" not in state and not os.path.exists(spilled.path)
+
+
+def test_within_budget_nothing_spills():
+    state = {"retained_media": {"bytes": big()}}
+    assert session_memory.enforce_budget("s1", state)["spilled_now"] == 0
+    assert session_memory.load(state, "retained_media") == {"bytes": big()}
+
+
+def test_idle_sessions_are_cleared_by_id(monkeypatch):
+    states = {
+        "ativa": {"logged_in_user_id": "u1", "retained_media": {"bytes": big()}},
+        "ociosa": {"logged_in_user_id": "u2", "retained_media": {"bytes": big()}, "last_ad_copy": {}},
+    }
+    monkeypatch.setattr(session_memory, "_session_state_by_id", states.get)
+    for sid, state in states.items():
+        monkeypatch.setattr(session_memory, "_current_session_id", lambda sid=sid: sid)
+        session_memory.track_session(state)
+        session_memory.enforce_budget(sid, state, budget_bytes=0)
+    session_memory._registry["ociosa"]["last_seen"] -= session_memory.IDLE_SESSION_TTL_SECONDS + 1
+
+    assert session_memory.evict_idle() == 1
+    assert states["ociosa"] == {"logged_in_user_id": "u2"}  # O login é mantido
+    assert not os.path.exists(os.path.join(session_memory.SPILL_ROOT, "ociosa"))
+    assert "retained_media" in states["ativa"]
+    assert [row["sessão"] for row in session_memory.memory_report()] == ["ativa"]
+
+
+def test_orphan_spill_dirs_are_removed_after_ttl():
+    orphan = os.path.join(session_memory.SPILL_ROOT, "processo-anterior")
+    recent = os.path.join(session_memory.SPILL_ROOT, "recente")
+    for path in (orphan, recent):
+        os.makedirs(path)
+    old = time.time() - session_memory.IDLE_SESSION_TTL_SECONDS - 10
+    os.utime(orphan, (old, old))
+
+    session_memory.evict_idle()
+    assert not os.path.exists(orphan)
+    assert os.path.exists(recent)
+
+
+def test_runtime_lookup_without_streamlit_returns_none():
+    assert session_memory._session_state_by_id("qualquer") is None
@@ -0,0 +1,235 @@
+import datetime
+import socket
+import threading
+import time
+import types
+
+import pytest
+
+import shared_state
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return shared_state.MemoryState()
+    return shared_state.SQLiteState(str(tmp_path / "state.db"))
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        shared_state.SharedState()
+
+
+def test_get_set_delete_roundtrip(state):
+    when = datetime.datetime(2026, 10, 19, 12, 30)
+    state.set("job", {"status": "done", "at": when, "items": [1, "dois"]})
+    assert state.get("job") == {"status": "done", "at": when, "items": [1, "dois"]}
+
+    state.delete("job")
+    assert state.get("job") is None
+    assert state.get("job", "padrão") == "padrão"
+
+
+def test_ttl_expires(state):
+    state.set("curto", "x", ttl=0.05)
+    state.set("longo", "y", ttl=60)
+    time.sleep(0.1)
+    assert state.get("curto") is None
+    assert state.get("longo") == "y"
+
+
+def test_counters(state):
+    assert state.incr("c") == 1
+    assert state.incr("c", 5) == 6
+    assert state.incr_if_below("quota", 2) == (True, 1)
+    assert state.incr_if_below("quota", 2) == (True, 2)
+    assert state.incr_if_below("quota", 2) == (False, 2)
+
+
+def test_counters_are_atomic_across_threads(state):
+    accepted = []
+
+    def worker():
+        for _ in range(50):
+            state.incr("total")
+            accepted.append(state.incr_if_below("limitado", 120)[0])
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert state.get("total") == 300
+    assert sum(accepted) == 120
+
+
+def test_allow_rate_fixed_window(state):
+    assert [shared_state.allow_rate(state, "u1", 3, 60) for _ in range(4)] == [True, True, True, False]
+    assert shared_state.allow_rate(state, "u2", 3, 60)
+
+
+class BrokenState(shared_state.MemoryState):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def _fail(self, *args, **kwargs):
+        self.calls += 1
+        raise shared_state.SharedStateError("fora do ar")
+
+    get = set = delete = incr = incr_if_below = _fail
+
+
+def test_fallback_degrades_to_process_state_and_retries_later():
+    primary = BrokenState()
+    state = shared_state.LocalFallbackState(primary, retry_seconds=60)
+
+    assert shared_state.allow_rate(state, "u1", 1, 60)
+    assert not shared_state.allow_rate(state, "u1", 1, 60)
+    state.set("generation_job:1", {"status": "done"})
+    assert state.get("generation_job:1") == {"status": "done"}
+    assert state.degraded and state.last_error
+    assert primary.calls == 1  # Degradado: o remoto não é consultado a cada chamada
+
+    state._down_until = 0  # Passado o retry_seconds, o remoto é tentado de novo
+    assert state.get("generation_job:1") == {"status": "done"}
+    assert primary.calls == 2
+
+
+def test_fallback_refuses_quota_while_degraded():
+    state = shared_state.LocalFallbackState(BrokenState(), retry_seconds=60)
+    assert state.incr_if_below("quota:u1", 3) == (False, 3)  # Cota global: recusa em vez de zerar por réplica
+    assert state.incr_if_below("quota:u1", 3) == (False, 3)
+    assert state.incr_if_below("rate:u1:1", 3) == (True, 1)  # Rate limit segue local
+    assert state.degraded
+
+
+def test_configure_starts_degraded_when_sqlite_cannot_open(monkeypatch, tmp_path):
+    monkeypatch.setattr(shared_state, "_state", None)
+    monkeypatch.setattr(shared_state, "_state_url", None)
+    monkeypatch.setattr(shared_state, "_open_retry_at", 0.0)
+    opened = []
+    real_from_url = shared_state.from_url
+    monkeypatch.setattr(shared_state, "from_url", lambda url: opened.append(url) or real_from_url(url))
+    blocker = tmp_path / "arquivo"
+    blocker.write_text("não é diretório")
+    broken_url = f"sqlite:///{blocker}/estado.db"
+
+    state = shared_state.configure(broken_url)
+    assert isinstance(state, shared_state.LocalFallbackState) and state.degraded
+    state.set("generation_job:1", {"status": "running"})
+    assert state.incr_if_below("quota:u1", 3) == (False, 3)
+
+    assert shared_state.configure(broken_url) is state  # Sem nova tentativa a cada rerun
+    assert len(opened) == 1
+    monkeypatch.setattr(shared_state, "_open_retry_at", time.monotonic() - 1)
+    assert shared_state.configure(broken_url) is state  # Passado o prazo: tenta de novo e mantém o estado local
+    assert len(opened) == 2 and state.get("generation_job:1") == {"status": "running"}
+
+    state = shared_state.configure(f"sqlite:///{tmp_path}/estado.db")
+    assert isinstance(state, shared_state.LocalFallbackState) and not state.degraded
+
+    with pytest.raises(shared_state.SharedStateError):
+        shared_state.configure("ftp://desconhecido")
+
+
+class FlakyRedis(shared_state.RedisState):
+    """Conexão falsa: o envio funciona, a leitura da resposta estoura o timeout."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def _connect(self):
+        self._local.sock = types.SimpleNamespace(close=lambda: None)
+
+    def _send(self, *args):
+        self.sent.append(args[0])
+
+    def _read_reply(self):
+        raise socket.timeout("timed out")
+
+
+def test_redis_does_not_resend_counter_scripts_after_read_timeout():
+    redis = FlakyRedis()
+    with pytest.raises(shared_state.SharedStateError):
+        redis.incr_if_below("quota", 5)
+    assert redis.sent == ["EVAL"]
+
+    with pytest.raises(shared_state.SharedStateError):
+        redis.get("chave")
+    assert redis.sent == ["EVAL", "GET", "GET"]  # Leituras são idempotentes: uma nova tentativa
+
+
+def fake_redis_server(sock):
+    """Servidor RESP mínimo: GET/SET/DEL, os dois scripts de contador, BLPOP (array nulo) e erro para o resto."""
+    store = {}
+    reader = sock.makefile("rb")
+
+    def bulk(value):
+        data = value.encode("utf-8")
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    while True:
+        line = reader.readline()
+        if not line:
+            return
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(reader.readline()[1:-2])
+            args.append(reader.read(length + 2)[:-2].decode("utf-8"))
+        command = args[0]
+        if command == "GET":
+            reply = b"$-1\r\n" if args[1] not in store else bulk(store[args[1]])
+        elif command == "SET":
+            store[args[1]] = args[2]
+            reply = b"+OK\r\n"
+        elif command == "DEL":
+            reply = b":%d\r\n" % (store.pop(args[1], None) is not None)
+        elif command == "EVAL" and args[1] == shared_state.RedisState.INCR_SCRIPT:
+            store[args[3]] = str(int(store.get(args[3], 0)) + int(args[4]))
+            reply = b":%s\r\n" % store[args[3]].encode()
+        elif command == "EVAL" and args[1] == shared_state.RedisState.INCR_IF_BELOW_SCRIPT:
+            value = int(store.get(args[3], 0))
+            if value >= int(args[4]):
+                reply = b"*2\r\n:0\r\n:%d\r\n" % value
+            else:
+                store[args[3]] = str(value + 1)
+                reply = b"*2\r\n:1\r\n:%d\r\n" % (value + 1)
+        elif command == "BLPOP":
+            reply = b"*-1\r\n"
+        else:
+            reply = b"-ERR unknown command '%s'\r\n" % command.encode()
+        sock.sendall(reply)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client, server = socket.socketpair()
+    threading.Thread(target=fake_redis_server, args=(server,), daemon=True).start()
+    monkeypatch.setattr(shared_state.socket, "create_connection", lambda address, timeout: client)
+    state = shared_state.RedisState()
+    yield state
+    state._close()
+    server.close()
+
+
+def test_redis_replies_over_resp(redis):
+    when = datetime.datetime(2026, 10, 19, 12, 30)
+    redis.set("perfil", {"nome": "Conceição", "quando": when}, ttl=60)  # Bulk com UTF-8 (tamanho em bytes)
+    assert redis.get("perfil") == {"nome": "Conceição", "quando": when}
+    assert redis.get("ausente", "padrão") == "padrão"  # Bulk nulo
+    redis.delete("perfil")
+    assert redis.get("perfil") is None
+
+    assert redis.incr("contador", 2) == 2 and redis.incr("contador") == 3
+    assert [redis.incr_if_below("quota:u1", 2) for _ in range(3)] == [(True, 1), (True, 2), (False, 2)]
+    assert redis.execute("BLPOP", "fila", 1) is None  # Array nulo
+
+    with pytest.raises(shared_state.SharedStateError, match="ERR unknown command"):
+        redis.execute("FLUSHALL")
+    assert redis.get("contador") == 3  # A conexão continua utilizável depois de um erro do servidor
+
+
+def test_multiprocess_consistency_on_sqlite(tmp_path):
+    report = shared_state.consistency_check(f"sqlite:///{tmp_path}/check.db", processes=4, iterations=40)
+    assert report["ok"], report
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+pytest.importorskip("cryptography")
+pytest.importorskip("google.auth")
+
+import token_auth
+
+
+@pytest.fixture(scope="module")
+def key_source():
+    return token_auth.LocalKeySource("anuncia-teste")
+
+
+def test_valid_token_is_verified_and_cached(key_source):
+    verifier = token_auth.TokenVerifier(key_source.project_id, key_source)
+    token = key_source.mint_token("uid-1", "a@exemplo.com")
+
+    identity = verifier.verify(token)
+    assert identity["uid"] == "uid-1" and identity["email"] == "a@exemplo.com"
+    assert identity["exp"] > time.time()
+    assert verifier.verify(token) is identity  # Segunda verificação vem do cache
+
+
+def test_expired_token_is_rejected(key_source):
+    verifier = token_auth.TokenVerifier(key_source.project_id, key_source)
+    token = key_source.mint_token("uid-1", "a@exemplo.com", ttl_seconds=-2 * token_auth.CLOCK_SKEW_SECONDS)
+    with pytest.raises(token_auth.TokenVerificationError):
+        verifier.verify(token)
+
+
+def test_token_for_another_project_is_rejected(key_source):
+    verifier = token_auth.TokenVerifier("outro-projeto", key_source)
+    with pytest.raises(token_auth.TokenVerificationError):
+        verifier.verify(key_source.mint_token("uid-1", "a@exemplo.com"))
+
+
+def test_wrong_issuer_is_rejected(key_source):
+    from google.auth import jwt
+
+    now = int(time.time())
+    token = jwt.encode(key_source._signer, {
+        "iss": "https://securetoken.google.com/outro-projeto",
+        "aud": key_source.project_id,
+        "sub": "uid-1",
+        "auth_time": now,
+        "iat": now,
+        "exp": now + 3600,
+    }).decode("utf-8")
+    verifier = token_auth.TokenVerifier(key_source.project_id, key_source)
+    with pytest.raises(token_auth.TokenVerificationError, match="emissor"):
+        verifier.verify(token)
+
+
+def test_unknown_key_id_forces_one_refresh(key_source):
+    rotated = token_auth.LocalKeySource(key_source.project_id, key_id="rotated-key")
+
+    class RotatingSource:
+        """Cache ainda com a chave antiga; só a renovação forçada traz a nova."""
+
+        refreshes = 0
+
+        def get_keys(self, force_refresh=False):
+            if force_refresh:
+                self.refreshes += 1
+                return {**key_source.get_keys(), **rotated.get_keys()}
+            return key_source.get_keys()
+
+    source = RotatingSource()
+    verifier = token_auth.TokenVerifier(key_source.project_id, source)
+
+    verifier.verify(key_source.mint_token("uid-1", "a@exemplo.com"))
+    assert source.refreshes == 0
+    assert verifier.verify(rotated.mint_token("uid-2", "b@exemplo.com"))["uid"] == "uid-2"
+    assert source.refreshes == 1
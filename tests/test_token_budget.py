@@ -0,0 +1,99 @@
+import json
+import struct
+
+import pytest
+
+import token_budget
+
+
+def png_header(width, height):
+    return b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + struct.pack(">II", width, height) + b"\x00" * 16
+
+
+def jpeg_header(width, height):
+    """SOI, fill bytes, TEM e RST soltos, um APP0 e o SOF0 com as dimensões."""
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + b"\xff\xff\xff" + b"\xff\x01" + b"\xff\xd3" + app0 + b"\xff\xff" + sof0 + b"\xff\xd9"
+
+
+@pytest.fixture
+def calibration_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "calibration.jsonl")
+    monkeypatch.setattr(token_budget, "CALIBRATION_PATH", path)
+    monkeypatch.setattr(token_budget, "_calibration_ratios", {})
+    monkeypatch.setattr(token_budget, "_calibration_lines", {})
+    return path
+
+
+def test_text_estimate_grows_with_length():
+    assert token_budget.estimate_text_tokens("") == 0
+    short = token_budget.estimate_text_tokens("Curso online de marketing.")
+    assert 0 < short < token_budget.estimate_text_tokens("Curso online de marketing. " * 10)
+
+
+def test_image_tokens_follow_tiles():
+    assert token_budget.image_dimensions(png_header(1536, 800)) == (1536, 800)
+    assert token_budget.estimate_media_tokens(png_header(300, 200), "image/png") == token_budget.IMAGE_TILE_TOKENS
+    assert token_budget.estimate_media_tokens(png_header(1536, 800), "image/png") == token_budget.IMAGE_TILE_TOKENS * 2 * 2
+
+
+def test_jpeg_dimensions_skip_fill_bytes_and_standalone_markers():
+    assert token_budget.image_dimensions(jpeg_header(1920, 1080)) == (1920, 1080)
+    assert token_budget.image_dimensions(b"\xff\xd8\xff\xd0\xff\xd9") is None  # Sem SOF
+    assert token_budget.image_dimensions(jpeg_header(1920, 1080)[:-12]) is None  # SOF truncado
+
+
+def test_video_tokens_use_mvhd_duration():
+    mvhd = b"mvhd" + b"\x00" * 12 + struct.pack(">II", 1000, 10_000)
+    assert token_budget.video_duration_seconds(b"\x00" * 8 + mvhd) == 10
+    assert token_budget.estimate_media_tokens(mvhd, "video/mp4") == 10 * token_budget.VIDEO_TOKENS_PER_SECOND
+
+
+def test_trim_description_keeps_leading_sentences():
+    text = " ".join(f"Frase número {i} do rascunho." for i in range(200))
+    trimmed = token_budget.trim_description(text, 50)
+    assert trimmed.startswith("Frase número 0 do rascunho.")
+    assert trimmed.endswith(" [...]")
+    assert token_budget.estimate_text_tokens(trimmed) <= 50
+
+
+def test_downscale_corrupt_image_returns_none():
+    pytest.importorskip("PIL")
+    assert token_budget.downscale_image(b"\x89PNG\r\n\x1a\nlixo", "image/png") is None
+
+
+def test_preflight_rejects_corrupt_oversized_image(calibration_path):
+    data = png_header(20_000, 20_000)
+    result = token_budget.preflight("Curso online.", "instrução", {"type": "OBJECT"}, data, "image/png", "free")
+    assert result["media_bytes"] is None
+    assert result["estimate"]["media"] == 0
+    assert result["notes"]
+
+
+def test_calibration_factor_tightens_budget(calibration_path):
+    description = "palavra " * 400  # Cabe no orçamento "free" sem calibração
+    assert token_budget.preflight(description, "", {}, None, "", "free")["description"] == description
+
+    for _ in range(3):
+        token_budget.record_calibration({"raw_total": 100}, {"promptTokenCount": 200}, path=calibration_path)
+    assert token_budget.calibration_factor(calibration_path) == 2.0
+
+    result = token_budget.preflight(description, "", {}, None, "", "free")
+    assert result["description"] != description
+    assert token_budget.estimate_text_tokens(result["description"]) <= token_budget.TIER_BUDGETS["free"]["max_description_tokens"] / 2
+
+
+def test_calibration_reads_file_once_and_compacts(calibration_path, monkeypatch):
+    with open(calibration_path, "w", encoding="utf-8") as f:
+        for _ in range(5):
+            f.write(json.dumps({"raw_total": 100, "actual_prompt_tokens": 150}) + "\n")
+    assert token_budget.calibration_factor(calibration_path) == 1.5
+
+    monkeypatch.setattr(token_budget, "CALIBRATION_WINDOW", 4)
+    monkeypatch.setattr(token_budget, "_calibration_ratios", {})
+    for _ in range(20):
+        token_budget.record_calibration({"raw_total": 100}, {"promptTokenCount": 100}, path=calibration_path)
+    assert token_budget.calibration_factor(calibration_path) == 1.0
+    with open(calibration_path, encoding="utf-8") as f:
+        assert len(f.readlines()) <= 4 * 5
@@ -0,0 +1,87 @@
+import threading
+import time
+import types
+
+import pytest
+
+import shared_state
+import warmup
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch):
+    monkeypatch.setattr(shared_state, "_state", shared_state.MemoryState())
+    monkeypatch.setattr(warmup, "_profiles", {})
+
+
+class FakeDB:
+    """`users/{uid}` com contagem de leituras; `on_read` roda no meio da leitura."""
+
+    def __init__(self, data, on_read=None):
+        self.data = data
+        self.on_read = on_read
+        self.reads = 0
+
+    def collection(self, name):
+        return self
+
+    def document(self, user_id):
+        return self
+
+    def get(self):
+        self.reads += 1
+        if self.on_read:
+            self.on_read()
+        return types.SimpleNamespace(exists=self.data is not None, to_dict=lambda: dict(self.data))
+
+
+def test_prefetched_profile_is_served_until_ttl():
+    db = FakeDB({"plan_tier": "free", "ads_generated": 1})
+    warmup.prefetch_profile(db, "u1")
+
+    assert warmup.get_profile("u1") == (True, {"plan_tier": "free", "ads_generated": 1})
+    assert db.reads == 1
+
+    warmup._profiles["u1"]["at"] -= warmup.PROFILE_CACHE_TTL_SECONDS + 1
+    assert warmup.get_profile("u1") is None  # Expirado: o chamador lê o documento
+    assert "u1" not in warmup._profiles
+
+
+def test_missing_profile_is_cached_as_absent():
+    warmup.prefetch_profile(FakeDB(None), "u1")
+    assert warmup.get_profile("u1") == (False, None)
+
+
+def test_invalidation_drops_local_profile():
+    warmup.prefetch_profile(FakeDB({"ads_generated": 1}), "u1")
+    warmup.invalidate_profile("u1")
+    assert warmup.get_profile("u1") is None
+
+
+def test_invalidation_from_another_replica_is_seen():
+    warmup.prefetch_profile(FakeDB({"ads_generated": 1}), "u1")
+    # Outra réplica invalidou: só a versão no estado compartilhado muda, o cache deste processo continua lá
+    shared_state.get_state().set("profile_version:u1", "outra-replica")
+    assert "u1" in warmup._profiles
+    assert warmup.get_profile("u1") is None
+
+
+def test_invalidation_during_read_discards_result():
+    db = FakeDB({"ads_generated": 1}, on_read=lambda: warmup.invalidate_profile("u1"))
+    warmup.prefetch_profile(db, "u1")
+    assert warmup.get_profile("u1") is None
+
+
+def test_get_profile_waits_for_read_in_progress():
+    release = threading.Event()
+    db = FakeDB({"ads_generated": 2}, on_read=lambda: release.wait(5))
+    reader = threading.Thread(target=warmup.prefetch_profile, args=(db, "u1"))
+    reader.start()
+    while "u1" not in warmup._profiles:
+        time.sleep(0.001)
+
+    assert warmup.get_profile("u1", wait_seconds=0.01) is None  # Leitura ainda em andamento
+    release.set()
+    assert warmup.get_profile("u1", wait_seconds=5) == (True, {"ads_generated": 2})
+    reader.join()
+    assert db.reads == 1
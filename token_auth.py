@@ -0,0 +1,270 @@
+"""Autenticação por ID token do Firebase, verificada localmente.
+
+O login troca e-mail/senha por um ID token (REST do Identity Toolkit). A
+partir daí, cada rerun apenas verifica a assinatura do token contra as chaves
+públicas do Google, que ficam em cache e são renovadas em segundo plano
+conforme o `Cache-Control` da resposta. Identidades já verificadas ficam em um
+cache com TTL (limitado pela expiração do token), então o caminho quente não
+faz nenhuma chamada de rede.
+
+Para testes de carga offline, `LocalKeySource` gera um par de chaves local e
+emite tokens no mesmo formato:
+    python token_auth.py --load-test 20000
+"""
+
+import argparse
+import hashlib
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ttl_cache import TTLCache
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+IDENTITY_TOOLKIT_URL = "https://identitytoolkit.googleapis.com/v1/accounts"
+SECURE_TOKEN_URL = "https://securetoken.googleapis.com/v1/token"
+DEFAULT_KEYS_MAX_AGE = 3600
+MIN_REFRESH_SECONDS = 60
+IDENTITY_CACHE_TTL_SECONDS = 300
+CLOCK_SKEW_SECONDS = 60
+HTTP_TIMEOUT_SECONDS = 10
+
+
+class AuthError(Exception):
+    """Erro de autenticação com código do Firebase (ex.: INVALID_PASSWORD, EMAIL_EXISTS)."""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+
+class TokenVerificationError(AuthError):
+    """Token inválido, expirado ou emitido para outro projeto."""
+
+
+# ----------------------------------------------------
+#                 FONTES DE CHAVES PÚBLICAS
+# ----------------------------------------------------
+
+class GoogleKeySource:
+    """Certificados públicos do Firebase Auth, com cache e renovação agendada."""
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL):
+        self.url = url
+        self._keys: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def refresh(self) -> float:
+        """Baixa os certificados e retorna o max-age (segundos) informado pelo servidor."""
+        import requests
+
+        response = requests.get(self.url, timeout=HTTP_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else DEFAULT_KEYS_MAX_AGE
+        with self._lock:
+            self._keys = response.json()
+            self._expires_at = time.time() + max_age
+        return max_age
+
+    def get_keys(self, force_refresh: bool = False) -> Dict[str, str]:
+        if force_refresh or time.time() >= self._expires_at:
+            self.refresh()
+        return self._keys
+
+    def start_refresh_schedule(self) -> None:
+        """Renova as chaves antes de expirarem (90% do max-age), em uma thread daemon."""
+        if self._timer is not None:
+            return
+
+        def _run():
+            try:
+                max_age = self.refresh()
+            except Exception:
+                max_age = MIN_REFRESH_SECONDS  # Falha de rede: tenta de novo em breve, mantendo as chaves atuais
+            self._timer = threading.Timer(max(MIN_REFRESH_SECONDS, max_age * 0.9), _run)
+            self._timer.daemon = True
+            self._timer.start()
+
+        _run()
+
+
+class LocalKeySource:
+    """Par de chaves RSA local que imita o Firebase Auth (testes de carga offline)."""
+
+    def __init__(self, project_id: str = "anuncia-local", key_id: str = "local-key"):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from google.auth import crypt
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.project_id = project_id
+        self.key_id = key_id
+        self._signer = crypt.RSASigner.from_string(private_pem, key_id=self.key_id)
+        self._keys = {self.key_id: public_pem.decode("utf-8")}
+
+    def get_keys(self, force_refresh: bool = False) -> Dict[str, str]:
+        return self._keys
+
+    def start_refresh_schedule(self) -> None:
+        pass
+
+    def mint_token(self, uid: str, email: str, ttl_seconds: int = 3600) -> str:
+        from google.auth import jwt
+
+        now = int(time.time())
+        return jwt.encode(self._signer, {
+            "iss": f"https://securetoken.google.com/{self.project_id}",
+            "aud": self.project_id,
+            "sub": uid,
+            "user_id": uid,
+            "email": email,
+            "auth_time": now,
+            "iat": now,
+            "exp": now + ttl_seconds,
+        }).decode("utf-8")
+
+
+# ----------------------------------------------------
+#                VERIFICAÇÃO LOCAL DE TOKENS
+# ----------------------------------------------------
+
+class TokenVerifier:
+    """Verifica ID tokens localmente e mantém as identidades verificadas em cache."""
+
+    def __init__(self, project_id: str, key_source, identity_ttl: int = IDENTITY_CACHE_TTL_SECONDS):
+        self.project_id = project_id
+        self.key_source = key_source
+        self.identity_ttl = identity_ttl
+        self._identities = TTLCache(max_items=10_000, ttl_seconds=identity_ttl)
+
+    def verify(self, id_token: str) -> Dict[str, Any]:
+        """Retorna {"uid", "email", "exp"} do token; levanta TokenVerificationError se inválido."""
+        token_key = hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+        identity = self._identities.get(token_key)
+        if identity is not None and identity["exp"] > time.time():
+            return identity
+
+        from google.auth import jwt
+
+        try:
+            header = jwt.decode_header(id_token)
+            keys = self.key_source.get_keys()
+            if header.get("kid") not in keys:
+                keys = self.key_source.get_keys(force_refresh=True)  # Rotação de chaves
+            claims = jwt.decode(id_token, certs=keys, audience=self.project_id, clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+        except Exception as e:
+            raise TokenVerificationError(f"INVALID_ID_TOKEN: {e}")
+
+        if claims.get("iss") != f"https://securetoken.google.com/{self.project_id}" or not claims.get("sub"):
+            raise TokenVerificationError("INVALID_ID_TOKEN: emissor ou usuário inválido")
+        if claims.get("auth_time", 0) > time.time() + CLOCK_SKEW_SECONDS:
+            raise TokenVerificationError("INVALID_ID_TOKEN: auth_time no futuro")
+
+        identity = {"uid": claims["sub"], "email": claims.get("email"), "exp": claims["exp"]}
+        self._identities.set(token_key, identity, ttl_seconds=min(self.identity_ttl, max(0, claims["exp"] - time.time())))
+        return identity
+
+
+_verifiers: Dict[str, TokenVerifier] = {}
+_verifiers_lock = threading.Lock()
+
+
+def get_verifier(project_id: str) -> TokenVerifier:
+    """Verificador compartilhado pelo processo (chaves e identidades em cache entre sessões e reruns)."""
+    with _verifiers_lock:
+        verifier = _verifiers.get(project_id)
+        created = verifier is None
+        if created:
+            verifier = _verifiers[project_id] = TokenVerifier(project_id, GoogleKeySource())
+    if created:
+        # Primeira busca dos certificados fora do lock: quem chegar ao mesmo tempo não espera a rede por ele
+        verifier.key_source.start_refresh_schedule()
+    return verifier
+
+
+# ----------------------------------------------------
+#          LOGIN / REGISTRO VIA REST (UMA CHAMADA)
+# ----------------------------------------------------
+
+def _post_identity(url: str, api_key: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    import requests
+
+    response = requests.post(url, params={"key": api_key}, json=body, timeout=HTTP_TIMEOUT_SECONDS)
+    data = response.json()
+    if response.status_code != 200:
+        message = data.get("error", {}).get("message", "UNKNOWN_ERROR")
+        raise AuthError(message.split(" ")[0])
+    return data
+
+
+def sign_in_with_password(api_key: str, email: str, password: str) -> Dict[str, Any]:
+    """Valida e-mail e senha e retorna {"idToken", "refreshToken", "localId", ...}."""
+    return _post_identity(f"{IDENTITY_TOOLKIT_URL}:signInWithPassword", api_key, {
+        "email": email, "password": password, "returnSecureToken": True,
+    })
+
+
+def sign_up(api_key: str, email: str, password: str, display_name: str) -> Dict[str, Any]:
+    """Cria a conta e já retorna o ID token da sessão."""
+    return _post_identity(f"{IDENTITY_TOOLKIT_URL}:signUp", api_key, {
+        "email": email, "password": password, "displayName": display_name, "returnSecureToken": True,
+    })
+
+
+def refresh_id_token(api_key: str, refresh_token: str) -> Dict[str, Any]:
+    """Troca o refresh token por um novo ID token (uma vez por hora, fora do caminho quente)."""
+    data = _post_identity(SECURE_TOKEN_URL, api_key, {"grant_type": "refresh_token", "refresh_token": refresh_token})
+    return {"idToken": data["id_token"], "refreshToken": data["refresh_token"]}
+
+
+# ----------------------------------------------------
+#               TESTE DE CARGA OFFLINE (CLI)
+# ----------------------------------------------------
+
+def load_test(verifications: int, users: int = 100) -> Dict[str, float]:
+    """Mede a vazão de verificação com chaves locais: primeira verificação (assinatura) e cache quente."""
+    key_source = LocalKeySource()
+    verifier = TokenVerifier(key_source.project_id, key_source)
+    tokens = [key_source.mint_token(f"uid-{i}", f"user{i}@exemplo.com") for i in range(users)]
+
+    started = time.perf_counter()
+    for token in tokens:
+        verifier.verify(token)
+    cold_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(verifications):
+        verifier.verify(tokens[i % users])
+    warm_seconds = time.perf_counter() - started
+
+    return {
+        "cold_verifications_per_s": round(users / cold_seconds, 1),
+        "cached_verifications_per_s": round(verifications / warm_seconds, 1),
+        "cached_p_avg_us": round(warm_seconds / verifications * 1e6, 2),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga offline da verificação de ID tokens.")
+    parser.add_argument("--load-test", type=int, default=10_000, help="Número de verificações com cache quente.")
+    parser.add_argument("--users", type=int, default=100, help="Tokens distintos (verificação com assinatura).")
+    args = parser.parse_args(argv)
+
+    for name, value in load_test(args.load_test, args.users).items():
+        print(f"{name}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
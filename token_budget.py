@@ -0,0 +1,292 @@
+"""Estimativa local de tokens e orçamento de prompt por plano (pré-voo da chamada ao Gemini).
+
+Antes de qualquer I/O de rede, `preflight()` estima os tokens do texto do
+usuário, da instrução de sistema, do schema e da mídia; corta a descrição se
+ela passar do orçamento do plano e reduz (imagens) ou rejeita (vídeos) mídias
+acima do orçamento. A estimativa é gravada ao lado do `usageMetadata` real em
+`.cache/token_calibration.jsonl`, e o fator de calibração resultante corrige
+as próximas estimativas e a aplicação do orçamento. O arquivo é lido uma única
+vez por processo; depois disso o fator vem de uma janela móvel em memória.
+"""
+
+import io
+import json
+import math
+import os
+import re
+import statistics
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "token_calibration.jsonl")
+CALIBRATION_WINDOW = 200
+
+CHARS_PER_TOKEN = 3.6          # Português fica um pouco abaixo dos ~4 caracteres/token do inglês
+IMAGE_TILE_TOKENS = 258        # Imagem ≤ 384px ou cada bloco de 768x768
+IMAGE_SMALL_SIDE = 384
+IMAGE_TILE_SIDE = 768
+VIDEO_TOKENS_PER_SECOND = 263 + 32  # Quadros (1 fps) + áudio
+ASSUMED_VIDEO_BYTES_PER_SECOND = 2_000_000 // 8  # ~2 Mbps quando a duração não pode ser lida
+MAX_INLINE_MEDIA_BYTES = 20 * 1024 * 1024  # Limite da API para dados inline na requisição
+
+TIER_BUDGETS = {
+    "free": {"max_prompt_tokens": 8_000, "max_description_tokens": 1_000},
+    "essential": {"max_prompt_tokens": 24_000, "max_description_tokens": 2_000},
+    "premium": {"max_prompt_tokens": 64_000, "max_description_tokens": 4_000},
+}
+
+_calibration_lock = threading.Lock()
+_calibration_ratios: Dict[str, Deque[float]] = {}  # Janela móvel de (reais / estimados) por arquivo
+_calibration_lines: Dict[str, int] = {}
+
+
+# ----------------------------------------------------
+#                   ESTIMADORES LOCAIS
+# ----------------------------------------------------
+
+def estimate_text_tokens(text: str) -> int:
+    """Estimativa de tokens de um texto (caracteres e palavras, o que for maior)."""
+    if not text:
+        return 0
+    words = len(re.findall(r"\w+|[^\w\s]", text))
+    return max(math.ceil(len(text) / CHARS_PER_TOKEN), math.ceil(words * 1.1))
+
+
+# Marcadores JPEG sem campo de comprimento: byte stuffing (0x00), TEM, RST0-RST7, SOI e EOI
+_JPEG_STANDALONE_MARKERS = frozenset([0x00, 0x01, 0xD8, 0xD9, *range(0xD0, 0xD8)])
+_JPEG_SOF_MARKERS = frozenset([0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF])
+
+
+def image_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """Lê largura e altura do cabeçalho PNG/JPEG sem decodificar a imagem."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+
+    if data[:2] == b"\xff\xd8":
+        offset = 2
+        while offset + 4 <= len(data):
+            if data[offset] != 0xFF:
+                offset += 1
+                continue
+            marker = data[offset + 1]
+            if marker == 0xFF:  # Bytes de preenchimento (0xFF) antes do marcador
+                offset += 1
+                continue
+            if marker in _JPEG_STANDALONE_MARKERS:
+                offset += 2
+                continue
+            segment_length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+            if marker in _JPEG_SOF_MARKERS:  # SOF: altura e largura
+                if offset + 9 > len(data):
+                    return None
+                height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+                return width, height
+            offset += 2 + segment_length
+    return None
+
+
+def video_duration_seconds(data: bytes) -> Optional[float]:
+    """Lê a duração do átomo `mvhd` de arquivos MP4/MOV; None se não encontrado."""
+    index = data.find(b"mvhd")
+    if index < 0 or index + 24 > len(data):
+        return None
+    version = data[index + 4]
+    if version == 1 and index + 36 <= len(data):
+        timescale, duration = struct.unpack(">IQ", data[index + 24:index + 36])
+    else:
+        timescale, duration = struct.unpack(">II", data[index + 16:index + 24])
+    return duration / timescale if timescale else None
+
+
+def estimate_media_tokens(data: Optional[bytes], mime_type: str) -> int:
+    if not data:
+        return 0
+    if mime_type.startswith("image/"):
+        dims = image_dimensions(data)
+        if dims is None:
+            return IMAGE_TILE_TOKENS * 4
+        width, height = dims
+        if width <= IMAGE_SMALL_SIDE and height <= IMAGE_SMALL_SIDE:
+            return IMAGE_TILE_TOKENS
+        return IMAGE_TILE_TOKENS * math.ceil(width / IMAGE_TILE_SIDE) * math.ceil(height / IMAGE_TILE_SIDE)
+    if mime_type.startswith("video/"):
+        seconds = video_duration_seconds(data) or len(data) / ASSUMED_VIDEO_BYTES_PER_SECOND
+        return math.ceil(seconds * VIDEO_TOKENS_PER_SECOND)
+    return 0
+
+
+# ----------------------------------------------------
+#                  AJUSTES DENTRO DO ORÇAMENTO
+# ----------------------------------------------------
+
+def trim_description(text: str, max_tokens: int) -> str:
+    """Mantém as frases iniciais que cabem no orçamento (corte duro se a primeira frase já exceder)."""
+    if estimate_text_tokens(text) <= max_tokens:
+        return text
+
+    max_tokens -= estimate_text_tokens(" [...]")
+    kept = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        candidate = f"{kept} {sentence}".strip()
+        if estimate_text_tokens(candidate) > max_tokens:
+            break
+        kept = candidate
+
+    if not kept:
+        kept = text[:int(max_tokens * CHARS_PER_TOKEN)].rsplit(" ", 1)[0]
+    return f"{kept} [...]"
+
+
+def downscale_image(data: bytes, mime_type: str, max_side: int = IMAGE_TILE_SIDE) -> Optional[bytes]:
+    """Reduz a imagem para caber em um bloco (`max_side`); None sem o Pillow ou se a imagem não puder ser lida."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.thumbnail((max_side, max_side))
+        output = io.BytesIO()
+        image_format = "PNG" if mime_type == "image/png" else "JPEG"
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(output, format=image_format, quality=85)
+    except Exception:
+        return None  # Upload corrompido ou formato que o Pillow não lê: a mídia segue o caminho sem redução
+    return output.getvalue()
+
+
+def estimate_prompt(text: str, system_instruction: str, output_schema: Dict, media_tokens: int, factor: Optional[float] = None) -> Dict[str, int]:
+    """Detalhamento da estimativa de um prompt; `total` já vem calibrado e `raw_total` vai para `record_calibration`."""
+    estimate = {
+        "description": estimate_text_tokens(text),
+        "instruction_and_schema": estimate_text_tokens(system_instruction) + estimate_text_tokens(json.dumps(output_schema, ensure_ascii=False)),
+        "media": media_tokens,
+    }
+    raw_total = sum(estimate.values())
+    estimate["total"] = math.ceil(raw_total * (calibration_factor() if factor is None else factor))
+    estimate["raw_total"] = raw_total
+    return estimate
+
+
+def preflight(description: str, system_instruction: str, output_schema: Dict, media_bytes: Optional[bytes], mime_type: str, plan_tier: str) -> Dict[str, Any]:
+    """Estima o prompt e o ajusta ao orçamento do plano, sem nenhuma chamada de rede.
+
+    Retorna a descrição e a mídia (possivelmente ajustadas), o detalhamento da
+    estimativa e `notes` com avisos para o usuário.
+    """
+    budget = TIER_BUDGETS.get(plan_tier, TIER_BUDGETS["free"])
+    notes = []
+
+    # Os estimadores são comparados com o orçamento já convertido para a escala deles (tokens reais / fator)
+    factor = calibration_factor()
+    max_description_tokens = math.floor(budget["max_description_tokens"] / factor)
+    max_prompt_tokens = math.floor(budget["max_prompt_tokens"] / factor)
+
+    if estimate_text_tokens(description) > max_description_tokens:
+        description = trim_description(description, max_description_tokens)
+        notes.append("✂️ A descrição era longa demais para o seu plano e foi resumida às frases iniciais.")
+
+    fixed_tokens = estimate_text_tokens(system_instruction) + estimate_text_tokens(json.dumps(output_schema, ensure_ascii=False))
+    media_budget = max_prompt_tokens - fixed_tokens - estimate_text_tokens(description)
+
+    media_tokens = estimate_media_tokens(media_bytes, mime_type)
+    if media_bytes and (media_tokens > media_budget or len(media_bytes) > MAX_INLINE_MEDIA_BYTES):
+        reduced = downscale_image(media_bytes, mime_type) if mime_type.startswith("image/") else None
+        if reduced is not None and len(reduced) <= MAX_INLINE_MEDIA_BYTES and estimate_media_tokens(reduced, mime_type) <= media_budget:
+            media_bytes = reduced
+            media_tokens = estimate_media_tokens(reduced, mime_type)
+            notes.append("🖼️ A imagem foi reduzida para caber no orçamento de tokens do seu plano.")
+        else:
+            media_bytes, media_tokens = None, 0
+            notes.append("⚠️ A mídia excede o orçamento de tokens do seu plano (ou o limite de 20MB) e não será enviada. Apenas a descrição textual será analisada.")
+
+    return {
+        "description": description,
+        "media_bytes": media_bytes,
+        "mime_type": mime_type,
+        "estimate": estimate_prompt(description, system_instruction, output_schema, media_tokens, factor),
+        "budget": budget["max_prompt_tokens"],
+        "notes": notes,
+    }
+
+
+# ----------------------------------------------------
+#                      CALIBRAÇÃO
+# ----------------------------------------------------
+
+def _ratio(record: Dict[str, Any]) -> Optional[float]:
+    if record.get("raw_total") and record.get("actual_prompt_tokens"):
+        return record["actual_prompt_tokens"] / record["raw_total"]
+    return None
+
+
+def _load_ratios(path: str) -> Deque[float]:
+    """Janela móvel do arquivo, lida do disco só na primeira vez (chamar com o lock)."""
+    ratios = _calibration_ratios.get(path)
+    if ratios is None:
+        ratios = deque(maxlen=CALIBRATION_WINDOW)
+        lines = 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        ratio = _ratio(json.loads(line))
+                    except ValueError:
+                        continue
+                    if ratio is not None:
+                        ratios.append(ratio)
+        except OSError:
+            pass
+        _calibration_ratios[path] = ratios
+        _calibration_lines[path] = lines
+    return ratios
+
+
+def _compact(path: str) -> None:
+    """Reescreve o arquivo só com as últimas `CALIBRATION_WINDOW` linhas (chamar com o lock)."""
+    with open(path, "r", encoding="utf-8") as f:
+        tail = deque(f, maxlen=CALIBRATION_WINDOW)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(tail)
+    os.replace(tmp_path, path)
+    _calibration_lines[path] = len(tail)
+
+
+def calibration_factor(path: Optional[str] = None) -> float:
+    """Mediana de (tokens reais / estimados) nas últimas chamadas registradas; 1.0 sem histórico."""
+    path = path or CALIBRATION_PATH
+    with _calibration_lock:
+        ratios = _load_ratios(path)
+        return statistics.median(ratios) if ratios else 1.0
+
+
+def record_calibration(estimate: Dict[str, int], usage_metadata: Dict[str, Any], path: Optional[str] = None) -> None:
+    """Grava a estimativa ao lado do `usageMetadata` real da resposta e atualiza a janela móvel."""
+    path = path or CALIBRATION_PATH
+    if not usage_metadata.get("promptTokenCount"):
+        return
+
+    record = {
+        "ts": time.time(),
+        **estimate,
+        "actual_prompt_tokens": usage_metadata.get("promptTokenCount"),
+        "actual_output_tokens": usage_metadata.get("candidatesTokenCount"),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _calibration_lock:
+        ratios = _load_ratios(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        _calibration_lines[path] += 1
+        ratio = _ratio(record)
+        if ratio is not None:
+            ratios.append(ratio)
+        if _calibration_lines[path] > CALIBRATION_WINDOW * 5:
+            _compact(path)
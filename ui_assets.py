@@ -0,0 +1,171 @@
+"""Assets estáticos da interface (CSS e HTML dos cartões de plano).
+
+O Streamlit reexecuta o `app.py` a cada interação, mas módulos importados ficam
+em cache no processo: montar estes textos aqui faz com que sejam construídos
+uma única vez por processo, e não a cada rerun.
+"""
+
+from functools import lru_cache
+from typing import Tuple
+
+APP_CSS = """
+<style>
+/* 1. CONFIGURAÇÃO BASE GERAL */
+body {
+    font-family: 'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
+    color: #333;
+}
+.block-container {
+    padding-top: 2rem;
+    padding-left: 1.5rem;
+    padding-right: 1.5rem;
+    padding-bottom: 2rem;
+}
+
+/* 2. SIDEBAR */
+[data-testid="stSidebar"] {
+    background: linear-gradient(180deg, #ffffff, #e0f7fa);
+    border-right: 1px solid #ddd;
+    box-shadow: 2px 0 5px rgba(0, 0, 0, 0.05);
+}
+
+/* 3. TÍTULO PRINCIPAL (Branding) */
+h1 {
+    color: #007bbd;
+    text-shadow: 1px 1px 3px rgba(0, 0, 0, 0.05);
+    font-weight: 700;
+}
+h2, h3, h4 {
+    color: #333;
+    border-bottom: 1px solid #eee;
+    padding-bottom: 5px;
+}
+
+/* 4. ESTILO DE CARTÃO E BORDAS */
+[data-testid="stExpander"], [data-testid="stForm"], .stTextArea > div {
+    border-radius: 12px;
+    border: 1px solid #e0e0e0;
+    box-shadow: 0 4px 8px rgba(0, 0, 0, 0.04);
+    background-color: #ffffff;
+    padding: 15px;
+    transition: box-shadow 0.3s ease;
+}
+
+/* 5. WIDGETS E BOTÕES */
+div.stButton > button:first-child {
+    background-color: #00bcd4;
+    color: white;
+    border: none;
+    border-radius: 8px;
+    padding: 10px 20px;
+    font-weight: bold;
+    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.2);
+    transition: background-color 0.2s;
+}
+div.stButton > button:first-child:hover {
+    background-color: #0097a7;
+}
+
+/* 6. BOTÕES DE UPGRADE (PRO) */
+.pro-button a button {
+    background-color: #ff5722 !important;
+    color: white !important;
+    border: none !important;
+    padding: 10px 20px !important;
+    border-radius: 8px !important;
+    font-size: 16px !important;
+    cursor: pointer !important;
+    font-weight: bold;
+    box-shadow: 0 4px 8px rgba(255, 87, 34, 0.3);
+    transition: all 0.2s;
+}
+.pro-button a button:hover {
+    background-color: #e64a19 !important;
+    transform: translateY(-2px);
+}
+.plan-highlight {
+    border: 3px solid #ff5722;
+    background-color: #fff3e0;
+    box-shadow: 0 6px 12px rgba(255, 87, 34, 0.2);
+    transform: scale(1.02);
+}
+</style>
+"""
+
+
+@lru_cache(maxsize=8)
+def plan_cards_html(free_limit: int) -> Tuple[str, str, str]:
+    """HTML dos três cartões da página de upgrade (Grátis, Essencial e Premium)."""
+
+    # Plano 1: Gratuito (Referência)
+    free_card = f"""
+            <div class="plan-card" style="background-color: #f7f7f7; border: 1px solid #ddd;">
+                <h4 style="color: #666; text-align: center;">Plano Grátis</h4>
+                <div style="text-align: center;">
+                    <p class="price-tag" style="color: #666;">R$ 0,00</p>
+                    <p>por mês</p>
+                </div>
+                <ul style="list-style-type: '❌ '; padding-left: 20px; font-size: 0.95em;">
+                    <li>Apenas {free_limit} Anúncios/Sessão</li>
+                    <li>Uso Básico (AIDA)</li>
+                    <li><span style="color: #999;">Roteiros de Vídeo (Reels/TikTok)</span></li>
+                    <li><span style="color: #999;">Sugestões de Campanhas A/B</span></li>
+                </ul>
+                <div style="text-align: center; margin-top: 15px;">
+                    <button style="background-color: #ccc; color: white; border: none; padding: 10px 20px; border-radius: 8px; font-weight: bold;" disabled>
+                        SELECIONADO
+                    </button>
+                </div>
+            </div>
+            """
+
+    # Plano 2: Essencial (Anúncios Ilimitados + AIDA/Segmentação)
+    essential_card = """
+            <div class="plan-card" style="background-color: #e0f2ff; border: 2px solid #00bcd4;">
+                <h4 style="color: #00bcd4; text-align: center;">Plano Essencial</h4>
+                    <div style="text-align: center;">
+                    <p class="price-tag" style="color: #00bcd4;">R$ 19,90</p>
+                    <p>por mês</p>
+                </div>
+                <ul style="list-style-type: '✅ '; padding-left: 20px; font-size: 0.95em;">
+                    <li>**Anúncios Ilimitados** (Sem Restrições)</li>
+                    <li>Uso Completo (AIDA e Segmentação)</li>
+                    <li><span style="color: #999;">❌ Roteiros de Vídeo (Exclusivo Premium)</span></li>
+                    <li><span style="color: #999;">❌ Sugestões de Campanhas A/B (Exclusivo Premium)</span></li>
+                </ul>
+                <div style="text-align: center; margin-top: 15px;" class="pro-button">
+                    <a href="LINK_PARA_PAGAMENTO_ESSENCIAL" target="_blank" style="text-decoration: none;">
+                        <button style="background-color: #00bcd4 !important; box-shadow: 0 4px 8px rgba(0, 188, 212, 0.3);">
+                            ASSINAR AGORA →
+                        </button>
+                    </a>
+                </div>
+            </div>
+            """
+
+    # Plano 3: Premium (Tudo Ilimitado + Vídeo/A/B)
+    premium_card = """
+            <div class="plan-card plan-highlight">
+                <h4 style="color: #ff5722; text-align: center;">🏆 Plano Premium</h4>
+                    <div style="text-align: center;">
+                    <p class="strike-through">De R$ 49,90</p>
+                    <p class="price-tag" style="color: #ff5722;">R$ 34,90</p>
+                    <p>por mês **(Mais Vantajoso)**</p>
+                </div>
+                <ul style="list-style-type: '✅ '; padding-left: 20px; font-size: 0.95em;">
+                    <li>**Anúncios Ilimitados** (Sem Restrições)</li>
+                    <li>Uso Completo (AIDA e Segmentação)</li>
+                    <li>Geração de **Roteiros de Vídeo**</li>
+                    <li>Sugestões de **Campanhas A/B** (Exclusivo!)</li>
+                </ul>
+                <div style="text-align: center; margin-top: 15px;" class="pro-button">
+                    <a href="LINK_PARA_PAGAMENTO_PREMIUM" target="_blank" style="text-decoration: none;">
+                        <button>
+                            EU QUERO O PREMIUM!
+                        </button>
+                    </a>
+                </div>
+            </div>
+            """
+
+    return free_card, essential_card, premium_card
@@ -0,0 +1,212 @@
+"""Aquecimento especulativo após o login.
+
+Logo depois do login, enquanto o usuário ainda preenche o formulário, uma
+tarefa em segundo plano adianta o que a primeira geração pagaria de uma vez:
+abre a conexão TLS com o endpoint do Gemini no pool da `requests.Session`
+compartilhada, busca o perfil/plano no Firestore, importa os módulos pesados e
+monta as variantes de instrução/schema do plano.
+
+O perfil pré-carregado vale por `PROFILE_CACHE_TTL_SECONDS` no processo; a
+invalidação (ex.: novo uso da cota, mudança de plano) troca uma versão no
+estado compartilhado, então vale para todas as réplicas.
+
+A tarefa é cancelável (`cancel()`, ex.: no logout) e limitada: no máximo
+`MAX_CONCURRENT_WARMUPS` rodam ao mesmo tempo no processo e passos que não
+começarem dentro de `WARMUP_BUDGET_SECONDS` são pulados. A latência da
+primeira geração de cada sessão é registrada com e sem aquecimento, para
+comparação no painel admin.
+"""
+
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import shared_state
+
+GEMINI_HOST = "https://generativelanguage.googleapis.com"
+WARMUP_BUDGET_SECONDS = 10
+MAX_CONCURRENT_WARMUPS = 2
+PROFILE_CACHE_TTL_SECONDS = 30
+PROFILE_WAIT_SECONDS = 3
+# A versão precisa sobreviver aos perfis em cache que a usam; depois disso pode expirar
+PROFILE_VERSION_TTL_SECONDS = 2 * PROFILE_CACHE_TTL_SECONDS
+HTTP_POOL_MAXSIZE = 16
+MAX_LATENCY_SAMPLES = 500
+
+
+# ----------------------------------------------------
+#              SESSÃO HTTP COMPARTILHADA (POOL)
+# ----------------------------------------------------
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def http_session():
+    """`requests.Session` do processo, com pool de conexões keep-alive reutilizado entre sessões."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE))
+            _http_session = session
+        return _http_session
+
+
+def warm_connection(url: str = GEMINI_HOST) -> None:
+    """Abre (e devolve ao pool) uma conexão TLS com o host; o status da resposta não importa."""
+    http_session().head(url, timeout=5)
+
+
+def preload_modules() -> None:
+    """Importa os módulos pesados que a geração usa (adiados desde o início do app)."""
+    import requests  # noqa: F401
+    from google.cloud import firestore  # noqa: F401
+
+    try:
+        from PIL import Image  # noqa: F401
+    except ImportError:
+        pass
+
+
+# ----------------------------------------------------
+#               PERFIL E PLANO PRÉ-CARREGADOS
+# ----------------------------------------------------
+
+_profiles: Dict[str, Dict[str, Any]] = {}
+_profiles_lock = threading.Lock()
+
+
+def _profile_version(user_id: str) -> Any:
+    return shared_state.get_state().get(f"profile_version:{user_id}", 0)
+
+
+def prefetch_profile(db, user_id: str) -> None:
+    """Lê `users/{uid}` em segundo plano; `get_profile` espera a leitura em andamento em vez de repeti-la."""
+    # Versão lida antes do documento: uma invalidação durante a leitura descarta o resultado
+    entry = {"ready": threading.Event(), "data": None, "exists": False, "at": time.monotonic(), "version": _profile_version(user_id)}
+    with _profiles_lock:
+        _profiles[user_id] = entry
+    try:
+        doc = db.collection("users").document(user_id).get()
+        entry["exists"] = doc.exists
+        entry["data"] = doc.to_dict() if doc.exists else None
+    except Exception:
+        with _profiles_lock:
+            _profiles.pop(user_id, None)
+        raise
+    finally:
+        entry["at"] = time.monotonic()
+        entry["ready"].set()
+
+
+def get_profile(user_id: str, wait_seconds: float = PROFILE_WAIT_SECONDS) -> Optional[Tuple[bool, Optional[Dict[str, Any]]]]:
+    """(existe, dados) do perfil pré-carregado; None se não houver um recente (o chamador lê do Firestore)."""
+    with _profiles_lock:
+        entry = _profiles.get(user_id)
+    if entry is None or not entry["ready"].wait(wait_seconds):
+        return None
+    if time.monotonic() - entry["at"] > PROFILE_CACHE_TTL_SECONDS or user_id not in _profiles:
+        _drop_local_profile(user_id)
+        return None
+    if entry["version"] != _profile_version(user_id):  # Invalidado (nesta ou em outra réplica)
+        _drop_local_profile(user_id)
+        return None
+    return entry["exists"], dict(entry["data"]) if entry["data"] else None
+
+
+def _drop_local_profile(user_id: str) -> None:
+    with _profiles_lock:
+        _profiles.pop(user_id, None)
+
+
+def invalidate_profile(user_id: str) -> None:
+    """Descarta o perfil pré-carregado em todas as réplicas (ex.: após incrementar a contagem ou mudar o plano)."""
+    _drop_local_profile(user_id)
+    shared_state.get_state().set(f"profile_version:{user_id}", uuid.uuid4().hex, ttl=PROFILE_VERSION_TTL_SECONDS)
+
+
+# ----------------------------------------------------
+#                  TAREFA DE AQUECIMENTO
+# ----------------------------------------------------
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_WARMUPS, thread_name_prefix="anuncia-warmup")
+
+
+class WarmupTask:
+    """Executa os passos em ordem, até ser cancelada ou estourar o orçamento de tempo."""
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], Any]]], budget_seconds: float = WARMUP_BUDGET_SECONDS):
+        self.steps = steps
+        self.deadline = time.monotonic() + budget_seconds
+        self.cancelled = threading.Event()
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.skipped: List[str] = []
+        self.future = None
+
+    def run(self) -> None:
+        for name, step in self.steps:
+            if self.cancelled.is_set() or time.monotonic() > self.deadline:
+                self.skipped.append(name)
+                continue
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = str(e)
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def warmed(self) -> bool:
+        """Terminou com todos os passos executados sem erro."""
+        return self.done and not self.skipped and not self.errors
+
+
+def start(steps: List[Tuple[str, Callable[[], Any]]], budget_seconds: float = WARMUP_BUDGET_SECONDS) -> WarmupTask:
+    task = WarmupTask(steps, budget_seconds)
+    task.future = _executor.submit(task.run)
+    return task
+
+
+# ----------------------------------------------------
+#          MEDIÇÃO DA LATÊNCIA DA PRIMEIRA GERAÇÃO
+# ----------------------------------------------------
+
+_first_generation_ms: Dict[bool, List[float]] = {True: [], False: []}
+_latency_lock = threading.Lock()
+
+
+def record_first_generation(elapsed_ms: float, warmed: bool) -> None:
+    with _latency_lock:
+        samples = _first_generation_ms[warmed]
+        samples.append(round(elapsed_ms, 1))
+        del samples[:-MAX_LATENCY_SAMPLES]
+
+
+def first_generation_report() -> List[Dict[str, Any]]:
+    """Linhas para o painel admin: primeira geração com e sem aquecimento."""
+    rows = []
+    with _latency_lock:
+        for warmed, label in ((True, "com aquecimento"), (False, "sem aquecimento")):
+            samples = _first_generation_ms[warmed]
+            rows.append({
+                "primeira geração": label,
+                "amostras": len(samples),
+                "mediana (ms)": round(statistics.median(samples), 1) if samples else None,
+                "média (ms)": round(statistics.fmean(samples), 1) if samples else None,
+            })
+    return rows